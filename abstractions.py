@@ -140,6 +140,7 @@ class AbstractSession(Sequence):
     """
     Композиция к CNCFile
     """
+    __slots__ = ()
 
     @abstractmethod
     def __init__(self):
@@ -12,6 +12,8 @@ _65A90: str = "_65A90"
 sep = os.path.sep
 INPUT_PATH_ROOT: str = os.path.normpath(os.path.join(PROJECT_PATH, INPUT_PATH_NAME))
 OUTPUT_PATH_ROOT: str = os.path.normpath(os.path.join(PROJECT_PATH, OUTPUT_PATH_NAME))
+CACHE_PATH: str = os.path.normpath(os.path.join(PROJECT_PATH, "cache"))  # Разобранные программы (converter/cache)
+CACHE_MAX_SIZE: int = 2 * 1024 ** 3  # Байт
 MACHINES_INPUT_PATH: dict = {
     HELLER: os.path.normpath(os.path.join(INPUT_PATH_ROOT, HELLER)),
     FIDIA: os.path.normpath(os.path.join(INPUT_PATH_ROOT, FIDIA)),
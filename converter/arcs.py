@@ -0,0 +1,214 @@
+"""
+Замена серий коротких перемещений G1, лежащих на окружности, кадрами G2/G3 (плоскость XY, Z постоянна).
+    1. Во всех окнах по WINDOW вершин окружность подбирается методом наименьших квадратов (Kasa)
+       - одна пачка систем 3x3 в np.linalg.solve на весь файл
+    2. Подряд идущие подходящие окна объединяются в кандидаты-дуги (не длиннее MAX_SPAN вершин)
+    3. Кандидаты проверяются той же подгонкой; не прошедшие проверку делятся пополам и проверяются снова
+Отклонение вершин и середин исходных отрезков от дуги не больше tolerance, дуги меньше 180°.
+Участвуют только 'чистые' кадры перемещения (см. decimation.Decimator.pure_lines) в плоскости G17.
+"""
+import re
+from typing import Union
+import numpy as np
+from gcode_parser import WORDS, tokenize, parse_tokens, format_number, forward_fill, to_float
+from decimation import Decimator
+
+AXES = ("X", "Y", "Z")
+PLANES = (17., 18., 19.)
+BLOCK_NUMBER = re.compile(rb"^\s*N\d+\s*")
+
+
+def expand(starts: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Индексы вершин всех участков подряд: (номер участка, индекс вершины, смещение начала участка) """
+    owner = np.repeat(np.arange(len(starts)), counts)
+    first = np.cumsum(counts) - counts
+    return owner, starts[owner] + np.arange(counts.sum()) - np.repeat(first, counts), first
+
+
+def get_planes(tokens: tuple[np.ndarray, np.ndarray, np.ndarray, int]) -> np.ndarray:
+    """ Действующая плоскость (17, 18, 19) в каждом кадре, пока не указана - G17 """
+    letters, values, line_index, length = tokens
+    mask = letters == ord("G")
+    codes = to_float(values[mask])
+    planes = np.isin(codes, PLANES)
+    column = np.full(length, np.nan)
+    column[line_index[mask][planes]] = codes[planes]
+    return forward_fill(column, 17.)
+
+
+def fit_arcs(xy: np.ndarray, z: np.ndarray, starts: np.ndarray, counts: np.ndarray, tolerance: float,
+             radius_limits: tuple[float, float]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Подгонка окружности к каждому участку вершин xy[start: start + count].
+    Центр сдвигается на серединный перпендикуляр хорды, чтобы радиус в начале и в конце дуги совпадал.
+    :return: маска участков, которые можно заменить дугой; центры (относительно начала участка); направление (+1 - G3)
+    """
+    valid = counts >= 3
+    starts, counts = starts[valid], counts[valid]
+    result = np.zeros(len(valid), dtype=bool)
+    centers, directions = np.zeros((len(valid), 2)), np.zeros(len(valid))
+    if not len(starts):
+        return result, centers, directions
+    owner, index, first = expand(starts, counts)
+    p = xy[index] - xy[starts[owner]]
+    x, y = p[:, 0], p[:, 1]
+    square = x * x + y * y
+    sums = np.add.reduceat(np.stack((x * x, x * y, x, y * y, y, square * x, square * y, square), axis=1), first)
+    matrix = np.stack((sums[:, 0], sums[:, 1], sums[:, 2], sums[:, 1], sums[:, 3], sums[:, 4],
+                       sums[:, 2], sums[:, 4], counts), axis=1).reshape(-1, 3, 3)
+    rhs = -sums[:, 5:8]
+    determinant = np.linalg.det(matrix)
+    scale = np.einsum("ijj->i", matrix) ** 3
+    solvable = np.abs(determinant) > 1e-12 * np.maximum(scale, 1e-300)
+    matrix[~solvable] = np.eye(3)
+    solution = np.linalg.solve(matrix, rhs[..., None])[..., 0]
+    center = -solution[:, :2] / 2
+    # Центр на серединном перпендикуляре хорды
+    end = p[first + counts - 1]
+    chord_length = np.linalg.norm(end, axis=1)
+    normal = np.stack((-end[:, 1], end[:, 0]), axis=1) / np.where(chord_length > 0, chord_length, 1)[:, None]
+    middle = end / 2
+    center = middle + normal * np.einsum("ij,ij->i", center - middle, normal)[:, None]
+    radius = np.linalg.norm(center, axis=1)
+    # Отклонение вершин и середин отрезков
+    relative = p - center[owner]
+    deviation = np.abs(np.linalg.norm(relative, axis=1) - radius[owner])
+    midpoints = (relative[:-1] + relative[1:]) / 2
+    same = owner[:-1] == owner[1:]
+    midpoint_deviation = np.where(same, np.abs(np.linalg.norm(midpoints, axis=1) - radius[owner[:-1]]), 0)
+    deviation[:-1] = np.maximum(deviation[:-1], midpoint_deviation)
+    # Монотонное движение вокруг центра в одну сторону, суммарный угол < 180°
+    cross = relative[:-1, 0] * relative[1:, 1] - relative[:-1, 1] * relative[1:, 0]
+    dot = np.einsum("ij,ij->i", relative[:-1], relative[1:])
+    angle = np.where(same, np.arctan2(cross, dot), 0)
+    segment_counts = counts - 1
+    positive = np.add.reduceat(np.where(same, cross > 0, 0), first) == segment_counts
+    negative = np.add.reduceat(np.where(same, cross < 0, 0), first) == segment_counts
+    sweep = np.abs(np.add.reduceat(angle, first))
+    flat = np.logical_and.reduceat(z[index] == z[starts[owner]], first)
+    fits = solvable & flat & (positive | negative) & (sweep < np.pi * 0.99) & (chord_length > 0) & \
+        (np.maximum.reduceat(deviation, first) <= tolerance) & \
+        (radius >= radius_limits[0]) & (radius <= radius_limits[1])
+    result[valid] = fits
+    centers[valid] = center
+    directions[valid] = np.where(positive, 1, -1)
+    return result, centers, directions
+
+
+class ArcFitter:
+    """
+    Использование:
+        result = ArcFitter(tolerance=0.005).process_file(path)
+    """
+    PRECISION = 3
+    WINDOW = 5  # Вершин в окне поиска
+    MAX_SPAN = 64  # Наибольшее количество вершин в одной дуге
+    RADIUS_LIMITS = (0.1, 2000.)  # мм. Больший радиус - практически прямая
+
+    def __init__(self, tolerance: float = 0.005, precision: int = PRECISION):
+        if tolerance <= 0:
+            raise ValueError("tolerance должен быть больше 0")
+        self.tolerance = tolerance
+        self.precision = precision
+        self.arcs = 0  # Дуг в последнем вызове process
+        self.removed = 0  # Удалено кадров в последнем вызове process
+
+    def find_spans(self, xy: np.ndarray, z: np.ndarray, pure: np.ndarray) -> tuple[np.ndarray, ...]:
+        """ :return: начала и длины (в вершинах) найденных дуг, центры (абсолютные), направления """
+        window = self.WINDOW
+        # Окно с началом в вершине i годится, если кадры i+1..i+window-1 - 'чистые'
+        pure_count = np.concatenate(([0], np.cumsum(pure),))
+        starts = np.flatnonzero(pure_count[window:] - pure_count[1:-window + 1] == window - 1) if \
+            len(pure) >= window else np.zeros(0, dtype=np.int64)
+        fits, _, _ = fit_arcs(xy, z, starts, np.full(len(starts), window), self.tolerance, self.RADIUS_LIMITS)
+        good = starts[fits]
+        if not len(good):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, 2)), np.zeros(0)
+        # Группы подряд идущих окон -> кандидаты, пересечения соседних кандидатов отрезаются
+        breaks = np.flatnonzero(np.diff(good) != 1) + 1
+        group_starts, group_ends = good[np.r_[0, breaks]], good[np.r_[breaks - 1, len(good) - 1]] + window - 1
+        group_starts[1:] = np.maximum(group_starts[1:], group_ends[:-1])
+        lengths = group_ends - group_starts + 1
+        pieces = (lengths + self.MAX_SPAN - 2) // (self.MAX_SPAN - 1)
+        owner, _, first = expand(np.zeros(len(pieces), dtype=np.int64), pieces)
+        offsets = np.arange(pieces.sum()) - np.repeat(first, pieces)
+        starts = group_starts[owner] + offsets * (self.MAX_SPAN - 1)
+        counts = np.minimum(starts + self.MAX_SPAN - 1, group_ends[owner]) - starts + 1
+        found_starts, found_counts, found_centers, found_directions = [], [], [], []
+        while len(starts):
+            keep = counts >= window - 1
+            starts, counts = starts[keep], counts[keep]
+            fits, centers, directions = fit_arcs(xy, z, starts, counts, self.tolerance, self.RADIUS_LIMITS)
+            found_starts.append(starts[fits])
+            found_counts.append(counts[fits])
+            found_centers.append(centers[fits] + xy[starts[fits]])
+            found_directions.append(directions[fits])
+            starts, counts = starts[~fits], counts[~fits]
+            half = counts // 2 + 1
+            starts, counts = np.concatenate((starts, starts + half - 1,)), np.concatenate((half, counts - half + 1,))
+        order = np.argsort(np.concatenate(found_starts))
+        return (np.concatenate(found_starts)[order], np.concatenate(found_counts)[order],
+                np.concatenate(found_centers)[order], np.concatenate(found_directions)[order])
+
+    def process(self, data: bytes) -> bytes:
+        tokens = tokenize(data)
+        program = parse_tokens(tokens, WORDS)
+        pure = Decimator.pure_lines(data, tokens, program) & (get_planes(tokens) == 17)
+        points = np.stack([program.modal(axis) for axis in AXES], axis=1)
+        starts, counts, centers, directions = self.find_spans(points[:, :2], points[:, 2], pure)
+        self.arcs = len(starts)
+        if not self.arcs:
+            self.removed = 0
+            return data
+        ends = starts + counts - 1
+        keep = np.ones(len(points), dtype=bool)
+        owner, index, _ = expand(starts + 1, counts - 2)
+        keep[index] = False
+        self.removed = int(np.count_nonzero(~keep))
+        lines = data.split(b"\n")
+        numbers = program["N"]
+        replaced = {}
+        for start, end, center, direction in zip(starts, ends, centers, directions):
+            words = [f"G{3 if direction > 0 else 2}", f"X{format_number(points[end, 0], self.precision)}",
+                     f"Y{format_number(points[end, 1], self.precision)}",
+                     f"I{format_number(center[0] - points[start, 0], self.precision)}",
+                     f"J{format_number(center[1] - points[start, 1], self.precision)}"]
+            if not np.isnan(numbers[end]):
+                words.insert(0, f"N{int(numbers[end])}")
+            replaced[end] = " ".join(words).encode("ascii") + (b"\r" if lines[end].endswith(b"\r") else b"")
+        # После дуги режим перемещения G2/G3 остаётся - следующему кадру перемещения без G нужен явный G1
+        moves = ~np.isnan(np.stack([program[axis] for axis in AXES])).all(axis=0)
+        motion_lines = np.flatnonzero(moves | ~np.isnan(program["G"]))
+        following = motion_lines[np.searchsorted(motion_lines, ends, side="right").clip(max=len(motion_lines) - 1)]
+        for end, line in zip(ends, following):
+            if line > end and line not in replaced and np.isnan(program["G"][line]):
+                number = f"N{int(numbers[line])} " if not np.isnan(numbers[line]) else ""
+                body = BLOCK_NUMBER.sub(b"", lines[line], count=1)
+                replaced[line] = f"{number}G1 ".encode("ascii") + body.lstrip()
+        result = [replaced.get(index, lines[index]) for index in np.flatnonzero(keep)] + lines[len(keep):]
+        return b"\n".join(result)
+
+    def process_file(self, path: Union[str, bytes]) -> bytes:
+        with open(path, "rb") as file:
+            return self.process(file.read())
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "exemple")
+    paths = [os.path.join(folder, name) for folder, _, names in os.walk(root) for name in names]
+    fitter = ArcFitter()
+    size_before = size_after = arcs = removed = 0
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, "rb") as file:
+            data = file.read()
+        result = fitter.process(data)
+        size_before, size_after = size_before + len(data), size_after + len(result)
+        arcs, removed = arcs + fitter.arcs, removed + fitter.removed
+    elapsed = time.perf_counter() - start
+    print(f"{len(paths)} файлов: {arcs} дуг вместо {arcs + removed} кадров, "
+          f"размер {size_before / 2 ** 20:.1f} -> {size_after / 2 ** 20:.1f} МБ "
+          f"(сжатие {size_before / size_after:.2f}x), {elapsed:.2f} с")
@@ -0,0 +1,180 @@
+"""
+Кеш разобранных программ на диске.
+Запись - каталог '<контрольная сумма>-v<PARSER_VERSION>' с файлом .npy на каждый столбец
+(явные значения - '<слово>.npy', протянутые модальные - '<слово>.modal.npy').
+Столбцы загружаются через np.load(mmap_mode="r"): повторный разбор программы стоит только подкачки страниц.
+Время последнего обращения к записи - mtime её каталога; при превышении max_size удаляются самые старые записи.
+Размер кеша считается обходом каталога один раз, дальше ведётся счётчиком при записи и вытеснении,
+каталог обходится снова только при превышении max_size (производные данные записей учитываются при этом обходе).
+Если в записи не хватает столбцов (программа разбиралась с частью слов, или запись удалена не до конца -
+на Windows файлы, отображённые в память, не удаляются), недостающие столбцы дописываются в неё по одному файлу.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional, Iterable, Union
+import numpy as np
+from config import CACHE_PATH, CACHE_MAX_SIZE
+from digest import DigestService
+from gcode_parser import PARSER_VERSION, WORDS, MODAL_WORDS, ParsedProgram, parse_file
+
+MODAL_SUFFIX = ".modal"
+
+
+class ProgramCache:
+    """
+    Использование:
+        cache = ProgramCache()
+        program = cache.load(path)  # Разбор при первом обращении, далее - отображение файлов .npy в память
+    """
+    _lock = threading.Lock()
+    _sizes: dict[str, int] = {}  # Каталог кеша: размер записей в байтах
+
+    def __init__(self, directory: str = CACHE_PATH, max_size: int = CACHE_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, path: Union[str, bytes]) -> str:
+        return f"{DigestService.digest(path)[:32]}-v{PARSER_VERSION}"
+
+    def entry(self, path: Union[str, bytes]) -> str:
+        """ Каталог записи программы. В нём же лежат производные данные (см. preview), они вытесняются вместе с ней """
+        return os.path.join(self.directory, self.key(path))
+
+    def get(self, path: Union[str, bytes], words: Iterable[str] = WORDS) -> Optional[ParsedProgram]:
+        entry = self.entry(path)
+        try:
+            names = os.listdir(entry)
+        except FileNotFoundError:
+            return
+        stored = {name[:-len(".npy")] for name in names if name.endswith(".npy")}
+        words = tuple(words)
+        if not stored.issuperset(words):
+            return
+        columns = {word: np.load(os.path.join(entry, f"{word}.npy"), mmap_mode="r") for word in words}
+        modal = {word: np.load(os.path.join(entry, f"{word}{MODAL_SUFFIX}.npy"), mmap_mode="r")
+                 for word in words if f"{word}{MODAL_SUFFIX}" in stored}
+        os.utime(entry)
+        return ParsedProgram(columns, len(next(iter(columns.values()), ())), modal)
+
+    def put(self, path: Union[str, bytes], program: ParsedProgram):
+        """
+        Новая запись готовится во временном каталоге и появляется в кеше целиком одним переименованием.
+        В существующую запись дописываются недостающие столбцы.
+        """
+        entry = self.entry(path)
+        if os.path.isdir(entry):
+            try:
+                size = self._complete(entry, program)
+            except FileNotFoundError:  # Запись вытеснена, пока дописывались столбцы - создаётся заново
+                pass
+            else:
+                self._grow(size)
+                return
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        try:
+            for word, column in program.columns.items():
+                np.save(os.path.join(temporary, f"{word}.npy"), column)
+                if word in MODAL_WORDS:
+                    np.save(os.path.join(temporary, f"{word}{MODAL_SUFFIX}.npy"), program.modal(word))
+            size = self._folder_size(temporary)
+            os.rename(temporary, entry)
+        except OSError:
+            shutil.rmtree(temporary, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
+            return  # Запись уже создана другим потоком
+        self._grow(size)
+
+    @staticmethod
+    def _complete(entry: str, program: ParsedProgram) -> int:
+        """
+        Дописать в запись столбцы, которых в ней нет. Каждый файл появляется целиком (os.replace)
+        :return: размер дописанных файлов
+        """
+        stored = set(os.listdir(entry))
+        missing = []
+        for word, column in program.columns.items():
+            if f"{word}.npy" not in stored:
+                missing.append((f"{word}.npy", column,))
+            if word in MODAL_WORDS and f"{word}{MODAL_SUFFIX}.npy" not in stored:
+                missing.append((f"{word}{MODAL_SUFFIX}.npy", program.modal(word),))
+        size = 0
+        for name, column in missing:
+            descriptor, temporary = tempfile.mkstemp(dir=entry, prefix=".tmp-")
+            try:
+                with os.fdopen(descriptor, "wb") as file:
+                    np.save(file, column)
+                    size += file.tell()
+                os.replace(temporary, os.path.join(entry, name))
+            except OSError:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+                raise
+        return size
+
+    def load(self, path: Union[str, bytes], words: Iterable[str] = WORDS, workers: int = 1) -> ParsedProgram:
+        words = tuple(words)
+        program = self.get(path, words)
+        if program is None:
+            program = parse_file(path, words, workers)
+            self.put(path, program)
+        return program
+
+    def size(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self):
+        """ Удалять самые давно использованные записи, пока кеш больше max_size """
+        with self._lock:
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for entry, _, _ in self._entries():
+                shutil.rmtree(entry, ignore_errors=True)
+            self._sizes[self.directory] = 0
+
+    def _grow(self, size: int):
+        """ Учесть новые файлы в счётчике размера. Записи перебираются, только если кеш стал больше max_size """
+        with self._lock:
+            if self.directory not in self._sizes:
+                self._sizes[self.directory] = sum(entry_size for _, _, entry_size in self._entries())
+            else:
+                self._sizes[self.directory] += size
+            if self._sizes[self.directory] > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        for entry, _, size in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        self._sizes[self.directory] = total
+
+    def _entries(self) -> list[tuple[str, int, int]]:
+        """ (каталог записи, время последнего обращения, размер) """
+        result = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return result
+        for name in names:
+            if name.startswith("."):
+                continue
+            entry = os.path.join(self.directory, name)
+            try:
+                result.append((entry, os.stat(entry).st_mtime_ns, self._folder_size(entry),))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        return result
+
+    @staticmethod
+    def _folder_size(folder: str) -> int:
+        with os.scandir(folder) as files:
+            return sum(file.stat().st_size for file in files)
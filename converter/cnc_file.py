@@ -1,8 +1,10 @@
 import os
 import time
 import re
+from concurrent.futures import Future
 from typing import Optional, Union, Iterator
 from abstractions import AbstractCNCFile
+from digest import DigestService
 from temp import Temp
 from config import TOOLS
 
@@ -58,6 +60,11 @@ class CNCFile(AbstractCNCFile, Tool):
     APPROACH = 3  # Допустимое кол-во попыток открыть файл снова при ошибке
     MAX_NUM: Union[int, float] = float("inf")  # Максимально допустимый номер кадра
     LAST_SYMBOL = ""
+    KEEP_WORDS: frozenset[str] = frozenset()  # Слова, которые стойка требует писать в каждом кадре (см. redundancy)
+    PRECISION = 3  # Знаков после точки в координатах и подаче (см. reformat)
+    TRAILING_ZEROS = False  # 12.500 или 12.5
+    LEADING_ZERO = False  # 0.5 или .5
+    INTEGER_POINT = True  # C0. или C0
 
     def __init__(self, path: str = "", name: str = "", frmt: Optional[str] = None):
         self._name: str = name
@@ -66,6 +73,7 @@ class CNCFile(AbstractCNCFile, Tool):
         self.__last_modify_time: Optional[int] = None
         self._origin: Optional[os.open] = None
         self.__f_size: int = 0
+        self.__digest: Optional[Future] = None
         self.is_numerate = False
         self._status = False
         self._temp: Optional[Temp] = None
@@ -106,18 +114,37 @@ class CNCFile(AbstractCNCFile, Tool):
         """
          Перед записью временного файла в целевой придётся проверить:
           1) Существует ли исходный файл
-          2) тот ли самый файл перед нами: (Если вес или время последнего редактирования изменились с
-         момента первого откртия файла - это не оригинальный файл!)
+          2) тот ли самый файл перед нами: если изменились время последнего редактирования или вес,
+          сравнивается контрольная сумма содержимого с суммой на момент первого открытия файла.
+          При первой проверке сумма только ставится в очередь общего пула (DigestService.submit),
+          её результат ожидается при первом сравнении
         """
-        if not os.path.exists(self.__full_path):  # Файла не существует в исходном каталоге
-            raise FileNotFoundError
-        if self.__last_modify_time is None:
-            attrs_obj = os.stat(self.__full_path)
-            self.__last_modify_time = attrs_obj.st_mtime
-            self.__f_size = attrs_obj.st_size
-        attrs_obj = os.stat(self.__full_path)
-        if attrs_obj.st_mtime != self.__last_modify_time or attrs_obj.st_size != self.__f_size:
+        attrs_obj = os.stat(self.__full_path)  # FileNotFoundError, если файла нет в исходном каталоге
+        if self.__digest is None:
+            self.__last_modify_time, self.__f_size = attrs_obj.st_mtime_ns, attrs_obj.st_size
+            self.__digest = DigestService.submit(self.__origin_digest, attrs_obj.st_mtime_ns, attrs_obj.st_size)
+            return
+        if attrs_obj.st_mtime_ns == self.__last_modify_time and attrs_obj.st_size == self.__f_size:
+            return
+        origin = self.digest
+        if origin is None or DigestService.digest(self.__full_path, attrs_obj) != origin:
             raise FileNotFoundError(f"Исходный файл программы - {self.__full_path} изменился. Отмена")
+        self.__last_modify_time, self.__f_size = attrs_obj.st_mtime_ns, attrs_obj.st_size
+
+    def __origin_digest(self, mtime: int, size: int) -> Optional[str]:
+        """ Сумма файла, если он не менялся с первой проверки, иначе - None """
+        attrs_obj = os.stat(self.__full_path)
+        if attrs_obj.st_mtime_ns != mtime or attrs_obj.st_size != size:
+            return
+        return DigestService.digest(self.__full_path, attrs_obj)
+
+    @property
+    def digest(self) -> Optional[str]:
+        """
+        Контрольная сумма исходного файла на момент первой проверки (см. is_origin).
+        Ожидает фоновое вычисление. None - файл изменился раньше, чем сумма была посчитана
+        """
+        return self.__digest.result() if self.__digest is not None else None
 
     def open(self, path, mode="rt"):
         """
@@ -166,11 +193,12 @@ class CNCFile(AbstractCNCFile, Tool):
         self.is_origin()
         if self._origin is None:
             return iter(tuple())
+        self._origin.seek(0)  # Каждый проход - с начала файла
         return iter(self._origin)
 
     def __getitem__(self, line_number):
         if line_number < 0:
-            line_number = self._length - line_number
+            line_number = self._length + line_number
         self.is_valid_index(line_number)
         if self._status is not None:
             for index, line in enumerate(self):
@@ -1,18 +1,30 @@
-from typing import Any, ClassVar
+from typing import Any, ClassVar, Optional, Iterator
 from abstractions import AbstractSession
-from data_type import LinkedList
+from cnc_file import CNCFile
 
 
-class Session(LinkedList, AbstractSession):
+class Session(AbstractSession):
+    """
+    Файлы одного задания.
+    Хранит словари-параметры файлов в списке: длина, добавление и доступ по индексу - O(1).
+    Объект CNCFile создаётся (и открывает файл) только при первом обращении к элементу.
+    """
+    __slots__ = ("_type", "_items", "_files", "__status",)
 
     def __init__(self, data: list[dict[str, Any]], type_: ClassVar = None):
         if type_ is None:
             raise ValueError
-        super().__init__(items=data, type_=type_)
+        self._type = type_
+        self._items: list[dict[str, Any]] = list(data)
+        self._files: list[Optional[CNCFile]] = [None] * len(self._items)
         self.__status = None
 
+    def append(self, item: dict[str, Any]):
+        self._items.append(item)
+        self._files.append(None)
+
     def is_valid_index(self, index):
-        if not 0 <= index < self._length:
+        if not 0 <= index < len(self._items):
             raise IndexError
         return True
 
@@ -20,12 +32,38 @@ class Session(LinkedList, AbstractSession):
     def status(self):
         return self.__status
 
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index: int) -> CNCFile:
+        if index < 0:
+            index += len(self._items)
+        self.is_valid_index(index)
+        file = self._files[index]
+        if file is None:
+            file = self._files[index] = self._type(**self._items[index])
+        return file
+
+    def __iter__(self) -> Iterator[CNCFile]:
+        for index in range(len(self._items)):
+            yield self[index]
+
+    def __delitem__(self, index: int):
+        if index < 0:
+            index += len(self._items)
+        self.is_valid_index(index)
+        del self._items[index]
+        file = self._files.pop(index)
+        if file is not None:
+            file.close()
+
+    def close(self):
+        """ Закрыть уже открытые файлы """
+        for file in filter(None, self._files):
+            file.close()
+
     def __repr__(self):
-        return f"{type(self).__name__}({list(self)})"
+        return f"{type(self).__name__}({self._items})"
 
     def __str__(self):
-        return str(list(self))
-
-    def __delitem__(self, key):
-        item = super().__delitem__(key)
-        item.close()
+        return str(self._items)
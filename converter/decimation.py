@@ -0,0 +1,140 @@
+"""
+Прореживание ломаных: серии коротких линейных перемещений G1 заменяются меньшим количеством кадров,
+траектория отклоняется от исходной не больше чем на tolerance (алгоритм Дугласа-Пекера).
+Прореживаются только 'чистые' кадры перемещения: без явных G и F, без комментариев и других слов (M, S, ...),
+поэтому границы смены подачи и режима перемещения остаются на месте.
+Дуглас-Пекер выполняется сразу для всех серий файла: на каждом шаге расстояния до хорд
+считаются одной операцией NumPy для всех ещё не разбитых отрезков.
+"""
+from typing import Union
+import numpy as np
+from gcode_parser import COMMENT, WORDS, ParsedProgram, tokenize, parse_tokens, format_number
+
+AXES = ("X", "Y", "Z")
+PURE_LETTERS = tuple(map(ord, ("\n", "N", *AXES)))  # Слова, допустимые в прореживаемом кадре
+
+
+def simplify(points: np.ndarray, segments: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Векторизованный Дуглас-Пекер.
+    :param points: координаты вершин, shape (n, 3)
+    :param segments: пары индексов (начало, конец) исходных серий, shape (m, 2). Концы серий всегда остаются
+    :return: маска оставляемых вершин внутри серий (вершины вне серий - False)
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    starts, ends = segments[:, 0], segments[:, 1]
+    keep[ends] = True
+    while len(starts):
+        counts = ends - starts - 1
+        starts, ends, counts = starts[counts > 0], ends[counts > 0], counts[counts > 0]
+        if not len(starts):
+            break
+        owner = np.repeat(np.arange(len(starts)), counts)
+        first = np.cumsum(counts) - counts
+        index = starts[owner] + 1 + np.arange(counts.sum()) - np.repeat(first, counts)
+        a, b = points[starts[owner]], points[ends[owner]]
+        chord, vector = b - a, points[index] - a
+        square = np.einsum("ij,ij->i", chord, chord)
+        t = np.divide(np.einsum("ij,ij->i", vector, chord), square, out=np.zeros(len(square)), where=square > 0)
+        distance = np.linalg.norm(vector - chord * np.clip(t, 0, 1)[:, None], axis=1)
+        farthest = np.maximum.reduceat(distance, first)
+        split = farthest > tolerance
+        candidates = np.flatnonzero(distance == farthest[owner])
+        _, position = np.unique(owner[candidates], return_index=True)
+        middle = index[candidates[position]][split]
+        keep[middle] = True
+        starts, ends = np.concatenate((starts[split], middle,)), np.concatenate((middle, ends[split],))
+    return keep
+
+
+class Decimator:
+    """
+    Использование:
+        result = Decimator(tolerance=0.01).process_file(path)
+        open(output, "wb").write(result)
+    """
+    PRECISION = 3
+    MAX_RUN = 256
+
+    def __init__(self, tolerance: float = 0.01, precision: int = PRECISION):
+        if tolerance <= 0:
+            raise ValueError("tolerance должен быть больше 0")
+        self.tolerance = tolerance
+        self.precision = precision
+        self.removed = 0  # Удалено кадров в последнем вызове process
+
+    @staticmethod
+    def pure_lines(data: bytes, tokens: tuple, program: ParsedProgram) -> np.ndarray:
+        """ Маска кадров, которые можно прореживать """
+        letters, _, line_index, length = tokens
+        foreign = np.bincount(line_index[~np.isin(letters, PURE_LETTERS)], minlength=length)[:length] > 0
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n"))
+        commented = np.searchsorted(newlines, [match.start() for match in COMMENT.finditer(data)])
+        foreign[commented[commented < length]] = True
+        points = np.stack([program.modal(axis) for axis in AXES], axis=1)
+        known = ~np.isnan(points).any(axis=1)
+        moves = ~np.isnan(np.stack([program[axis] for axis in AXES])).all(axis=0)
+        pure = ~foreign & moves & known & (program.modal("G") == 1) & np.isnan(program["G"]) & np.isnan(program["F"])
+        pure[1:] &= known[:-1]
+        pure[0] = False  # Начальная точка серии - конец предыдущего кадра
+        return pure
+
+    def split_runs(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """ Длинные серии режутся на окна по MAX_RUN вершин: иначе число шагов Дугласа-Пекера растёт с длиной серии """
+        counts = (ends - starts + self.MAX_RUN - 1) // self.MAX_RUN
+        owner = np.repeat(np.arange(len(starts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        window_starts = starts[owner] + offsets * self.MAX_RUN
+        return np.stack((window_starts, np.minimum(window_starts + self.MAX_RUN, ends[owner]),), axis=1)
+
+    def process(self, data: bytes) -> bytes:
+        tokens = tokenize(data)
+        program = parse_tokens(tokens, WORDS)
+        pure = self.pure_lines(data, tokens, program)
+        points = np.stack([program.modal(axis) for axis in AXES], axis=1)
+        edges = np.diff(pure.astype(np.int8), prepend=0, append=0)
+        segments = self.split_runs(np.flatnonzero(edges == 1) - 1, np.flatnonzero(edges == -1) - 1)
+        keep = simplify(points, segments, self.tolerance) | ~pure
+        self.removed = int(np.count_nonzero(~keep))
+        if not self.removed:
+            return data
+        lines = data.split(b"\n")
+        kept = np.flatnonzero(keep)
+        # Кадр после удалённых должен содержать все оси, изменившиеся с предыдущего оставшегося кадра
+        rewrite = np.flatnonzero(pure[kept][1:] & (np.diff(kept) > 1)) + 1
+        numbers = program["N"]
+        result = [lines[index] for index in kept] + lines[len(keep):]  # Хвост после последнего переноса строки
+        for position in rewrite:
+            index, previous = kept[position], kept[position - 1]
+            words = [f"{axis}{format_number(points[index, i], self.precision)}"
+                     for i, axis in enumerate(AXES) if points[index, i] != points[previous, i]]
+            if not np.isnan(numbers[index]):
+                words.insert(0, f"N{int(numbers[index])}")
+            result[position] = " ".join(words).encode("ascii") + (b"\r" if lines[index].endswith(b"\r") else b"")
+        return b"\n".join(result)
+
+    def process_file(self, path: Union[str, bytes]) -> bytes:
+        with open(path, "rb") as file:
+            return self.process(file.read())
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "exemple")
+    paths = [os.path.join(folder, name) for folder, _, names in os.walk(root) for name in names]
+    for tolerance in (0.005, 0.01, 0.05,):
+        decimator = Decimator(tolerance)
+        size_before = size_after = lines_before = lines_after = 0
+        start = time.perf_counter()
+        for path in paths:
+            with open(path, "rb") as file:
+                data = file.read()
+            result = decimator.process(data)
+            size_before, size_after = size_before + len(data), size_after + len(result)
+            lines_before, lines_after = lines_before + data.count(b"\n"), lines_after + result.count(b"\n")
+        elapsed = time.perf_counter() - start
+        print(f"tolerance={tolerance}: кадров {lines_before} -> {lines_after} ({lines_after / lines_before:.1%}), "
+              f"размер {size_before / 2 ** 20:.1f} -> {size_after / 2 ** 20:.1f} МБ "
+              f"(сжатие {size_before / size_after:.2f}x), {elapsed:.2f} с, {size_before / 2 ** 20 / elapsed:.1f} МБ/с")
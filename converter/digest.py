@@ -0,0 +1,105 @@
+"""
+Контрольные суммы файлов программ (BLAKE2b).
+    - файл читается блоками по CHUNK_SIZE, hashlib отпускает GIL на время хеширования блока,
+      поэтому несколько файлов хешируются параллельно в пуле потоков
+    - результат кешируется по (путь, st_dev, st_ino, st_mtime_ns, st_size): файл хешируется заново,
+      только если изменился
+    - сумма исходного файла при открытии считается в фоне (submit), в общем пуле приложения
+    - манифест выходного каталога пишется в формате b2sum и проверяется на стороне станка командой 'b2sum -c'
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor, Future
+from typing import Optional, Iterable
+from config import THREADS
+
+CHUNK_SIZE = 1024 * 1024  # Байт
+DIGEST_SIZE = 64  # Байт, как у b2sum по умолчанию
+MANIFEST_NAME = "MANIFEST.b2"
+
+
+class DigestService:
+    """
+    Использование:
+        DigestService.digest(path)  # 'a3f1...'
+        future = DigestService.submit(DigestService.digest, path)  # В пуле EXECUTOR
+        digests = DigestService().digest_many(paths)  # {path: 'a3f1...'}
+        DigestService.write_manifest(digests, os.path.join(output, MANIFEST_NAME), root=output)
+    """
+    CACHE_SIZE = 4096
+    _cache: OrderedDict = OrderedDict()  # (path, st_dev, st_ino, st_mtime_ns, st_size): hexdigest
+    _lock = threading.Lock()
+    EXECUTOR: Optional[Executor] = None  # Общий пул приложения (main.create_executor)
+    _default_executor: Optional[ThreadPoolExecutor] = None  # Если общий пул не задан
+
+    def __init__(self, executor: Optional[Executor] = None):
+        self.executor = executor
+
+    @classmethod
+    def digest(cls, path: str, attrs: Optional[os.stat_result] = None) -> str:
+        """ :param attrs: результат os.stat, если он уже получен вызывающим кодом """
+        attrs = attrs or os.stat(path)
+        key = (os.path.normcase(os.path.abspath(path)), attrs.st_dev, attrs.st_ino, attrs.st_mtime_ns, attrs.st_size,)
+        with cls._lock:
+            if key in cls._cache:
+                cls._cache.move_to_end(key)
+                return cls._cache[key]
+        result = cls.hash_file(path)
+        with cls._lock:
+            cls._cache[key] = result
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return result
+
+    @classmethod
+    def submit(cls, function, *args) -> Future:
+        """ Выполнить function (например, digest) в общем пуле, не задерживая вызывающий поток """
+        executor = cls.EXECUTOR
+        if executor is None:
+            with cls._lock:
+                if cls._default_executor is None:
+                    cls._default_executor = ThreadPoolExecutor(max_workers=THREADS)
+                executor = cls._default_executor
+        return executor.submit(function, *args)
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        hash_ = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        buffer = bytearray(CHUNK_SIZE)
+        view = memoryview(buffer)
+        with open(path, "rb", buffering=0) as file:
+            while size := file.readinto(buffer):
+                hash_.update(view[:size])
+        return hash_.hexdigest()
+
+    def digest_many(self, paths: Iterable[str]) -> dict[str, str]:
+        paths = list(paths)
+        if self.executor is not None:
+            return dict(zip(paths, self.executor.map(self.digest, paths)))
+        with ThreadPoolExecutor(max_workers=THREADS) as executor:
+            return dict(zip(paths, executor.map(self.digest, paths)))
+
+    @staticmethod
+    def write_manifest(digests: dict[str, str], manifest_path: str, root: Optional[str] = None):
+        """ Строки вида '<hexdigest>  <путь относительно root>', пути через '/' """
+        root = root or os.path.dirname(manifest_path)
+        with open(manifest_path, "wt", encoding="utf-8", newline="\n") as manifest:
+            for path, hexdigest in sorted(digests.items(), key=lambda item: item[0]):
+                manifest.write(f"{hexdigest}  {os.path.relpath(path, root).replace(os.path.sep, '/')}\n")
+
+    @staticmethod
+    def read_manifest(manifest_path: str, root: Optional[str] = None) -> dict[str, str]:
+        root = root or os.path.dirname(manifest_path)
+        result = {}
+        with open(manifest_path, "rt", encoding="utf-8") as manifest:
+            for line in manifest:
+                hexdigest, _, name = line.rstrip("\n").partition("  ")
+                result[os.path.normpath(os.path.join(root, name))] = hexdigest
+        return result
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._cache.clear()
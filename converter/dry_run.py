@@ -0,0 +1,113 @@
+"""
+Пробный прогон (dry-run) набора правил по архиву программ.
+Каждая программа читается потоково и проходит через скомпилированные правила, ничего не записывая на диск.
+На выходе по каждому файлу - количество срабатываний каждого правила
+и, опционально, unified diff, который строится лениво (только при запросе) и ограничен по размеру.
+"""
+import difflib
+import itertools
+from collections import Counter
+from concurrent.futures import Executor, as_completed
+from typing import Optional, Iterable, Iterator
+from operations import RuleSet
+
+
+class DryRunResult:
+    """ Сводка изменений по одному файлу """
+    def __init__(self, path: str, rules: RuleSet, counts: Counter, lines: int, diff_limit: int = 0,
+                 error: Optional[Exception] = None):
+        self.path = path
+        self.counts: dict[str, int] = dict(counts)
+        self.lines = lines
+        self.error = error
+        self._rules = rules
+        self._diff_limit = diff_limit
+
+    @property
+    def changes(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.changes)
+
+    def diff(self, limit: Optional[int] = None) -> Iterator[str]:
+        """
+        Unified diff между исходной программой и результатом обработки.
+        Файл перечитывается только в момент итерации по результату этого метода.
+        :param limit: максимальный размер diff в символах, после которого вывод обрывается
+        """
+        limit = self._diff_limit if limit is None else limit
+        if not self.has_changes or not limit:
+            return iter(tuple())
+
+        def gen():
+            with open(self.path, "rt", encoding="utf-8") as file:
+                origin = file.readlines()
+            new = list(self._rules.stream(origin))
+            size = 0
+            for line in difflib.unified_diff(origin, new, fromfile=self.path, tofile=f"{self.path} (dry-run)"):
+                size += len(line)
+                if size > limit:
+                    yield f"... diff обрезан: превышен лимит {limit} символов\n"
+                    return
+                yield line
+        return gen()
+
+    def __str__(self):
+        if self.error is not None:
+            return f"{self.path}: ошибка - {self.error}"
+        counts = ", ".join(f"{key}={value}" for key, value in sorted(self.counts.items()))
+        return f"{self.path}: {self.changes} изменений в {self.lines} строках ({counts or 'без изменений'})"
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.path!r}, {self.counts})"
+
+
+class DryRun:
+    """
+    Использование:
+        with create_executor() as executor:  # main.create_executor - общий пул приложения
+            for result in DryRun(rules, with_diff=True).start(paths, executor):
+                print(result)
+                print("".join(result.diff()))
+    """
+    DIFF_LIMIT = 64 * 1024  # Символов на один файл
+
+    def __init__(self, rules: RuleSet, with_diff: bool = False, diff_limit: Optional[int] = None):
+        if not isinstance(rules, RuleSet):
+            raise TypeError
+        self.rules = rules
+        self.diff_limit = (self.DIFF_LIMIT if diff_limit is None else diff_limit) if with_diff else 0
+
+    def check(self, path: str) -> DryRunResult:
+        """ Прогнать одну программу через правила, результат обработки не сохраняется """
+        counter = Counter()
+        lines = 0
+
+        def read(file):
+            nonlocal lines
+            for line in file:
+                lines += 1
+                yield line
+        try:
+            with open(path, "rt", encoding="utf-8") as file:
+                for _ in self.rules.stream(read(file), counter):
+                    pass
+        except (OSError, UnicodeDecodeError) as error:
+            return DryRunResult(path, self.rules, counter, lines, error=error)
+        return DryRunResult(path, self.rules, counter, lines, diff_limit=self.diff_limit)
+
+    def start(self, paths: Iterable[str], executor: Executor, chunk_size: int = 256) -> Iterator[DryRunResult]:
+        """
+        Результаты отдаются по мере готовности (не в порядке paths).
+        В пул одновременно ставится не больше chunk_size задач, чтобы не держать в памяти весь архив.
+        """
+        paths = iter(paths)
+        while True:
+            futures = [executor.submit(self.check, path) for path in itertools.islice(paths, chunk_size)]
+            if not futures:
+                return
+            for future in as_completed(futures):
+                yield future.result()
+
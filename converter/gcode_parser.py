@@ -0,0 +1,237 @@
+"""
+Разбор программы в столбцы NumPy.
+Один элемент каждого столбца - один кадр (строка файла), отсутствующее в кадре слово - NaN.
+Разбор идёт по байтам целиком: комментарии и пробелы удаляются на уровне C (re.sub, bytes.translate),
+слова выделяются одним re.findall, числа переводятся во float одним astype.
+"""
+import os
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional, Iterable, Union
+import numpy as np
+
+PARSER_VERSION = 1  # Увеличивать при любом изменении результата разбора (см. кеш разобранных программ)
+WORDS = ("N", "G", "X", "Y", "Z", "I", "J", "K", "F", "S")
+MODAL_WORDS = ("G", "X", "Y", "Z", "F", "S")  # Значение сохраняется до следующего явного указания
+MOTION_CODES = (0., 1., 2., 3.)  # В столбец G попадает только модальная группа перемещений
+COMMENT = re.compile(rb"\([^)\n]*\)|;[^\n]*")
+WORD = re.compile(rb"\n|[A-Z][-+.0-9]*")
+SPACES = b" \t\r"
+CHUNK_SIZE = 32 * 1024 * 1024  # Байт, часть файла для одного процесса в parse_parallel
+
+
+def forward_fill(column: np.ndarray, initial: float = np.nan) -> np.ndarray:
+    """ Протянуть последнее известное значение вперёд: [nan, 1, nan, 2, nan] -> [initial, 1, 1, 2, 2] """
+    valid = ~np.isnan(column)
+    index = np.where(valid, np.arange(len(column)), 0)
+    np.maximum.accumulate(index, out=index)
+    result = column[index]
+    if len(column) and not valid[0]:
+        result[:np.argmax(valid) if valid.any() else len(column)] = initial
+    return result
+
+
+def format_number(value: float, precision: int = 3) -> str:
+    """ Запись числа как у CAM: 50.531, -.771, 150., 0. """
+    text = f"{value:.{precision}f}".rstrip("0")
+    if text.startswith("0."):
+        text = text[1:]
+    elif text.startswith("-0."):
+        text = f"-{text[2:]}"
+    return "0." if text in (".", "-.") else text
+
+
+def to_float(values: np.ndarray) -> np.ndarray:
+    """ Массив байтовых строк -> float64. Нечитаемые значения ('-', '1.2.3') -> NaN """
+    try:
+        return values.astype(np.float64)
+    except ValueError:
+        def convert(value):
+            try:
+                return float(value)
+            except ValueError:
+                return np.nan
+        return np.fromiter(map(convert, values), dtype=np.float64, count=len(values))
+
+
+class ParsedProgram:
+    """
+    Столбцы разобранной программы.
+        program["X"] - значения, указанные в кадрах явно
+        program.modal("X") - значения с учётом модальности (действующие в каждом кадре)
+    """
+    def __init__(self, columns: dict[str, np.ndarray], length: Optional[int] = None,
+                 modal: Optional[dict[str, np.ndarray]] = None):
+        """ :param modal: уже протянутые столбцы модальных слов (с начальным значением NaN) """
+        self._columns = columns
+        self._length = length if length is not None else len(next(iter(columns.values()), ()))
+        self._modal: dict[str, np.ndarray] = {f"{word}:{np.nan}": column for word, column in (modal or {}).items()}
+
+    @property
+    def columns(self) -> dict[str, np.ndarray]:
+        return self._columns
+
+    @property
+    def block_numbers(self) -> np.ndarray:
+        """ Номера кадров, а где N не указан - номер строки (с 1) """
+        numbers = self._columns["N"]
+        return np.where(np.isnan(numbers), np.arange(1, self._length + 1), numbers).astype(np.int64)
+
+    def modal(self, word: str, initial: float = np.nan) -> np.ndarray:
+        if word not in MODAL_WORDS:
+            raise KeyError(f"Слово {word} не модальное")
+        key = f"{word}:{initial}"
+        if key not in self._modal:
+            self._modal[key] = forward_fill(self._columns[word], initial)
+        return self._modal[key]
+
+    def deltas(self, axes: Iterable[str] = ("X", "Y", "Z")) -> np.ndarray:
+        """ Перемещение по каждой оси в каждом кадре, shape (осей, кадров). Пока координата не известна - 0 """
+        deltas = []
+        for axis in axes:
+            position = self.modal(axis)
+            delta = np.diff(position, prepend=position[:1])
+            delta[np.isnan(delta)] = 0
+            deltas.append(delta)
+        return np.stack(deltas) if deltas else np.zeros((0, self._length))
+
+    def __getitem__(self, word: str) -> np.ndarray:
+        return self._columns[word]
+
+    def __contains__(self, word: str):
+        return word in self._columns
+
+    def __len__(self):
+        return self._length
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._length} кадров)"
+
+
+def tokenize(data: bytes) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Слова программы без комментариев и пробелов.
+    :return: буквы (uint8, для переноса строки - ord('\\n')), значения (байтовые строки),
+    номер строки каждого слова, количество строк
+    """
+    clean = COMMENT.sub(b"", data).translate(None, SPACES)
+    length = clean.count(b"\n") + (1 if clean and not clean.endswith(b"\n") else 0)
+    tokens = np.array(WORD.findall(clean) or [b""])
+    width = tokens.dtype.itemsize
+    raw = tokens.view(np.uint8).reshape(-1, width)
+    letters = raw[:, 0]
+    values = np.ascontiguousarray(raw[:, 1:]).view(f"S{max(width - 1, 1)}").ravel() if width > 1 else \
+        np.zeros(len(tokens), dtype="S1")
+    line_index = np.cumsum(letters == ord("\n")) if len(tokens) else np.zeros(0, dtype=np.int64)
+    return letters, values, line_index, length
+
+
+def parse(data: bytes, words: Iterable[str] = WORDS) -> ParsedProgram:
+    """ :param data: содержимое файла программы целиком """
+    return parse_tokens(tokenize(data), words)
+
+
+def parse_tokens(tokens: tuple[np.ndarray, np.ndarray, np.ndarray, int], words: Iterable[str] = WORDS) -> ParsedProgram:
+    """ Столбцы из результата tokenize - когда слова программы нужны ещё для чего-то, кроме разбора """
+    letters, values, line_index, length = tokens
+    has_value = values != b""
+    columns = {}
+    for word in words:
+        mask = (letters == ord(word)) & has_value
+        column = np.full(length, np.nan)
+        numbers = to_float(values[mask])
+        lines = line_index[mask]
+        if word == "G":
+            motion = np.isin(numbers, MOTION_CODES)
+            numbers, lines = numbers[motion], lines[motion]
+        column[lines] = numbers
+        columns[word] = column
+    return ParsedProgram(columns, length)
+
+
+def parse_file(path: Union[str, bytes], words: Iterable[str] = WORDS, workers: int = 1) -> ParsedProgram:
+    """ :param workers: больше 1 - разбор частями в пуле процессов (см. parse_parallel) """
+    if workers > 1 and os.path.getsize(path) > CHUNK_SIZE:
+        return parse_parallel(path, words, workers)
+    with open(path, "rb") as file:
+        return parse(file.read(), words)
+
+
+def split_chunks(path: Union[str, bytes], chunk_size: int = CHUNK_SIZE) -> list[tuple[int, int]]:
+    """ Границы частей файла (начало, конец) по chunk_size байт, каждая часть заканчивается переносом строки """
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as file:
+        while bounds[-1] + chunk_size < size:
+            file.seek(bounds[-1] + chunk_size)
+            file.readline()
+            bounds.append(min(file.tell(), size))
+    if bounds[-1] != size:
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_chunk(path: Union[str, bytes], start: int, end: int, words: tuple[str, ...]) -> ParsedProgram:
+    """ Выполняется в процессе пула: часть файла читается на месте, а не передаётся из главного процесса """
+    with open(path, "rb") as file:
+        file.seek(start)
+        program = parse(file.read(end - start), words)
+    for word in MODAL_WORDS:
+        if word in program:
+            program.modal(word)
+    return program
+
+
+def parse_parallel(path: Union[str, bytes], words: Iterable[str] = WORDS, workers: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE, executor: Optional[Executor] = None) -> ParsedProgram:
+    """
+    Разбор большого файла частями в пуле процессов.
+    Каждая часть разбирается и протягивает модальные слова независимо, затем последовательный проход по частям
+    заполняет начало каждой части (до первого явного значения) последним значением предыдущей части.
+    """
+    words = tuple(words)
+    chunks = split_chunks(path, chunk_size)
+    arguments = ([path] * len(chunks), *zip(*chunks), [words] * len(chunks))
+    if executor is not None:
+        programs = list(executor.map(_parse_chunk, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            programs = list(pool.map(_parse_chunk, *arguments))
+    length = sum(map(len, programs))
+    columns = {word: np.concatenate([program[word] for program in programs]) if programs else np.full(0, np.nan)
+               for word in words}
+    modal = {}
+    for word in filter(lambda w: w in MODAL_WORDS, words):
+        parts = [program.modal(word) for program in programs]
+        for previous, part in zip(parts[:-1], parts[1:]):
+            if len(previous) and len(part) and np.isnan(part[0]):
+                defined = ~np.isnan(part)
+                part[:np.argmax(defined) if defined.any() else len(part)] = previous[-1]
+        modal[word] = np.concatenate(parts) if parts else np.full(0, np.nan)
+    return ParsedProgram(columns, length, modal)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "exemple")
+    paths = [os.path.join(folder, name) for folder, _, names in os.walk(root) for name in names]
+    with tempfile.NamedTemporaryFile(suffix=".tap", delete=False) as big:
+        while big.tell() < 200 * 2 ** 20:
+            for path in paths:
+                with open(path, "rb") as file:
+                    big.write(file.read())
+    try:
+        start = time.perf_counter()
+        sequential = parse_file(big.name)
+        sequential.modal("X")
+        print(f"1 процесс: {time.perf_counter() - start:.2f} с, {len(sequential)} кадров")
+        for workers in sorted({2, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            parallel = parse_parallel(big.name, workers=workers)
+            print(f"{workers} процессов: {time.perf_counter() - start:.2f} с")
+            assert len(parallel) == len(sequential)
+            assert np.array_equal(parallel.modal("X"), sequential.modal("X"), equal_nan=True)
+    finally:
+        os.remove(big.name)
@@ -0,0 +1,143 @@
+"""
+Извлечение переменных из 'шапки' программы (записи HeadVarible).
+Все переменные одной стойки (Cnc) собираются в одно скомпилированное регулярное выражение,
+которое проходит по шапке один раз, - стоимость зависит от размера шапки, а не от количества переменных.
+Выражение не поглощает текст (lookahead), поэтому переменные, чьи вхождения перекрываются
+(например, несколько переменных в одной строке), тоже находятся. Переменная совпадения определяется по имени группы,
+а в той же позиции дополнительно проверяются только переменные, чей постоянный префикс совместим с найденной.
+Шапка - начало файла до первого кадра перемещения G0/G1, но не больше HEAD_LIMIT байт.
+"""
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Iterable
+
+HEAD_LIMIT = 16 * 1024  # Байт
+HEAD_END = re.compile(r"^(?:N\d+\s*)?G0?[01](?!\d)", re.MULTILINE)
+
+
+class HeadVariblePattern:
+    """
+    Переменная из шапки на основе записи SearchString:
+        inner_[lindex:rindex] - значение переменной (rindex=-1 - до конца строки),
+        inner_[lignoreindex:rignoreindex] - произвольный текст, который нужно пропустить
+    """
+    def __init__(self, name: str, inner_: str, lindex: int = 0, rindex: int = -1, ignorecase: bool = True,
+                 lignoreindex: Optional[int] = 0, rignoreindex: Optional[int] = 0, **_):
+        if not isinstance(name, str) or not isinstance(inner_, str):
+            raise TypeError
+        if not name or not inner_:
+            raise ValueError
+        self.name = name
+        self.inner = inner_
+        self.ignorecase = ignorecase
+        self.value_place = (lindex, len(inner_) if rindex == -1 else rindex,)
+        self.ignore_place = (lignoreindex, rignoreindex,) if lignoreindex != rignoreindex and \
+            lignoreindex is not None and rignoreindex is not None else None
+
+    @property
+    def prefix(self) -> str:
+        """ Постоянное начало текста переменной: до значения и до пропускаемого текста """
+        end = self.value_place[0]
+        if self.ignore_place is not None:
+            end = min(end, self.ignore_place[0])
+        return self.inner[:end]
+
+    def may_start_with(self, other: "HeadVariblePattern") -> bool:
+        """ Могут ли вхождения двух переменных начинаться в одной позиции """
+        prefix, other_prefix = self.prefix, other.prefix
+        if self.ignorecase or other.ignorecase:
+            prefix, other_prefix = prefix.casefold(), other_prefix.casefold()
+        return prefix.startswith(other_prefix) or other_prefix.startswith(prefix)
+
+    def pattern(self, group_name: str) -> str:
+        """ Регулярное выражение переменной, значение - в именованной группе group_name """
+        def literal(start, end):
+            if self.ignore_place is None:
+                return re.escape(self.inner[start:end])
+            left, right = self.ignore_place
+            if end <= left or start >= right:
+                return re.escape(self.inner[start:end])
+            return f"{re.escape(self.inner[start:left])}.*?{re.escape(self.inner[right:end])}" \
+                if start <= left else f".*?{re.escape(self.inner[right:end])}"
+        start, end = self.value_place
+        prefix, suffix = literal(0, start), literal(end, len(self.inner))
+        value = fr"(?P<{group_name}>[^\n]+?)" if suffix else fr"(?P<{group_name}>[^\n)]*?)(?=\s*\)?\s*$)"
+        return f"{'(?i:' if self.ignorecase else '(?:'}{prefix}{value}{suffix})"
+
+
+class HeadVaribleExtractor:
+    """
+    Использование:
+        extractor = HeadVaribleExtractor.from_rows(rows)  # rows: пары (HeadVarible, SearchString)
+        extractor.extract(path)  # {'cutting_time': '3.15', ...}
+    """
+    CACHE_SIZE = 4096
+    _cache: OrderedDict = OrderedDict()  # (path, mtime, size, version): {name: value}
+    _lock = threading.Lock()
+
+    def __init__(self, varibles: Iterable[HeadVariblePattern], head_limit: int = HEAD_LIMIT):
+        self.varibles = tuple(varibles)
+        self.head_limit = head_limit
+        self._group_names = {f"v{index}": var.name for index, var in enumerate(self.varibles)}
+        patterns = [var.pattern(group) for group, var in zip(self._group_names, self.varibles)]
+        self._regex = re.compile(f"(?={'|'.join(patterns)})", re.MULTILINE) if self.varibles else None
+        compiled = {group: re.compile(pattern, re.MULTILINE) for group, pattern in zip(self._group_names, patterns)}
+        self._overlaps: dict[str, tuple[tuple[str, re.Pattern], ...]] = {  # Группа: переменные с совместимым префиксом
+            group: tuple((other, compiled[other]) for other, other_var in zip(self._group_names, self.varibles)
+                         if other != group and var.may_start_with(other_var))
+            for group, var in zip(self._group_names, self.varibles)}
+        self.version = hashlib.blake2b(repr([(var.name, self._regex.pattern if self._regex else "",)
+                                             for var in self.varibles]).encode("utf-8"),
+                                       digest_size=8).hexdigest()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[dict, dict]], **kwargs) -> "HeadVaribleExtractor":
+        """ :param rows: пары словарей-значений записей (HeadVarible, SearchString) одной стойки """
+        return cls((HeadVariblePattern(name=head_var["name"], **search_string) for head_var, search_string in rows), **kwargs)
+
+    def read_head(self, path: str) -> str:
+        with open(path, "rb") as file:
+            data = file.read(self.head_limit).decode("utf-8", errors="replace")
+        end = HEAD_END.search(data)
+        return data[:end.start()] if end else data
+
+    def parse(self, head: str) -> dict[str, str]:
+        """ Все переменные из текста шапки за 1 проход. Если переменная встречается несколько раз - первое вхождение """
+        result = {}
+        if self._regex is None:
+            return result
+        found = set()
+        for match in self._regex.finditer(head):
+            found.add(match.lastgroup)
+            result.setdefault(self._group_names[match.lastgroup], match.group(match.lastgroup).strip())
+            for group, pattern in self._overlaps[match.lastgroup]:  # Другие переменные, начинающиеся в той же позиции
+                if group not in found:
+                    other = pattern.match(head, match.start())
+                    if other is not None:
+                        found.add(group)
+                        result.setdefault(self._group_names[group], other.group(group).strip())
+            if len(found) == len(self._group_names):
+                break
+        return result
+
+    def extract(self, path: str) -> dict[str, str]:
+        attrs = os.stat(path)
+        key = (path, attrs.st_mtime_ns, attrs.st_size, self.version,)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key].copy()
+        result = self.parse(self.read_head(path))
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result.copy()
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._cache.clear()
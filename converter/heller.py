@@ -1,6 +1,6 @@
 import os
 import re
-from typing import Any, Optional
+from typing import Any, Optional, Iterable
 from collection import Session
 from cnc_file import CNCFile
 from abstractions import AbstractMachine
@@ -18,11 +18,14 @@ class HellerCNCFile(CNCFile):
     LAST_SYMBOL = ";"
     REPLACEMENT_QUEUE = {";": ""}
 
-    def __init__(self, **kwargs):
+    def __init__(self, output_name: Optional[str] = None, **kwargs):
+        """
+        :param output_name: полный путь выходного файла, заранее вычисленный BatchRenamer
+        """
         self.__origin: str = self.DEFAULT_ORIGIN
         self.__target: Optional[os.open] = None
         super().__init__(**kwargs)
-        self.__path: str = os.path.join(self.get_output_path(
+        self.__path: str = output_name or os.path.join(self.get_output_path(
             self.get_clear_path(kwargs['path'])), self.get_filename(self._name, self._format_)
         )
         self.__target = self.open(self.__path, "xt")
@@ -37,6 +40,23 @@ class HellerCNCFile(CNCFile):
         if val in self.ORIGIN_ENUMERATION:
             self.__origin = val
 
+    @property
+    def output_path(self) -> str:
+        return self.__path
+
+    def save(self, lines: Iterable[str]) -> Optional[str]:
+        """
+        Записать новую шапку и строки программы в выходной файл
+        :return: путь выходного файла или None, если файл уже существовал и не открывался
+        """
+        if self.__target is None:
+            return
+        with self.__target as target:
+            target.write(f"{self.__head_inner or self.create_new_head()}\n")
+            target.writelines(lines)
+        self.__target = None
+        return self.__path
+
     def create_new_head(self):
         mpf_str = self.add_mpf_string()
         inner = "\n".join((mpf_str, self.__origin, "G64"))
@@ -46,8 +66,7 @@ class HellerCNCFile(CNCFile):
     @classmethod
     def get_output_path(cls, p: str = ""):
         path = os.path.join(MACHINES_OUTPUT_PATH[HELLER], p)
-        if not os.path.exists(path):
-            os.makedirs(path, mode=0o777)
+        os.makedirs(path, mode=0o777, exist_ok=True)
         return path
 
     @classmethod
@@ -60,6 +79,10 @@ class HellerCNCFile(CNCFile):
         p = p.replace(MACHINES_INPUT_PATH[HELLER] + os.path.sep, "")
         return p
 
+    @staticmethod
+    def get_program_number(name: str) -> str:
+        """ Номер программы из имени файла: '100tor30' -> '100' """
+        return re.match(r"\D*(\d+)\D*", name, re.S).groups()[0]
+
     def add_mpf_string(self) -> str:
-        clear_name_num = re.match(r"\D*(\d+)\D*", self._name, re.S).groups()[0]
-        return f"%mpf{clear_name_num}"
+        return f"%mpf{self.get_program_number(self._name)}"
@@ -1,25 +1,63 @@
-from typing import Any
+import os
+import itertools
+from concurrent.futures import Executor
+from typing import Any, Optional, Iterable
 from abstractions import AbstractMachine
 from config import HELLER
 from heller import HellerCNCFile
 from collection import Session
+from rename import BatchRenamer, RenameRule
+from digest import DigestService, MANIFEST_NAME
 
 
 class Machine(AbstractMachine):
     CNC_FILE_TYPE = {HELLER: HellerCNCFile}
 
     @classmethod
-    def create_session(cls, data, name):
-        session = Session(data, type_=cls.CNC_FILE_TYPE[name])
+    def create_session(cls, data, name, rename: Optional[RenameRule] = None):
+        file_type = cls.CNC_FILE_TYPE[name]
+        data = cls.plan_output_names(data, file_type, rename)
+        session = Session(data, type_=file_type)
         return session
 
+    @staticmethod
+    def plan_output_names(data: list[dict[str, Any]], file_type, rename: Optional[RenameRule] = None):
+        """ Вычислить имена всех выходных файлов задания разом (см. BatchRenamer) """
+        if not hasattr(file_type, "get_output_path"):
+            return data
+        outputs = [{"name": item["name"], "frmt": item.get("frmt"),
+                    "output": file_type.get_output_path(file_type.get_clear_path(item["path"]))} for item in data]
+        targets = BatchRenamer(rename, file_type=file_type).plan(outputs)
+        return [{**item, "output_name": targets[(output["output"], output["name"], output["frmt"],)]}
+                for item, output in zip(data, outputs)]
+
     @classmethod
     def get_session_status(cls):
         pass
 
+    @staticmethod
+    def write_manifests(paths: Iterable[str], executor: Optional[Executor] = None):
+        """
+        Контрольные суммы выходных файлов - в манифест каждого выходного каталога (проверка на станке: b2sum -c).
+        Записи о файлах из предыдущих заданий в том же каталоге сохраняются.
+        """
+        folders: dict[str, dict[str, str]] = {}
+        for path, hexdigest in DigestService(executor).digest_many(paths).items():
+            folders.setdefault(os.path.dirname(path), {})[path] = hexdigest
+        for folder, digests in folders.items():
+            manifest = os.path.join(folder, MANIFEST_NAME)
+            stored = DigestService.read_manifest(manifest) if os.path.exists(manifest) else {}
+            DigestService.write_manifest({**stored, **digests}, manifest)
+
     @classmethod
-    def start(cls, data: list[dict[str, Any]], filename: str = "", machine_name: str = ""):
+    def start(cls, data: list[dict[str, Any]], filename: str = "", machine_name: str = "",
+              executor: Optional[Executor] = None):
+        """ :param executor: общий пул приложения (main.create_executor), в нём считаются контрольные суммы """
         session: Session = cls.create_session(data, machine_name)
+        saved = []
         for file in session:
             if file.is_valid_tail(file[-1]):
                 head_inner = file.create_new_head()
+                saved.append(file.save(itertools.islice(file, file.parse_head()[1], None)))
+        session.close()
+        cls.write_manifests(filter(None, saved), executor)
@@ -1,11 +1,20 @@
 import re
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Iterator
 from machine import Machine
+from operations import RuleSet
+from dry_run import DryRun, DryRunResult
+from digest import DigestService
 from config import INPUT_PATH_ROOT
 from decorators import *
 
 
+def create_executor() -> ThreadPoolExecutor:
+    """ Общий пул потоков для конвертации и пробного прогона """
+    return ThreadPoolExecutor(max_workers=THREADS)
+
+
 @init_path_tree
 def main():
     def sort_data(data):
@@ -28,20 +37,34 @@ def main():
     match_group_dict = map(lambda x: x.groupdict(), match_objects)
     sorted_group = map(lambda s: sort_data(s), match_group_dict)
     cleaned_data = clean_dubikat(sorted_group)
-    with ThreadPoolExecutor(max_workers=THREADS) as executor:
-        while True:
-            try:
-                data = next(cleaned_data)
-            except StopIteration:
-                break
-            else:
-                machine_name = tuple(data.keys())[0]
-                if f"{machine_name}.py" not in os.listdir():
-                    raise ImportError(f"Нет файла {machine_name}")
-                if machine_name not in Machine.CNC_FILE_TYPE.keys():
-                    raise ImportError(f"Отсутствует модуль CNC_File для станка {machine_name}")
-                #executor.submit(Machine.start, data, machine_name=machine_name)
-                Machine.start(data.pop(machine_name), machine_name=machine_name)
+    with create_executor() as executor:
+        DigestService.EXECUTOR = executor  # Суммы исходных файлов считаются в общем пуле
+        try:
+            while True:
+                try:
+                    data = next(cleaned_data)
+                except StopIteration:
+                    break
+                else:
+                    machine_name = tuple(data.keys())[0]
+                    if f"{machine_name}.py" not in os.listdir():
+                        raise ImportError(f"Нет файла {machine_name}")
+                    if machine_name not in Machine.CNC_FILE_TYPE.keys():
+                        raise ImportError(f"Отсутствует модуль CNC_File для станка {machine_name}")
+                    #executor.submit(Machine.start, data, machine_name=machine_name)
+                    Machine.start(data.pop(machine_name), machine_name=machine_name, executor=executor)
+        finally:
+            DigestService.EXECUTOR = None
+
+
+def preview(rules: RuleSet, executor: Executor, with_diff: bool = False) -> Iterator[DryRunResult]:
+    """
+    Пробный прогон: показать, что изменят правила во всех программах входных каталогов, ничего не записывая.
+    Результаты отдаются по мере готовности.
+    :param executor: общий пул, см. create_executor
+    """
+    paths = map(lambda match: match.string, scan_folders())
+    yield from DryRun(rules, with_diff=with_diff).start(paths, executor)
 
 
 def scan_folders():
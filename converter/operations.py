@@ -0,0 +1,263 @@
+"""
+Скомпилированные правила (операции) для построчной обработки программ.
+Исходные данные - строки таблиц Comment, Uncomment, Remove, Replace, Insert (см. database/models).
+Правила собираются в RuleSet один раз, после чего каждая строка программы проходит через все правила за 1 проход:
+    - правила с полным совпадением (iffullmatch) лежат в словаре: строка -> правила
+    - правила с частичным совпадением (ifcontains) объединены в одно регулярное выражение-фильтр
+    - вставки (Insert) лежат в словаре: нормализованная целевая строка -> вставки до/после неё
+"""
+import re
+import hashlib
+from collections import Counter
+from typing import Optional, Iterable, Iterator, Type
+
+BLOCK_NUMBER = re.compile(r"^\s*N\d+\s*")
+
+
+def strip_block_number(line: str) -> str:
+    """ Отделить номер кадра: 'N18 G1 Z-3.494 F500' -> 'G1 Z-3.494 F500' """
+    return BLOCK_NUMBER.sub("", line, count=1).rstrip()
+
+
+def normalize(line: str) -> str:
+    """ Ключ для поиска целевой строки вставки: без номера кадра, лишних пробелов и регистра """
+    return " ".join(strip_block_number(line).split()).upper()
+
+
+def get_block_number(line: str) -> str:
+    """ Номер кадра вместе с разделителем: 'N18 G1 Z-3.494' -> 'N18 ' """
+    match = BLOCK_NUMBER.match(line)
+    return match.group() if match else ""
+
+
+class Rule:
+    """
+    Одно правило - одна запись из таблицы операций.
+    Метод apply возвращает новую строку или None, если строку нужно удалить.
+    """
+    MODEL_NAME = ""
+    PRIMARY_KEY = ""
+
+    def __init__(self, findstr: str = "", iffullmatch=False, ifcontains=False, comment_symbol=";", **row):
+        if not isinstance(findstr, str):
+            raise TypeError
+        if not findstr:
+            raise ValueError("Пустая строка поиска")
+        self.key = f"{self.MODEL_NAME}:{row.get(self.PRIMARY_KEY)}"
+        self.findstr = findstr
+        self.full_match = bool(iffullmatch)
+        self.comment_symbol = comment_symbol
+
+    def match(self, body: str) -> bool:
+        if self.full_match:
+            return body == self.findstr
+        return self.findstr in body
+
+    def apply(self, line: str) -> Optional[str]:
+        return line
+
+    def definition(self) -> tuple:
+        """ Всё, от чего зависит результат работы правила. Используется для вычисления версии набора правил """
+        return type(self).__name__, self.key, self.findstr, self.full_match
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.key}, {self.findstr!r})"
+
+
+class CommentRule(Rule):
+    MODEL_NAME = "Comment"
+    PRIMARY_KEY = "commentid"
+
+    def apply(self, line):
+        number, body = get_block_number(line), strip_block_number(line)
+        if self.comment_symbol == "(":
+            return f"{number}({body})"
+        return f"{number}{self.comment_symbol}{body}"
+
+
+class UncommentRule(Rule):
+    MODEL_NAME = "Uncomment"
+    PRIMARY_KEY = "uid"
+
+    def match(self, body):
+        return super().match(self.uncomment(body)) if self.is_comment(body) else False
+
+    def is_comment(self, body: str) -> bool:
+        return body.startswith(self.comment_symbol)
+
+    def uncomment(self, body: str) -> str:
+        body = body[len(self.comment_symbol):]
+        if self.comment_symbol == "(" and body.endswith(")"):
+            body = body[:-1]
+        return body.strip()
+
+    def apply(self, line):
+        return f"{get_block_number(line)}{self.uncomment(strip_block_number(line))}"
+
+
+class RemoveRule(Rule):
+    MODEL_NAME = "Remove"
+    PRIMARY_KEY = "removeid"
+
+    def apply(self, line):
+        return
+
+
+class ReplaceRule(Rule):
+    MODEL_NAME = "Replace"
+    PRIMARY_KEY = "replaceid"
+
+    def __init__(self, item: str = "", **kwargs):
+        super().__init__(**kwargs)
+        if not isinstance(item, str):
+            raise TypeError
+        self.item = item
+
+    def apply(self, line):
+        if self.full_match:
+            return f"{get_block_number(line)}{self.item}"
+        return line.replace(self.findstr, self.item)
+
+    def definition(self):
+        return *super().definition(), self.item
+
+
+class InsertRule(Rule):
+    """ Вставка строки item до (before) или после (after) каждой строки target """
+    MODEL_NAME = "Insert"
+    PRIMARY_KEY = "insid"
+
+    def __init__(self, target: str = "", item: str = "", after=False, before=False, **kwargs):
+        super().__init__(findstr=target, iffullmatch=True, **kwargs)
+        if not isinstance(item, str):
+            raise TypeError
+        if not item:
+            raise ValueError("Пустая вставка")
+        if bool(after) == bool(before):
+            raise ValueError("Нужно выбрать один из вариантов: after или before")
+        self.item = item
+        self.after = bool(after)
+
+    def definition(self):
+        return *super().definition(), self.item, self.after
+
+
+RULE_TYPES: dict[str, Type[Rule]] = {rule.MODEL_NAME: rule for rule in (CommentRule, UncommentRule,
+                                                                        RemoveRule, ReplaceRule, InsertRule,)}
+
+
+class RuleSet:
+    """
+    Набор скомпилированных правил одной стойки (Cnc).
+    Порядок применения правил совпадает с порядком их добавления.
+    Каждое правило применяется к строке не больше одного раза: после того как правило изменило строку,
+    следующие за ним правила сопоставляются уже с новой строкой.
+    """
+    def __init__(self, rules: Iterable[Rule] = (), comment_symbol: str = ";"):
+        self.comment_symbol = comment_symbol
+        self._rules: list[Rule] = list(rules)
+        self._order: dict[Rule, int] = {}  # Правило: позиция в наборе
+        self._full_match: dict[str, list[Rule]] = {}
+        self._contains: list[Rule] = []
+        self._contains_filter: Optional[re.Pattern] = None
+        self._inserts: dict[str, tuple[list[InsertRule], list[InsertRule]]] = {}  # target: (before, after)
+        self._version: Optional[str] = None
+        self.compile()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[str, dict]], comment_symbol: str = ";") -> "RuleSet":
+        """
+        :param rows: пары (имя класса-модели, словарь значений записи), например ('Comment', {'commentid': 1, ...})
+        :param comment_symbol: Cnc.commentsymbol
+        """
+        rules = []
+        for model_name, row in rows:
+            if model_name not in RULE_TYPES:
+                raise KeyError(f"Нет правила для модели {model_name}")
+            row = {key: value for key, value in row.items() if not key.startswith("_")}
+            rules.append(RULE_TYPES[model_name](comment_symbol=comment_symbol, **row))
+        return cls(rules, comment_symbol=comment_symbol)
+
+    @property
+    def rules(self) -> tuple[Rule, ...]:
+        return tuple(self._rules)
+
+    @property
+    def version(self) -> str:
+        """ Хеш всех определений правил: меняется при любой правке набора """
+        if self._version is None:
+            data = repr((self.comment_symbol, [rule.definition() for rule in self._rules]))
+            self._version = hashlib.blake2b(data.encode("utf-8"), digest_size=8).hexdigest()
+        return self._version
+
+    def compile(self):
+        self._full_match, self._contains, self._inserts = {}, [], {}
+        self._order = {}
+        for position, rule in enumerate(self._rules):
+            self._order.setdefault(rule, position)
+            if isinstance(rule, InsertRule):
+                self._inserts.setdefault(normalize(rule.findstr), ([], [],))[rule.after].append(rule)
+            elif rule.full_match and not isinstance(rule, UncommentRule):
+                self._full_match.setdefault(rule.findstr, []).append(rule)
+            else:
+                self._contains.append(rule)
+        self._contains_filter = re.compile("|".join(map(lambda r: re.escape(r.findstr),
+                                                        self._contains))) if self._contains else None
+        self._version = None
+
+    def match(self, body: str) -> list[Rule]:
+        """ Правила, подходящие для строки (без номера кадра), в порядке их добавления """
+        found = self._full_match.get(body, [])
+        if self._contains_filter is not None and self._contains_filter.search(body):
+            found = found + [rule for rule in self._contains if rule.match(body)]
+            if len(found) > 1:
+                found.sort(key=self._order.__getitem__)
+        return found
+
+    def apply(self, line: str, counter: Optional[Counter] = None) -> Optional[str]:
+        """ Прогнать одну строку (без символа переноса) через правила """
+        rules = self.match(strip_block_number(line))
+        index = 0
+        while index < len(rules):
+            rule = rules[index]
+            index += 1
+            result = rule.apply(line)
+            if counter is not None and result != line:  # Правило, не изменившее строку, не считается
+                counter[rule.key] += 1
+            if result is None:
+                return
+            if result != line:  # Оставшиеся правила - по новой строке
+                line, position = result, self._order[rule]
+                rules = [other for other in self.match(strip_block_number(line)) if self._order[other] > position]
+                index = 0
+        return line
+
+    def stream(self, lines: Iterable[str], counter: Optional[Counter] = None) -> Iterator[str]:
+        """
+        Потоковая обработка: строки с переносом на входе, строки с переносом на выходе.
+        Вставки ищутся одним обращением к словарю на строку, вставки 'до' выводятся сразу, без буфера.
+        """
+        inserts = self._inserts
+        for line in lines:
+            line = line.rstrip("\r\n")
+            before, after = inserts.get(normalize(line), ((), (),)) if inserts else ((), (),)
+            for rule in before:
+                if counter is not None:
+                    counter[rule.key] += 1
+                yield f"{rule.item}\n"
+            result = self.apply(line, counter)
+            if result is not None:
+                yield f"{result}\n"
+            for rule in after:
+                if counter is not None:
+                    counter[rule.key] += 1
+                yield f"{rule.item}\n"
+
+    def __len__(self):
+        return len(self._rules)
+
+    def __iter__(self):
+        return iter(self._rules)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._rules})"
@@ -0,0 +1,125 @@
+"""
+Данные для быстрого просмотра траектории: пирамида прореженных ломаных (по умолчанию 1k/10k/100k точек).
+Уровень строится за один проход NumPy: траектория делится на интервалы по индексу, от каждого интервала
+остаются начальная точка и точка, дальше всех отстоящая от его хорды, - пики и углы не теряются.
+Точки смены холостого и рабочего хода сохраняются на всех уровнях.
+Пирамида хранится в записи кеша разобранной программы (preview.npz, см. cache) и вытесняется вместе с ней.
+"""
+import os
+from typing import Optional, Iterable, Union
+import numpy as np
+from cache import ProgramCache
+from gcode_parser import ParsedProgram
+
+AXES = ("X", "Y", "Z")
+LEVELS = (1_000, 10_000, 100_000)
+PREVIEW_VERSION = 1
+MAX_DRAW_POINTS = 20_000  # Точек в видимой области, которые виджет рисует без задержки
+
+
+def decimate(points: np.ndarray, rapid: np.ndarray, target: int) -> np.ndarray:
+    """ :return: индексы точек, которые остаются на уровне из target точек (примерно) """
+    count = len(points)
+    if count <= target:
+        return np.arange(count)
+    step = max(-(-2 * count // target), 2)  # По 2 точки с интервала
+    starts = np.arange(0, count, step)
+    owner = np.arange(count) // step
+    ends = np.minimum(starts + step, count - 1)
+    a, chord = points[starts][owner], (points[ends] - points[starts])[owner]
+    vector = points - a
+    square = np.einsum("ij,ij->i", chord, chord)
+    t = np.divide(np.einsum("ij,ij->i", vector, chord), square, out=np.zeros(count), where=square > 0)
+    distance = np.linalg.norm(vector - chord * t[:, None], axis=1)
+    farthest = np.maximum.reduceat(distance, starts)
+    candidates = np.flatnonzero(distance == farthest[owner])
+    _, first = np.unique(owner[candidates], return_index=True)
+    transitions = np.flatnonzero(rapid[1:] != rapid[:-1]) + 1
+    return np.unique(np.concatenate((starts, candidates[first], transitions, transitions - 1, [count - 1],)))
+
+
+class PreviewPyramid:
+    """
+    Использование:
+        pyramid = PreviewPyramid.load(path)
+        points, rapid = pyramid.level_for(xlim=(0, 100), ylim=(-50, 50))
+        draw(ax, pyramid)  # matplotlib, уровень детализации меняется при масштабировании
+    rapid[i] - перемещение в точку i холостое (G0)
+    """
+    def __init__(self, levels: dict[int, tuple[np.ndarray, np.ndarray]]):
+        self.levels = dict(sorted(levels.items()))
+
+    @classmethod
+    def from_program(cls, program: ParsedProgram, levels: Iterable[int] = LEVELS) -> "PreviewPyramid":
+        points = np.stack([program.modal(axis) for axis in AXES], axis=1)
+        known = ~np.isnan(points).any(axis=1)
+        moved = np.ones(len(points), dtype=bool)
+        moved[1:] = (points[1:] != points[:-1]).any(axis=1)
+        selected = known & moved
+        points, rapid = points[selected], (program.modal("G") == 0)[selected]
+        result = {}
+        for target in levels:
+            index = decimate(points, rapid, target)
+            result[target] = (points[index].astype(np.float32), rapid[index],)
+        return cls(result)
+
+    @classmethod
+    def load(cls, path: Union[str, bytes], cache: Optional[ProgramCache] = None,
+             levels: Iterable[int] = LEVELS) -> "PreviewPyramid":
+        cache = cache or ProgramCache()
+        levels = tuple(levels)
+        program = cache.load(path)
+        entry = cache.entry(path)
+        name = os.path.join(entry, f"preview-v{PREVIEW_VERSION}-{'-'.join(map(str, levels))}.npz")
+        if os.path.exists(name):
+            with np.load(name) as data:
+                return cls({level: (data[f"points{level}"], data[f"rapid{level}"],) for level in levels})
+        pyramid = cls.from_program(program, levels)
+        if os.path.isdir(entry):
+            temporary = f"{name}.tmp.npz"
+            np.savez(temporary, **{f"{kind}{level}": array for level, (points, rapid) in pyramid.levels.items()
+                                   for kind, array in (("points", points), ("rapid", rapid))})
+            os.replace(temporary, name)
+        return pyramid
+
+    def level_for(self, xlim: Optional[tuple[float, float]] = None, ylim: Optional[tuple[float, float]] = None,
+                  max_points: int = MAX_DRAW_POINTS) -> tuple[np.ndarray, np.ndarray]:
+        """ Самый подробный уровень, у которого в видимую область XY попадает не больше max_points точек """
+        chosen = next(iter(self.levels.values()))
+        for points, rapid in self.levels.values():
+            visible = np.ones(len(points), dtype=bool)
+            if xlim is not None:
+                visible &= (points[:, 0] >= min(xlim)) & (points[:, 0] <= max(xlim))
+            if ylim is not None:
+                visible &= (points[:, 1] >= min(ylim)) & (points[:, 1] <= max(ylim))
+            if np.count_nonzero(visible) > max_points:
+                break
+            chosen = points, rapid
+        return chosen
+
+
+def draw(ax, pyramid: PreviewPyramid, max_points: int = MAX_DRAW_POINTS, refine: bool = True):
+    """
+    Нарисовать траекторию в проекции XY на осях matplotlib: рабочие ходы - сплошной линией, холостые - пунктиром.
+    :param refine: перерисовывать с подходящим уровнем детализации при изменении масштаба
+    """
+    from matplotlib.collections import LineCollection
+
+    collections = []
+
+    def render(xlim=None, ylim=None):
+        points, rapid = pyramid.level_for(xlim, ylim, max_points)
+        for collection in collections:
+            collection.remove()
+        collections.clear()
+        segments = np.stack((points[:-1, :2], points[1:, :2],), axis=1)
+        for mask, style in ((~rapid[1:], {"linewidths": 0.6, "colors": "tab:blue"}),
+                            (rapid[1:], {"linewidths": 0.4, "colors": "tab:red", "linestyles": "dashed"}),):
+            collections.append(ax.add_collection(LineCollection(segments[mask], **style)))
+        ax.figure.canvas.draw_idle()
+
+    render()
+    ax.autoscale_view()
+    if refine:
+        ax.callbacks.connect("xlim_changed", lambda axes: render(axes.get_xlim(), axes.get_ylim()))
+    return collections
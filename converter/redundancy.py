@@ -0,0 +1,146 @@
+"""
+Удаление избыточных слов и пустых перемещений за один проход по байтам программы:
+    - повтор действующего кода перемещения (G0/G1/G2/G3)
+    - повтор действующей подачи F
+    - координата X/Y/Z, совпадающая с текущей
+    - кадр перемещения, в котором после этого не осталось ничего, кроме номера (нулевое перемещение)
+Изменяются только кадры из слов N, G0-G3, X, Y, Z, F. Кадры с комментариями и другими словами
+переносятся как есть, но учитываются в модальном состоянии. В режиме G91 координаты не трогаются.
+Слова, которые стойка требует писать явно, задаются атрибутом класса CNCFile.KEEP_WORDS.
+"""
+import re
+from typing import Optional, Iterable, Iterator
+from cnc_file import CNCFile
+
+WORD = re.compile(rb"([A-Z])\s*([-+]?[.0-9]*)")
+COMMENT_START = re.compile(rb"[(;]")
+AXES = (b"X", b"Y", b"Z")
+OPTIMIZED_LETTERS = frozenset((b"N", b"G", b"F", *AXES))
+MOTION_CODES = (0., 1., 2., 3.)
+POSITION_RESET_CODES = (28., 53., 92.)  # После этих кадров текущие координаты неизвестны
+
+
+class RedundancyFilter:
+    """
+    Использование:
+        optimizer = RedundancyFilter.for_cnc(HellerCNCFile)
+        with open(path, "rb") as source, open(output, "wb") as target:
+            target.writelines(optimizer.stream(source))
+    """
+    def __init__(self, keep_words: Iterable[str] = CNCFile.KEEP_WORDS):
+        self.keep_words = frozenset(map(lambda word: word.upper().encode("ascii"), keep_words))
+        self.removed_words = 0
+        self.removed_lines = 0
+        self._reset()
+
+    @classmethod
+    def for_cnc(cls, file_type=CNCFile) -> "RedundancyFilter":
+        return cls(file_type.KEEP_WORDS)
+
+    def _reset(self):
+        self._motion: Optional[float] = None
+        self._feed: Optional[float] = None
+        self._position: dict[bytes, Optional[float]] = dict.fromkeys(AXES)
+        self._incremental = False
+
+    def stream(self, lines: Iterable[bytes]) -> Iterator[bytes]:
+        """ Строки с переносом на входе и на выходе """
+        self._reset()
+        self.removed_words = self.removed_lines = 0
+        for line in lines:
+            result = self.process_line(line)
+            if result is None:
+                self.removed_lines += 1
+                continue
+            yield result
+
+    def process_line(self, line: bytes) -> Optional[bytes]:
+        comment = COMMENT_START.search(line)
+        words = WORD.findall(line[:comment.start()] if comment else line)
+        if not words:
+            return line
+        parsed, optimizable = [], comment is None
+        for letter, text in words:
+            try:
+                value = float(text)
+            except ValueError:
+                self._reset()
+                return line
+            if letter not in OPTIMIZED_LETTERS or letter == b"G" and value not in MOTION_CODES:
+                optimizable = False
+            parsed.append((letter, text, value,))
+        if not optimizable:
+            self._update(parsed)
+            return line
+        kept, dropped, moves, position = [], 0, False, self._position
+        for letter, text, value in parsed:
+            if letter == b"N":
+                kept.append(letter + text)
+            elif letter == b"G":
+                if value == self._motion and letter not in self.keep_words:
+                    dropped += 1
+                else:
+                    kept.append(letter + text)
+                self._motion = value
+            elif letter == b"F":
+                if value == self._feed and letter not in self.keep_words:
+                    dropped += 1
+                else:
+                    kept.append(letter + text)
+                self._feed = value
+            elif self._incremental:
+                kept.append(letter + text)
+                position[letter] = None
+            else:
+                if value == position[letter] and letter not in self.keep_words:
+                    moves, dropped = True, dropped + 1
+                else:
+                    kept.append(letter + text)
+                position[letter] = value
+        if not dropped:
+            return line
+        self.removed_words += dropped
+        if moves and all(word.startswith(b"N") for word in kept):
+            return
+        return b" ".join(kept) + line[len(line.rstrip(b"\r\n")):]
+
+    def _update(self, parsed: list[tuple[bytes, bytes, float]]):
+        """ Модальное состояние после кадра, который переносится без изменений """
+        axes, reset = [], False
+        for letter, _, value in parsed:
+            if letter == b"G":
+                if value in MOTION_CODES:
+                    self._motion = value
+                elif value in (90., 91.):
+                    self._incremental = value == 91.
+                elif value in POSITION_RESET_CODES:
+                    reset = True
+            elif letter == b"F":
+                self._feed = value
+            elif letter in self._position:
+                axes.append((letter, value,))
+        if reset:
+            self._position = dict.fromkeys(AXES)
+            return
+        for letter, value in axes:
+            self._position[letter] = None if self._incremental else value
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "exemple")
+    paths = [os.path.join(folder, name) for folder, _, names in os.walk(root) for name in names]
+    optimizer = RedundancyFilter()
+    size_before = size_after = words = lines = 0
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, "rb") as file:
+            size_before += os.path.getsize(path)
+            size_after += sum(map(len, optimizer.stream(file)))
+        words, lines = words + optimizer.removed_words, lines + optimizer.removed_lines
+    elapsed = time.perf_counter() - start
+    print(f"{len(paths)} файлов: удалено слов {words}, кадров {lines}, "
+          f"размер {size_before / 2 ** 20:.1f} -> {size_after / 2 ** 20:.1f} МБ "
+          f"(-{1 - size_after / size_before:.1%}), {elapsed:.2f} с")
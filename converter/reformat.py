@@ -0,0 +1,176 @@
+"""
+Перезапись значений координат и подачи с точностью и в записи, которую требует стойка:
+    precision=3, trailing_zeros=False, leading_zero=False, integer_point=True: 150. -.5 12.25
+    precision=4, trailing_zeros=True, leading_zero=True, integer_point=False: 150.0000 -0.5000 12.2500
+Файл обрабатывается массивами NumPy целиком, без форматирования каждого числа в Python:
+    - границы слов и комментарии находятся по маскам байтов
+    - числа разбираются по матрице цифр сразу в целые, масштабированные на 10 ** precision
+      (точно, без погрешности float; округление половины от нуля)
+    - новая запись собирается из матрицы разрядов и маски выводимых символов
+    - новые значения вставляются на место старых одним np.insert
+Настройки стойки - атрибуты класса CNCFile: PRECISION, TRAILING_ZEROS, LEADING_ZERO, INTEGER_POINT.
+"""
+from typing import Union
+import numpy as np
+from cnc_file import CNCFile
+from gcode_parser import COMMENT
+
+FORMATTED_WORDS = "XYZABCIJKF"
+NUMBER_SYMBOLS = b"+-.0123456789"
+MAX_NUMBER_LENGTH = 32
+MAX_DIGITS = 18  # Значащих цифр, которые помещаются в int64
+POWERS = 10 ** np.arange(MAX_DIGITS + 1, dtype=np.int64)
+
+
+class Reformatter:
+    """
+    Использование:
+        result = Reformatter.for_cnc(HellerCNCFile).process_file(path)
+    """
+    def __init__(self, precision: int = CNCFile.PRECISION, trailing_zeros: bool = CNCFile.TRAILING_ZEROS,
+                 leading_zero: bool = CNCFile.LEADING_ZERO, integer_point: bool = CNCFile.INTEGER_POINT,
+                 words: str = FORMATTED_WORDS):
+        if not 0 <= precision <= 9:
+            raise ValueError("precision должен быть от 0 до 9")
+        self.precision = precision
+        self.trailing_zeros = trailing_zeros
+        self.leading_zero = leading_zero
+        self.integer_point = integer_point
+        self.words = words
+        self.replaced = 0  # Перезаписано чисел в последнем вызове process
+
+    @classmethod
+    def for_cnc(cls, file_type=CNCFile, **kwargs) -> "Reformatter":
+        return cls(file_type.PRECISION, file_type.TRAILING_ZEROS, file_type.LEADING_ZERO, file_type.INTEGER_POINT,
+                   **kwargs)
+
+    def format(self, values: np.ndarray) -> np.ndarray:
+        """ float64 -> массив байтовых строк """
+        scaled = np.rint(np.abs(values) * 10 ** self.precision).astype(np.int64)
+        symbols, mask = self.render(scaled, values < 0)
+        return np.array([row[row_mask].tobytes() for row, row_mask in zip(symbols, mask)], dtype="S")
+
+    def parse(self, matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Точный разбор чисел сразу в целые, масштабированные на 10 ** precision (округление половины от нуля).
+        :param matrix: байты чисел, shape (чисел, ширина), справа дополнены нулями
+        :return: модуль масштабированного значения, маска отрицательных, маска разобранных
+        """
+        is_digit = (matrix >= ord("0")) & (matrix <= ord("9"))
+        is_point = matrix == ord(".")
+        is_sign = (matrix == ord("-")) | (matrix == ord("+"))
+        digits = is_digit.sum(axis=1)
+        valid = (digits > 0) & (digits <= MAX_DIGITS) & (is_point.sum(axis=1) <= 1) & ~is_sign[:, 1:].any(axis=1) & \
+            ((is_digit | is_point | is_sign | (matrix == 0)).all(axis=1))
+        right = np.cumsum(is_digit[:, ::-1], axis=1)[:, ::-1] - is_digit  # Цифр правее каждой позиции
+        mantissa = np.where(is_digit, (matrix - ord("0")).astype(np.int64) * POWERS[np.minimum(right, MAX_DIGITS)],
+                            0).sum(axis=1)
+        decimals = np.where(is_point, right, 0).sum(axis=1)
+        shift = self.precision - decimals
+        up = np.where(shift >= 0, POWERS[np.clip(shift, 0, MAX_DIGITS)], 1)
+        down = POWERS[np.clip(-shift, 0, MAX_DIGITS)]
+        quotient, remainder = np.divmod(mantissa, down)
+        scaled = quotient * up + (2 * remainder >= down)
+        valid &= np.abs(shift) <= MAX_DIGITS - digits.clip(max=MAX_DIGITS)
+        return scaled, matrix[:, 0] == ord("-"), valid
+
+    def render(self, scaled: np.ndarray, negative: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Запись масштабированных целых цифрами: [знак][целая часть][точка][дробная часть].
+        :return: матрица символов и маска выводимых символов, shape (чисел, разрядов + 2)
+        """
+        precision = self.precision
+        width = max(len(str(int(scaled.max(initial=0)))), precision + 1)  # Разрядов у самого длинного числа
+        integer_width = width - precision
+        digits = ((scaled[:, None] // POWERS[width - 1::-1]) % 10).astype(np.uint8)  # Старшие разряды слева
+        nonzero = digits != 0
+        integer_digits = np.where(nonzero[:, :integer_width].any(axis=1),
+                                  integer_width - np.argmax(nonzero[:, :integer_width], axis=1), 0)
+        if precision and not self.trailing_zeros:
+            fraction = nonzero[:, integer_width:]
+            fraction_length = np.where(fraction.any(axis=1), precision - np.argmax(fraction[:, ::-1], axis=1), 0)
+        else:
+            fraction_length = np.full(len(scaled), precision)
+        zero = (integer_digits == 0) & ((fraction_length == 0) | self.leading_zero)
+        point = (fraction_length > 0) | self.integer_point
+        symbols = np.empty((len(scaled), width + 2), dtype=np.uint8)
+        mask = np.empty(symbols.shape, dtype=bool)
+        symbols[:, 0], mask[:, 0] = ord("-"), negative & (scaled > 0)
+        symbols[:, 1:integer_width + 1] = digits[:, :integer_width] + ord("0")
+        mask[:, 1:integer_width + 1] = np.arange(integer_width, 0, -1) <= integer_digits[:, None]
+        mask[:, integer_width] |= zero
+        symbols[:, integer_width + 1], mask[:, integer_width + 1] = ord("."), point
+        symbols[:, integer_width + 2:] = digits[:, integer_width:] + ord("0")
+        mask[:, integer_width + 2:] = np.arange(precision) < fraction_length[:, None]
+        return symbols, mask
+
+    def process(self, data: bytes) -> bytes:
+        source = np.frombuffer(data, dtype=np.uint8)
+        # Комментарии
+        comments = np.zeros(len(source) + 1, dtype=np.int8)
+        spans = np.array([match.span() for match in COMMENT.finditer(data)], dtype=np.int64).reshape(-1, 2)
+        comments[spans[:, 0]] += 1
+        comments[spans[:, 1]] -= 1
+        outside = np.cumsum(comments[:-1], dtype=np.int8) == 0
+        # Слова: буква из self.words, перед ней - не буква
+        is_letter = (source >= ord("A")) & (source <= ord("Z"))
+        word_start = np.zeros(len(source), dtype=bool)
+        word_start[0] = True
+        np.logical_not(is_letter[:-1], out=word_start[1:])
+        starts = np.flatnonzero(self._table(self.words.encode("ascii"))[source] & word_start & outside) + 1
+        breaks = np.flatnonzero(~self._table(NUMBER_SYMBOLS)[source])
+        ends = np.append(breaks, len(source))[np.searchsorted(breaks, starts)]
+        lengths = ends - starts
+        valid = (lengths > 0) & (lengths <= MAX_NUMBER_LENGTH)
+        starts, lengths = starts[valid], lengths[valid]
+        self.replaced = 0
+        if not len(starts):
+            return data
+        # Числа
+        width = int(lengths.max())
+        columns = np.arange(width)
+        matrix = np.where(columns < lengths[:, None], source[np.minimum(starts[:, None] + columns, len(source) - 1)],
+                          0).astype(np.uint8)
+        scaled, negative, parsed = self.parse(matrix)
+        starts, lengths = starts[parsed], lengths[parsed]
+        symbols, mask = self.render(scaled[parsed], negative[parsed])
+        self.replaced = len(starts)
+        # Сборка: старые числа удаляются, новые вставляются на их место
+        removed = np.zeros(len(source) + 1, dtype=np.int8)
+        removed[starts] += 1
+        removed[starts + lengths] -= 1
+        keep = np.cumsum(removed[:-1], dtype=np.int8) == 0
+        shift = np.cumsum(lengths) - lengths
+        result = np.insert(source[keep], np.repeat(starts - shift, mask.sum(axis=1)), symbols[mask])
+        return result.tobytes()
+
+    @staticmethod
+    def _table(symbols: bytes) -> np.ndarray:
+        """ Таблица принадлежности байта множеству symbols: table[source] - маска для всего файла """
+        table = np.zeros(256, dtype=bool)
+        table[np.frombuffer(symbols, dtype=np.uint8)] = True
+        return table
+
+    def process_file(self, path: Union[str, bytes]) -> bytes:
+        with open(path, "rb") as file:
+            return self.process(file.read())
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "exemple")
+    paths = [os.path.join(folder, name) for folder, _, names in os.walk(root) for name in names]
+    data = b""
+    while len(data) < 50 * 2 ** 20:
+        for path in paths:
+            with open(path, "rb") as file:
+                data += file.read()
+    for settings in ({}, {"precision": 4, "trailing_zeros": True, "leading_zero": True, "integer_point": False}):
+        reformatter = Reformatter(**settings)
+        start = time.perf_counter()
+        result = reformatter.process(data)
+        elapsed = time.perf_counter() - start
+        print(f"{settings or 'по умолчанию'}: {len(data) / 2 ** 20:.1f} МБ, чисел {reformatter.replaced}, "
+              f"{elapsed:.2f} с -> {len(result) / 2 ** 20:.1f} МБ")
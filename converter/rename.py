@@ -0,0 +1,111 @@
+"""
+Пакетное переименование выходных файлов (операция Rename).
+Имена для всего задания вычисляются в памяти:
+    - по одному листингу на каждый выходной каталог (вместо проверки существования каждого файла)
+    - коллизии (с уже существующими файлами и между файлами задания) определяются по множеству имён
+По умолчанию имя при коллизии не меняется - файл, как и раньше, будет пропущен при открытии в режиме 'x';
+суффикс '_<номер>' добавляется только при resolve_collisions=True. В обоих случаях коллизии перечислены в collisions.
+"""
+import os
+from typing import Optional, Iterable
+from cnc_file import CNCFile
+
+
+class RenameRule:
+    """ Правило переименования - значения записи таблицы Rename """
+    def __init__(self, uppercase=False, lowercase=False, prefix: Optional[str] = None, postfix: Optional[str] = None,
+                 nametext: Optional[str] = None, removeextension=False, setextension: Optional[str] = None, **_):
+        if uppercase and lowercase:
+            raise ValueError("uppercase и lowercase одновременно")
+        if removeextension and setextension:
+            raise ValueError("removeextension и setextension одновременно")
+        self.uppercase = uppercase
+        self.lowercase = lowercase
+        self.prefix = prefix or ""
+        self.postfix = postfix or ""
+        self.nametext = nametext
+        self.removeextension = removeextension
+        self.setextension = setextension if not setextension or setextension.startswith(".") else f".{setextension}"
+
+    def __call__(self, name: str, format_: Optional[str] = None, varibles: Iterable[str] = ()) -> tuple[str, Optional[str]]:
+        """
+        :param name: имя файла без расширения
+        :param format_: расширение с точкой или None
+        :param varibles: значения переменных из шапки (HeadVarDelegation), добавляются к имени через '_'
+        :return: новое имя и расширение
+        """
+        name = "_".join((self.nametext or name, *varibles))
+        name = f"{self.prefix}{name}{self.postfix}"
+        if self.uppercase:
+            name = name.upper()
+        if self.lowercase:
+            name = name.lower()
+        if self.removeextension:
+            format_ = None
+        if self.setextension:
+            format_ = self.setextension
+        return name, format_
+
+
+class BatchRenamer:
+    """
+    Использование:
+        renamer = BatchRenamer(RenameRule(**rename_row), file_type=HellerCNCFile)
+        targets = renamer.plan([{"name": "100tor30", "frmt": ".tap", "output": "C:\\converted\\heller"}, ...])
+        # {("C:\\converted\\heller", "100tor30", ".tap"): "C:\\converted\\heller\\100TOR30.tap", ...}
+        renamer.collisions  # Пути, которые уже заняты: такие файлы будут пропущены
+    """
+    COLLISION_TEMPLATE = "{name}_{counter}"
+
+    def __init__(self, rule: Optional[RenameRule] = None, file_type=CNCFile, resolve_collisions: bool = False):
+        """ :param resolve_collisions: при коллизии добавить к имени суффикс COLLISION_TEMPLATE вместо пропуска файла """
+        self.rule = rule
+        self.file_type = file_type
+        self.resolve_collisions = resolve_collisions
+        self.collisions: list[str] = []  # Занятые пути, обнаруженные в последнем plan
+        self._listing: dict[str, set[str]] = {}
+
+    def plan(self, items: Iterable[dict[str, Optional[str]]], varibles: Optional[dict] = None) -> dict[tuple, str]:
+        """
+        :param items: словари с ключами name, frmt, output (выходной каталог)
+        :param varibles: {(output, name, frmt): значения переменных из шапки}
+        :return: {(output, name, frmt): полный путь выходного файла}
+        """
+        self.collisions = []
+        self._listing = {}
+        result = {}
+        for item in items:
+            key = (item["output"], item["name"], item.get("frmt"),)
+            name, format_ = item["name"], item.get("frmt")
+            if self.rule is not None:
+                name, format_ = self.rule(name, format_, (varibles or {}).get(key, ()))
+            result[key] = os.path.join(item["output"], self._reserve(item["output"], name, format_))
+        return result
+
+    def _reserve(self, directory: str, name: str, format_: Optional[str]) -> str:
+        taken = self._get_listing(directory)
+        filename = self.file_type.get_filename(name, format_)
+        if os.path.normcase(filename) not in taken:
+            taken.add(os.path.normcase(filename))
+            return filename
+        self.collisions.append(os.path.join(directory, filename))
+        if not self.resolve_collisions:
+            return filename
+        counter = 0
+        while os.path.normcase(filename) in taken:
+            counter += 1
+            filename = self.file_type.get_filename(self.COLLISION_TEMPLATE.format(name=name, counter=counter),
+                                                   format_)
+        taken.add(os.path.normcase(filename))
+        return filename
+
+    def _get_listing(self, directory: str) -> set[str]:
+        """ Единственное обращение к файловой системе на каталог """
+        if directory not in self._listing:
+            try:
+                names = os.listdir(directory)
+            except FileNotFoundError:
+                names = []
+            self._listing[directory] = set(map(os.path.normcase, names))
+        return self._listing[directory]
+
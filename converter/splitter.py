@@ -0,0 +1,175 @@
+"""
+Разбиение программы, которая не укладывается в ограничение стойки по количеству кадров (CNCFile.MAX_NUM),
+на части-подпрограммы и главную программу, которая вызывает их по очереди.
+    - файл читается построчно, в памяти - только текущая часть (не больше max_blocks строк)
+    - разрез делается перед кадром перемещения, в начале каждой части восстанавливается модальное состояние:
+      единицы измерения, плоскость, режим координат, система координат, инструмент и корректор (T, D),
+      обороты шпинделя, охлаждение, тип перемещения с подачей
+    - кадры каждой части перенумеровываются с N1
+    - имя части - номер программы и номер части фиксированной ширины через '_' ('100_001'),
+      поэтому имена частей не совпадают между собой и с именами частей других программ
+"""
+import os
+import re
+from typing import Optional, Iterable, Iterator, Union
+from heller import HellerCNCFile
+
+COMMENT = re.compile(r"\([^)]*\)|;.*")
+WORD = re.compile(r"([A-Z])\s*([-+]?[.0-9]*)")
+BLOCK_NUMBER = re.compile(r"^\s*N\d+\s*")
+PROGRAM_END = ("M2", "M02", "M30")
+
+
+class ModalState:
+    """ Модальное состояние на текущем кадре. Обновляется по словам каждого кадра """
+    G_GROUPS = {"units": (20, 21), "plane": (17, 18, 19), "distance": (90, 91),
+                "origin": (54, 55, 56, 57, 58, 59), "motion": (0, 1, 2, 3)}
+    SPINDLE = {3: "M3", 4: "M4", 5: None}
+    COOLANT = {7: ("M7",), 8: ("M8",), 9: ()}
+    MAX_RESTORE_BLOCKS = 5  # Подготовительные функции, инструмент, шпиндель, охлаждение, перемещение
+
+    def __init__(self):
+        self.groups: dict[str, str] = {}
+        self.feed: Optional[str] = None
+        self.speed: Optional[str] = None
+        self.tool: Optional[str] = None
+        self.offset: Optional[str] = None  # Корректор D
+        self.spindle: Optional[str] = None  # M3, M4 или None (M5)
+        self.coolant: tuple[str, ...] = ()  # M7 и/или M8, пусто - M9
+        self._group_by_code = {code: group for group, codes in self.G_GROUPS.items() for code in codes}
+
+    def update(self, words: list[tuple[str, str]]):
+        for letter, value in words:
+            if letter == "G":
+                try:
+                    code = float(value)
+                except ValueError:
+                    continue
+                if code in self._group_by_code:
+                    self.groups[self._group_by_code[code]] = f"G{value}"
+            elif letter == "F":
+                self.feed = value
+            elif letter == "S":
+                self.speed = value
+            elif letter == "T":
+                self.tool = value
+            elif letter == "D":
+                self.offset = value
+            elif letter == "M":
+                try:
+                    code = float(value)
+                except ValueError:
+                    continue
+                if code in self.SPINDLE:
+                    self.spindle = self.SPINDLE[code]
+                elif code in self.COOLANT:
+                    self.coolant = tuple(sorted({*self.coolant, *self.COOLANT[code]})) if self.COOLANT[code] else ()
+
+    def restore(self) -> list[str]:
+        """ Кадры, которые возвращают станок в это состояние в начале новой части """
+        blocks = []
+        preparatory = [self.groups[group] for group in ("units", "plane", "distance", "origin",)
+                       if group in self.groups]
+        if preparatory:
+            blocks.append(" ".join(preparatory))
+        tool = " ".join(filter(None, (f"T{self.tool}" if self.tool is not None else None,
+                                      f"D{self.offset}" if self.offset is not None else None,)))
+        if tool:
+            blocks.append(tool)
+        if self.spindle is not None:
+            blocks.append(f"S{self.speed} {self.spindle}" if self.speed is not None else self.spindle)
+        if self.coolant:
+            blocks.append(" ".join(self.coolant))
+        motion = " ".join(filter(None, (self.groups.get("motion"), f"F{self.feed}" if self.feed else None,)))
+        if motion:
+            blocks.append(motion)
+        return blocks
+
+
+class ProgramSplitter:
+    """
+    Использование:
+        splitter = ProgramSplitter("100tor30")
+        for name, lines in splitter.split(open(path)):
+            ...  # name - имя файла части ('100_001', ...), последним идёт главная программа
+        splitter.split_file(path, output_dir)
+    """
+    MAIN_HEAD = "%mpf{number}"
+    PART_HEAD = "%mpf{number}_{part:03d}"
+    PART_NAME = "{number}_{part:03d}"
+    PART_CALL = "CALL \"MPF{number}_{part:03d}\""
+    PART_END = "M17"
+    MAIN_END = "M30"
+    MAX_PARTS = 999  # Ширина номера части в PART_NAME
+    BOUNDARY_WINDOW = 50  # За сколько кадров до предела начинать искать кадр перемещения для разреза
+
+    def __init__(self, name: str, max_blocks: Union[int, float] = HellerCNCFile.MAX_NUM, file_type=HellerCNCFile):
+        reserve = ModalState.MAX_RESTORE_BLOCKS + 2  # Восстановление состояния, заголовок и конец части
+        if max_blocks <= reserve:
+            raise ValueError(f"max_blocks должен быть больше {reserve}: иначе в части не остаётся места для кадров")
+        self.name = name
+        self.number = file_type.get_program_number(name)
+        self.max_blocks = max_blocks
+        self.window = min(self.BOUNDARY_WINDOW, max_blocks // 4)
+        self.file_type = file_type
+        self.parts = 0
+
+    def split(self, lines: Iterable[str]) -> Iterator[tuple[str, list[str]]]:
+        state, part, restore = ModalState(), [], []
+        self.parts = 0
+        for line in lines:
+            line = line.rstrip("\r\n")
+            body = BLOCK_NUMBER.sub("", line, count=1).strip()
+            if body in PROGRAM_END:
+                continue
+            words = WORD.findall(COMMENT.sub("", body))
+            is_move = any(letter in "XYZ" for letter, _ in words)
+            reserve = len(restore) + 2  # Заголовок и конец части
+            if part and (len(part) + reserve >= self.max_blocks or
+                         is_move and len(part) + reserve >= self.max_blocks - self.window):
+                yield self._close_part(part, restore)
+                part, restore = [], state.restore()
+            state.update(words)
+            part.append(body)
+        if part:
+            yield self._close_part(part, restore)
+        yield self.name, self.main_program()
+
+    def main_program(self) -> list[str]:
+        calls = [self.PART_CALL.format(number=self.number, part=part) for part in range(1, self.parts + 1)]
+        return [self.MAIN_HEAD.format(number=self.number), *self._numerate([*calls, self.MAIN_END])]
+
+    def split_file(self, path: str, output_dir: str, format_: Optional[str] = None) -> list[str]:
+        """
+        :return: пути записанных файлов, главная программа - последняя
+        Если имя одной из частей уже занято (FileExistsError) или частей слишком много (ValueError),
+        уже записанные части удаляются.
+        """
+        paths = []
+        try:
+            with open(path, "rt", encoding="utf-8") as file:
+                for name, lines in self.split(file):
+                    target = os.path.join(output_dir, self.file_type.get_filename(name, format_))
+                    with open(target, "xt", encoding="utf-8") as output:
+                        paths.append(target)
+                        output.write("\n".join(lines))
+                        output.write("\n")
+        except (FileExistsError, ValueError):
+            for written in paths:
+                os.remove(written)
+            raise
+        return paths
+
+    def _close_part(self, part: list[str], restore: list[str]) -> tuple[str, list[str]]:
+        self.parts += 1
+        if self.parts > self.MAX_PARTS:
+            raise ValueError(f"Больше {self.MAX_PARTS} частей: увеличьте max_blocks")
+        name = self.PART_NAME.format(number=self.number, part=self.parts)
+        if name == self.name:
+            raise ValueError(f"Имя части {name} совпадает с именем главной программы")
+        head = self.PART_HEAD.format(number=self.number, part=self.parts)
+        return name, [head, *self._numerate([*restore, *part, self.PART_END])]
+
+    @staticmethod
+    def _numerate(blocks: list[str]) -> list[str]:
+        return [f"N{number} {block}" if block else block for number, block in enumerate(blocks, start=1)]
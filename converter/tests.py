@@ -0,0 +1,865 @@
+"""
+Тесты модулей обработки программ (converter).
+Запуск из каталога converter (модули импортируются по плоским именам, как в main.py):
+    python -m unittest tests
+Данные тесты проверяют:
+    - Поведение правил и их наборов на строках программ
+    - Результат работы обработчиков на небольших программах во временных каталогах
+Данные тесты не могут проверить:
+    - Загрузку правил из базы данных (см. gui/orm/tests.py, database/tests.py)
+"""
+import os
+import shutil
+import hashlib
+import itertools
+import tempfile
+import threading
+import unittest
+import unittest.mock
+from decimal import Decimal, ROUND_HALF_UP
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from operations import RuleSet, CommentRule, RemoveRule, ReplaceRule, InsertRule, normalize
+from dry_run import DryRun
+from head import HeadVariblePattern, HeadVaribleExtractor
+from rename import RenameRule, BatchRenamer
+from gcode_parser import parse, parse_file, parse_parallel, split_chunks, forward_fill, format_number, tokenize
+from validation import EnvelopeValidator
+from toolpath_statistics import ToolpathStatistics, get_header_time
+from decimation import Decimator, simplify
+from splitter import ModalState, ProgramSplitter
+from arcs import ArcFitter, get_planes
+from redundancy import RedundancyFilter
+from reformat import Reformatter
+from digest import DigestService, MANIFEST_NAME
+from heller import HellerCNCFile
+from machine import Machine
+from cache import ProgramCache
+from preview import PreviewPyramid, decimate
+from collection import Session
+from data_type import IndexedDictionary
+
+
+def path_points(data: bytes) -> np.ndarray:
+    """ Точки траектории программы (известные координаты X, Y, Z), shape (n, 3) """
+    program = parse(data)
+    points = np.stack([program.modal(axis) for axis in ("X", "Y", "Z")], axis=1)
+    points = points[~np.isnan(points).any(axis=1)]
+    return points[np.concatenate(([True], (np.diff(points, axis=0) != 0).any(axis=1)))]
+
+
+def deviation(points: np.ndarray, polyline: np.ndarray) -> float:
+    """ Наибольшее расстояние от точек до ломаной polyline """
+    a, b = polyline[:-1], polyline[1:]
+    chord = b - a
+    square = np.maximum(np.einsum("ij,ij->i", chord, chord), 1e-12)
+    vector = points[:, None, :] - a[None, :, :]
+    t = np.clip(np.einsum("pij,ij->pi", vector, chord) / square, 0, 1)
+    return float(np.linalg.norm(vector - t[..., None] * chord, axis=2).min(axis=1).max())
+
+
+def arc_program(radius: float = 50., steps: int = 400, noise: float = 0.) -> bytes:
+    """ Дуга окружности, записанная мелкими отрезками G1 """
+    random = np.random.default_rng(1)
+    angles = np.linspace(0, np.pi, steps)
+    lines = [f"G0 X{format_number(radius)} Y0 Z5.".encode("ascii"), b"G1 Z-1. F300"]
+    for angle in angles[1:]:
+        x, y = radius * np.cos(angle) + random.normal(0, noise), radius * np.sin(angle) + random.normal(0, noise)
+        lines.append(f"X{format_number(x)} Y{format_number(y)}".encode("ascii"))
+    lines.append(b"G0 Z50.")
+    return b"\n".join(lines) + b"\n"
+
+
+def sample_arcs(data: bytes, steps: int = 256) -> np.ndarray:
+    """ Точки траектории программы, в которой дуги G2/G3 (плоскость XY, I/J от начала) заменены ломаными """
+    position, motion, points = np.full(3, np.nan), 0, []
+    for line in data.decode("ascii").splitlines():
+        words = dict((word[0], float(word[1:])) for word in line.split() if word[0] in "GXYZIJ")
+        motion = int(words.get("G", motion))
+        end = np.array([words.get(axis, position[index]) for index, axis in enumerate("XYZ")])
+        if motion in (2, 3) and not np.isnan(position).any():
+            center = position[:2] + (words.get("I", 0), words.get("J", 0))
+            start_angle = np.arctan2(*(position[:2] - center)[::-1])
+            sweep = np.arctan2(*(end[:2] - center)[::-1]) - start_angle
+            sweep = sweep % (2 * np.pi) if motion == 3 else -(-sweep % (2 * np.pi))
+            angles = start_angle + np.linspace(0, sweep, steps)
+            radius = np.linalg.norm(position[:2] - center)
+            points.extend(np.stack((center[0] + radius * np.cos(angles), center[1] + radius * np.sin(angles),
+                                    np.full(steps, end[2])), axis=1))
+        elif not np.isnan(end).any():
+            points.append(end)
+        position = end
+    return np.array(points)
+
+
+class TempFolderMixin:
+    """ Временный каталог на время одного теста """
+    def setUp(self):
+        super().setUp()
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+        super().tearDown()
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.folder, name)
+        with open(path, "wt", encoding="utf-8") as file:
+            file.write(text)
+        return path
+
+
+class TestRuleSet(unittest.TestCase):
+    def test_full_match_and_contains(self):
+        rules = RuleSet([CommentRule(findstr="M1", iffullmatch=True, commentid=1),
+                         ReplaceRule(findstr="G0", item="G00", ifcontains=True, replaceid=2)])
+        self.assertEqual(rules.apply("N10 M1"), "N10 ;M1")
+        self.assertEqual(rules.apply("N20 G0 X1."), "N20 G00 X1.")
+        self.assertEqual(rules.apply("N30 G1 X1."), "N30 G1 X1.")
+
+    def test_rules_applied_in_order(self):
+        rules = RuleSet([ReplaceRule(findstr="A", item="B", ifcontains=True, replaceid=1),
+                         ReplaceRule(findstr="B", item="C", ifcontains=True, replaceid=2)])
+        self.assertEqual(rules.apply("A"), "C")
+        rules = RuleSet([ReplaceRule(findstr="B", item="C", ifcontains=True, replaceid=1),
+                         ReplaceRule(findstr="A", item="B", ifcontains=True, replaceid=2)])
+        self.assertEqual(rules.apply("A"), "B")
+
+    def test_rematch_after_change(self):
+        """ Правило, которое подходило к исходной строке, не применяется к строке, которую изменило предыдущее """
+        rules = RuleSet([ReplaceRule(findstr="M08", item="M09", ifcontains=True, replaceid=1),
+                         CommentRule(findstr="M08", ifcontains=True, commentid=2),
+                         CommentRule(findstr="M09", ifcontains=True, commentid=3)])
+        counter = Counter()
+        self.assertEqual(rules.apply("N5 M08", counter), "N5 ;M09")
+        self.assertEqual(counter, Counter({"Replace:1": 1, "Comment:3": 1}))
+
+    def test_rule_applied_once(self):
+        rules = RuleSet([ReplaceRule(findstr="X", item="XX", ifcontains=True, replaceid=1)])
+        self.assertEqual(rules.apply("X1."), "XX1.")
+
+    def test_remove(self):
+        rules = RuleSet([RemoveRule(findstr="M0", iffullmatch=True, removeid=1),
+                         CommentRule(findstr="M0", iffullmatch=True, commentid=2)])
+        counter = Counter()
+        self.assertIsNone(rules.apply("N40 M0", counter))
+        self.assertEqual(counter, Counter({"Remove:1": 1}))
+
+    def test_noop_rule_not_counted(self):
+        rules = RuleSet([ReplaceRule(findstr="G0", item="G0", ifcontains=True, replaceid=1),
+                         CommentRule(findstr="M1", iffullmatch=True, commentid=2)])
+        counter = Counter()
+        self.assertEqual(rules.apply("N10 G0 X1.", counter), "N10 G0 X1.")
+        self.assertEqual(rules.apply("M1", counter), ";M1")
+        self.assertEqual(counter, Counter({"Comment:2": 1}))
+
+    def test_stream_inserts(self):
+        rules = RuleSet([InsertRule(target="M30", item="M5", before=True, insid=1),
+                         InsertRule(target="m30", item="%", after=True, insid=2)])
+        self.assertEqual(list(rules.stream(["G0 X0\n", "N90 M30\n"])), ["G0 X0\n", "M5\n", "N90 M30\n", "%\n"])
+
+    def test_version(self):
+        first = RuleSet([CommentRule(findstr="M1", iffullmatch=True, commentid=1)])
+        second = RuleSet([CommentRule(findstr="M1", iffullmatch=True, commentid=1)])
+        third = RuleSet([CommentRule(findstr="M01", iffullmatch=True, commentid=1)])
+        self.assertEqual(first.version, second.version)
+        self.assertNotEqual(first.version, third.version)
+
+
+class TestInsertRule(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize("N18  g1   z-3.494 "), "G1 Z-3.494")
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            InsertRule(target="M30", item="M5", insid=1)
+        with self.assertRaises(ValueError):
+            InsertRule(target="M30", item="M5", after=True, before=True, insid=1)
+        with self.assertRaises(ValueError):
+            InsertRule(target="M30", item="", after=True, insid=1)
+
+    def test_target_normalized(self):
+        rules = RuleSet([InsertRule(target="g0  z100", item="M5", before=True, insid=1),
+                         InsertRule(target="G0 Z100", item="M9", before=True, insid=2),
+                         InsertRule(target="G0 Z100", item="M30", after=True, insid=3)])
+        counter = Counter()
+        self.assertEqual(list(rules.stream(["N7 G0   Z100\r\n", "G0 Z1000\n"], counter)),
+                         ["M5\n", "M9\n", "N7 G0   Z100\n", "M30\n", "G0 Z1000\n"])
+        self.assertEqual(counter, Counter({"Insert:1": 1, "Insert:2": 1, "Insert:3": 1}))
+
+    def test_insert_around_removed_line(self):
+        rules = RuleSet([RemoveRule(findstr="M1", iffullmatch=True, removeid=1),
+                         InsertRule(target="M1", item="M0", after=True, insid=2)])
+        self.assertEqual(list(rules.stream(["M1\n"])), ["M0\n"])
+
+
+class TestDryRun(TempFolderMixin, unittest.TestCase):
+    def test_start(self):
+        rules = RuleSet([CommentRule(findstr="M1", iffullmatch=True, commentid=1)])
+        changed = self.write("1.nc", "G0 X0\nM1\nM30\n")
+        unchanged = self.write("2.nc", "G0 X0\nM30\n")
+        with open(changed, "rb") as file:
+            origin = file.read()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = {result.path: result for result in DryRun(rules, with_diff=True).start([changed, unchanged],
+                                                                                              executor, chunk_size=1)}
+        self.assertEqual(results[changed].counts, {"Comment:1": 1})
+        self.assertEqual(results[changed].lines, 3)
+        self.assertIn("+;M1\n", list(results[changed].diff()))
+        self.assertFalse(results[unchanged].has_changes)
+        with open(changed, "rb") as file:
+            self.assertEqual(file.read(), origin)
+
+    def test_noop_rule(self):
+        rules = RuleSet([ReplaceRule(findstr="G0", item="G0", ifcontains=True, replaceid=1)])
+        result = DryRun(rules, with_diff=True).check(self.write("1.nc", "G0 X0\nM30\n"))
+        self.assertEqual(result.counts, {})
+        self.assertFalse(result.has_changes)
+
+    def test_missing_file(self):
+        result = DryRun(RuleSet()).check(os.path.join(self.folder, "missing.nc"))
+        self.assertIsInstance(result.error, OSError)
+
+
+class TestHeadVaribleExtractor(TempFolderMixin, unittest.TestCase):
+    def tearDown(self):
+        HeadVaribleExtractor.clear_cache()
+        super().tearDown()
+
+    def test_parse(self):
+        extractor = HeadVaribleExtractor([HeadVariblePattern("time", "(TIME: 3.15 MIN)", lindex=7, rindex=11),
+                                          HeadVariblePattern("program", "(PROGRAM 1)", lindex=9)])
+        head = "%\n(PROGRAM 65A90)\n(time: 12.5 min)\n(TIME: 1 MIN)\n"
+        self.assertEqual(extractor.parse(head), {"program": "65A90", "time": "12.5"})
+
+    def test_two_varibles_on_one_line(self):
+        extractor = HeadVaribleExtractor([HeadVariblePattern("tool", "TOOL T1", lindex=5),
+                                          HeadVariblePattern("diameter", "D10", lindex=1)])
+        self.assertEqual(extractor.parse("(TOOL T1 D10)\n"), {"tool": "T1 D10", "diameter": "10"})
+
+    def test_same_position(self):
+        extractor = HeadVaribleExtractor([HeadVariblePattern("tool", "T1", lindex=1),
+                                          HeadVariblePattern("line", "T1", lindex=0)])
+        self.assertEqual(extractor.parse("T12\n"), {"tool": "12", "line": "T12"})
+
+    def test_overlaps_by_prefix(self):
+        """ В позиции совпадения не перебираются переменные с другим префиксом """
+        extractor = HeadVaribleExtractor([HeadVariblePattern("time", "(TIME: 3.15 MIN)", lindex=7, rindex=11),
+                                          HeadVariblePattern("program", "(PROGRAM 1)", lindex=9),
+                                          HeadVariblePattern("name", "(program name X)", lindex=14)])
+        self.assertEqual({group: [other for other, _ in overlaps] for group, overlaps in extractor._overlaps.items()},
+                         {"v0": [], "v1": ["v2"], "v2": ["v1"]})
+
+    def test_ignore_place(self):
+        extractor = HeadVaribleExtractor([HeadVariblePattern("depth", "Z=DEPTH-1", lindex=8,
+                                                             lignoreindex=2, rignoreindex=7)])
+        self.assertEqual(extractor.parse("Z=ANY TEXT-5\n"), {"depth": "5"})
+
+    def test_extract_head_only(self):
+        path = self.write("1.nc", "(PROGRAM 1)\nG0 X0\n(PROGRAM 2)\n")
+        extractor = HeadVaribleExtractor([HeadVariblePattern("program", "(PROGRAM 1)", lindex=9)])
+        self.assertEqual(extractor.extract(path), {"program": "1"})
+        self.assertEqual(extractor.extract(path), {"program": "1"})
+
+
+class TestBatchRenamer(TempFolderMixin, unittest.TestCase):
+    def test_rename_rule(self):
+        rule = RenameRule(uppercase=True, prefix="h_", setextension="mpf")
+        self.assertEqual(rule("100tor30", ".tap", ("t1",)), ("H_100TOR30_T1", ".mpf"))
+        self.assertEqual(RenameRule(removeextension=True)("a", ".tap"), ("a", None))
+        with self.assertRaises(ValueError):
+            RenameRule(uppercase=True, lowercase=True)
+
+    def test_plan(self):
+        items = [{"name": "1", "frmt": ".tap", "output": self.folder}, {"name": "2", "frmt": None, "output": self.folder}]
+        renamer = BatchRenamer(RenameRule(postfix="_h"))
+        self.assertEqual(renamer.plan(items), {(self.folder, "1", ".tap"): os.path.join(self.folder, "1_h.tap"),
+                                               (self.folder, "2", None): os.path.join(self.folder, "2_h")})
+        self.assertEqual(renamer.collisions, [])
+
+    def test_collisions_reported(self):
+        """ По умолчанию занятое имя не меняется: файл будет пропущен, как до пакетного переименования """
+        self.write("1.tap", "")
+        items = [{"name": "1", "frmt": ".tap", "output": self.folder},
+                 {"name": "2", "frmt": ".tap", "output": self.folder},
+                 {"name": "2", "frmt": ".tap", "output": os.path.join(self.folder, "missing")}]
+        renamer = BatchRenamer(RenameRule(nametext="2"))
+        result = renamer.plan(items)
+        self.assertEqual(result[(self.folder, "1", ".tap")], os.path.join(self.folder, "2.tap"))
+        self.assertEqual(result[(self.folder, "2", ".tap")], os.path.join(self.folder, "2.tap"))
+        self.assertEqual(renamer.collisions, [os.path.join(self.folder, "2.tap")])
+        renamer = BatchRenamer()
+        renamer.plan(items[:1])
+        self.assertEqual(renamer.collisions, [os.path.join(self.folder, "1.tap")])
+
+    def test_collisions_resolved(self):
+        self.write("1.tap", "")
+        self.write("1_1.tap", "")
+        items = [{"name": "1", "frmt": ".tap", "output": self.folder}, {"name": "2", "frmt": ".tap", "output": self.folder}]
+        renamer = BatchRenamer(RenameRule(nametext="1"), resolve_collisions=True)
+        result = renamer.plan(items)
+        self.assertEqual(result[(self.folder, "1", ".tap")], os.path.join(self.folder, "1_2.tap"))
+        self.assertEqual(result[(self.folder, "2", ".tap")], os.path.join(self.folder, "1_3.tap"))
+        self.assertEqual(renamer.collisions, [os.path.join(self.folder, "1.tap")] * 2)
+
+PROGRAM = b"""%
+(T1 D10)
+N10 G0 X0 Y0 Z50. S8000
+N20 G1 Z-1. F500 ; plunge
+N30 X100.
+N40 G2 X110. Y10. I0 J10.
+G1Y-20.
+N50 G0 Z50.
+M30
+"""
+
+
+class TestParser(TempFolderMixin, unittest.TestCase):
+    def test_columns(self):
+        program = parse(PROGRAM)
+        self.assertEqual(len(program), 9)
+        np.testing.assert_array_equal(program["X"][2:6], [0, np.nan, 100, 110])
+        np.testing.assert_array_equal(program["G"][2:8], [0, 1, np.nan, 2, 1, 0])
+        np.testing.assert_array_equal(program.modal("Z")[2:8], [50, -1, -1, -1, -1, 50])
+        self.assertTrue(np.isnan(program["N"][1]))  # Комментарий (T1 D10) не разбирается
+        np.testing.assert_array_equal(program.block_numbers[5:8], [40, 7, 50])
+
+    def test_forward_fill(self):
+        np.testing.assert_array_equal(forward_fill(np.array([np.nan, 1, np.nan, 2, np.nan]), 0), [0, 1, 1, 2, 2])
+        np.testing.assert_array_equal(forward_fill(np.full(2, np.nan), 5), [5, 5])
+
+    def test_format_number(self):
+        for value, text in ((50.531, "50.531"), (-.771, "-.771"), (150, "150."), (0, "0."), (-0.0001, "0.")):
+            self.assertEqual(format_number(value), text)
+            self.assertAlmostEqual(float(text), value, places=3)
+
+    def test_unreadable_values(self):
+        program = parse(b"X1.2.3 Y-\nX2\n")
+        np.testing.assert_array_equal(program["X"], [np.nan, 2])
+        np.testing.assert_array_equal(program["Y"], [np.nan, np.nan])
+
+    def test_parse_parallel(self):
+        path = self.write("big.nc", PROGRAM.decode("utf-8") * 20)
+        chunks = split_chunks(path, chunk_size=100)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], os.path.getsize(path))
+        sequential = parse_file(path)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parallel = parse_parallel(path, chunk_size=100, executor=executor)
+        self.assertEqual(len(parallel), len(sequential))
+        for word in ("X", "Z", "F", "G"):
+            np.testing.assert_array_equal(parallel[word], sequential[word])
+            np.testing.assert_array_equal(parallel.modal(word), sequential.modal(word))
+
+
+class TestParseParallel(TempFolderMixin, unittest.TestCase):
+    def test_process_pool(self):
+        """ Модальные значения протягиваются через границы частей: в части может не быть ни одного явного X """
+        text = "G0 X1. Y1. Z1. F100\n" + "Y2.\n" * 50 + "G1 X3.\n" + "Z2.\n" * 50
+        path = self.write("1.nc", text)
+        sequential = parse(text.encode("ascii"))
+        parallel = parse_parallel(path, workers=2, chunk_size=64)
+        self.assertGreater(len(split_chunks(path, 64)), 4)
+        self.assertEqual(len(parallel), len(sequential))
+        for word in ("X", "Y", "Z", "F", "G"):
+            np.testing.assert_array_equal(parallel[word], sequential[word])
+            np.testing.assert_array_equal(parallel.modal(word), sequential.modal(word))
+
+    def test_parse_file_workers(self):
+        path = self.write("1.nc", "X1.\n")
+        self.assertEqual(len(parse_file(path, workers=4)), 1)  # Меньше CHUNK_SIZE - без пула процессов
+
+
+class TestEnvelopeValidator(unittest.TestCase):
+    def test_check(self):
+        program = parse(PROGRAM)
+        report = EnvelopeValidator.from_row({"xover": 200, "yover": 20, "zover": None, "xfspeed": 1000,
+                                             "yfspeed": 400, "zfspeed": 1000, "spindelespeed": 6000}).check(program)
+        self.assertFalse(report)
+        self.assertEqual(report.ranges["X"], (0, 110))
+        self.assertEqual({(violation.check, violation.axis) for violation in report},
+                         {("Ход", "Y"), ("Подача", "Y"), ("Обороты", "S")})
+        travel = next(violation for violation in report if violation.check == "Ход")
+        self.assertEqual(travel.value, 30)
+        self.assertEqual(report.feeds["X"], 500)
+        self.assertTrue(EnvelopeValidator().check(program))
+
+
+class TestToolpathStatistics(TempFolderMixin, unittest.TestCase):
+    def test_from_program(self):
+        stats = ToolpathStatistics.from_program(parse(PROGRAM))
+        self.assertEqual(stats.rapid_moves, 1)
+        self.assertEqual(stats.cutting_moves, 4)
+        self.assertAlmostEqual(stats.rapid_length, 51)
+        self.assertAlmostEqual(stats.cutting_length, 51 + 100 + 2 ** .5 * 10 + 30)
+        self.assertAlmostEqual(stats.cutting_time, stats.cutting_length / 500)
+        self.assertEqual(stats.bounds["Y"], (-20, 10))
+        self.assertIsNone(stats.time_deviation)
+
+    def test_header_time(self):
+        path = self.write("1.nc", "(Cutting Time : 0.5min)\nG0 X0\nG1 X100. F100\n")
+        self.assertEqual(get_header_time(b"(CUTTING TIME: 17.69 MIN)"), 17.69)
+        stats = ToolpathStatistics.from_file(path)
+        self.assertEqual(stats.header_time, .5)
+        self.assertAlmostEqual(stats.time_deviation, 1)
+
+
+class TestDecimator(unittest.TestCase):
+    def test_simplify(self):
+        points = np.array([[0, 0, 0], [1, .001, 0], [2, 0, 0], [3, 1, 0], [4, 0, 0]], dtype=float)
+        keep = simplify(points, np.array([[0, 4]]), 0.01)
+        np.testing.assert_array_equal(keep, [False, False, True, True, True])
+
+    def test_deviation_within_tolerance(self):
+        data = arc_program(noise=0.002)
+        for tolerance in (0.005, 0.05, 0.5):
+            decimator = Decimator(tolerance)
+            result = decimator.process(data)
+            self.assertGreater(decimator.removed, 0)
+            self.assertEqual(result.count(b"\n"), data.count(b"\n") - decimator.removed)
+            original, decimated = path_points(data), path_points(result)
+            np.testing.assert_array_equal(decimated[[0, -1]], original[[0, -1]])
+            self.assertLessEqual(deviation(original, decimated), tolerance + 10 ** -Decimator.PRECISION)
+
+    def test_long_run(self):
+        data = arc_program(steps=2000)
+        result = Decimator(0.01).process(data)
+        self.assertLessEqual(deviation(path_points(data), path_points(result)), 0.01 + 10 ** -Decimator.PRECISION)
+
+    def test_foreign_blocks_kept(self):
+        data = b"G0 X0 Y0 Z0\nG1 X1. F100\nX2.\nX3. F200\nX4.\nX5. M8\nX6. (comment)\nX7.\nX8.\n"
+        result = Decimator(0.01).process(data)
+        self.assertEqual(result, b"G0 X0 Y0 Z0\nG1 X1. F100\nX2.\nX3. F200\nX4.\nX5. M8\nX6. (comment)\nX8.\n")
+
+
+class TestProgramSplitter(TempFolderMixin, unittest.TestCase):
+    def program(self, moves: int) -> list[str]:
+        head = ["%", "G21 G17 G90 G54", "T5 D1 M6", "S8000 M3", "M8", "G0 X0 Y0 Z50.", "G1 Z-1. F500"]
+        return [*head, *(f"N{index} X{index}. Y{index % 7}." for index in range(1, moves + 1)), "M30"]
+
+    def test_modal_state(self):
+        state = ModalState()
+        for line in ("G20 G18 G91 G55", "T3 D2 M6", "S1200 M04", "M7", "M8", "G2 X1. F50"):
+            state.update([(word[0], word[1:]) for word in line.split()])
+        self.assertEqual(state.restore(), ["G20 G18 G91 G55", "T3 D2", "S1200 M4", "M7 M8", "G2 F50"])
+        state.update([("M", "9"), ("M", "5")])
+        self.assertEqual(state.restore(), ["G20 G18 G91 G55", "T3 D2", "G2 F50"])
+        self.assertLessEqual(len(state.restore()), ModalState.MAX_RESTORE_BLOCKS)
+
+    def test_parts_within_max_blocks(self):
+        for max_blocks in (8, 20, 120):
+            splitter = ProgramSplitter("100tor30", max_blocks=max_blocks)
+            result = list(splitter.split(self.program(300)))
+            parts, (main_name, main) = result[:-1], result[-1]
+            self.assertEqual(main_name, "100tor30")
+            self.assertEqual(len(parts), splitter.parts)
+            self.assertEqual(len(main), splitter.parts + 2)
+            moves = []
+            for number, (name, lines) in enumerate(parts, start=1):
+                self.assertEqual(name, f"100_{number:03d}")
+                self.assertEqual(lines[0], f"%mpf100_{number:03d}")
+                self.assertLessEqual(len(lines), max_blocks)
+                self.assertTrue(lines[-1].endswith("M17"))
+                self.assertIn(f'CALL "MPF100_{number:03d}"', main[number])
+                moves.extend(line for line in lines if " X" in line and " Y" in line and "G0" not in line)
+            self.assertEqual(len(moves), 300)
+
+    def test_modal_state_restored(self):
+        parts = list(ProgramSplitter("100", max_blocks=20).split(self.program(40)))[:-1]
+        restore = [line.split(" ", 1)[1] for line in parts[1][1][1:6]]
+        self.assertEqual(restore, ["G21 G17 G90 G54", "T5 D1", "S8000 M3", "M8", "G1 F500"])
+
+    def test_invalid_max_blocks(self):
+        with self.assertRaises(ValueError):
+            ProgramSplitter("100", max_blocks=ModalState.MAX_RESTORE_BLOCKS + 2)
+
+    def test_part_names(self):
+        splitter = ProgramSplitter("7", max_blocks=8)
+        names = [name for name, _ in splitter.split(self.program(200))]
+        self.assertGreater(splitter.parts, 100)
+        self.assertEqual(len(set(names)), len(names))
+        self.assertIn("7_101", names)
+        splitter.MAX_PARTS = 10
+        with self.assertRaises(ValueError):
+            list(splitter.split(self.program(200)))
+
+    def test_split_file_collision(self):
+        path = self.write("100tor30", "\n".join(self.program(50)))
+        output = os.path.join(self.folder, "output")
+        os.mkdir(output)
+        paths = ProgramSplitter("100tor30", max_blocks=20).split_file(path, output)
+        self.assertEqual(sorted(os.listdir(output)), sorted(map(os.path.basename, paths)))
+        os.remove(paths[0])
+        with self.assertRaises(FileExistsError):
+            ProgramSplitter("100tor30", max_blocks=20).split_file(path, output)
+        self.assertEqual(sorted(os.listdir(output)), sorted(map(os.path.basename, paths[1:])))
+
+
+class TestArcFitter(unittest.TestCase):
+    def test_deviation_within_tolerance(self):
+        data = arc_program(radius=20., steps=200)
+        for tolerance in (0.005, 0.02):
+            fitter = ArcFitter(tolerance)
+            result = fitter.process(data)
+            self.assertGreater(fitter.arcs, 1)  # Дуга 180° - не одним кадром
+            self.assertEqual(result.count(b"\n"), data.count(b"\n") - fitter.removed)
+            self.assertLessEqual(deviation(path_points(data), sample_arcs(result)),
+                                 tolerance + 10 ** -ArcFitter.PRECISION)
+            np.testing.assert_array_equal(path_points(result)[-1], path_points(data)[-1])
+
+    def test_line_without_space_after_block_number(self):
+        lines = arc_program(radius=20., steps=200).split(b"\n")
+        lines[-2:-1] = [b"N20X10.", b"N30 G0 Z50."]
+        result = ArcFitter(0.005).process(b"\n".join(lines))
+        self.assertIn(b"\nN20 G1 X10.\n", result)
+
+    def test_plane(self):
+        data = arc_program(radius=20., steps=200)
+        self.assertEqual(ArcFitter(0.005).process(b"G18\n" + data), b"G18\n" + data)
+        self.assertEqual(ArcFitter(0.005).process(data.replace(b"G1 Z-1.", b"G19 G1 Z-1.")),
+                         data.replace(b"G1 Z-1.", b"G19 G1 Z-1."))
+        np.testing.assert_array_equal(get_planes(tokenize(b"X1\nG18 X2\nX3\nG17\n")), [17, 18, 18, 17])
+
+
+class TestRedundancyFilter(unittest.TestCase):
+    def filter(self, text: str, keep_words=()) -> tuple[str, RedundancyFilter]:
+        optimizer = RedundancyFilter(keep_words)
+        return b"".join(optimizer.stream(text.encode("ascii").splitlines(keepends=True))).decode("ascii"), optimizer
+
+    def test_redundant_words(self):
+        result, optimizer = self.filter("G0 X0 Y0 Z5.\nG0 X10. Y0\nN5 G1 Z-1. F300\nG1 X20. F300\nX20. Y0\nX30.\r\n")
+        self.assertEqual(result, "G0 X0 Y0 Z5.\nX10.\nN5 G1 Z-1. F300\nX20.\nX30.\r\n")
+        self.assertEqual((optimizer.removed_words, optimizer.removed_lines), (6, 1))
+
+    def test_same_toolpath(self):
+        data = arc_program(radius=5., steps=50).replace(b"\nX", b"\nG1 X") + b"G0 Z50.\nG1 Z50. F300\n"
+        result = b"".join(RedundancyFilter().stream(data.splitlines(keepends=True)))
+        self.assertLess(len(result), len(data))
+        np.testing.assert_array_equal(path_points(result), path_points(data))
+
+    def test_untouched_blocks(self):
+        text = "G0 X0 Y0\nX0 M8\nX0 (comment)\nG91 X0\nX0\nG90 G28 X0\nX0\nX-\nX0\n"
+        self.assertEqual(self.filter(text)[0], text)
+
+    def test_keep_words(self):
+        self.assertEqual(self.filter("G1 X1. F100\nG1 X2. F100\n", keep_words=("F",))[0], "G1 X1. F100\nX2. F100\n")
+
+
+class TestReformatter(unittest.TestCase):
+    def test_process(self):
+        data = b"N10 G1 X150 Y-0.5 Z12.2500 F500.\n(X1.23456) X.0004 Y-.0005;Z7.77777\r\nX1-2 M3 S1000\n"
+        self.assertEqual(Reformatter().process(data),
+                         b"N10 G1 X150. Y-.5 Z12.25 F500.\n(X1.23456) X0. Y-.001;Z7.77777\r\nX1-2 M3 S1000\n")
+        self.assertEqual(Reformatter(4, trailing_zeros=True, leading_zero=True, integer_point=False).process(data),
+                         b"N10 G1 X150.0000 Y-0.5000 Z12.2500 F500.0000\n(X1.23456) X0.0004 Y-0.0005;Z7.77777\r\n"
+                         b"X1-2 M3 S1000\n")
+        self.assertEqual(Reformatter(0, integer_point=False).process(b"X2.5 Y-0.4\n"), b"X3 Y0\n")
+
+    def test_round_trip(self):
+        """ Разбор и запись совпадают с Decimal (округление половины от нуля) для случайных чисел """
+        random = np.random.default_rng(3)
+        texts = [f"{value:.{places}f}" for value, places in zip(random.normal(0, 500, 2000), random.integers(0, 7, 2000))]
+        texts += ["0", "-0", "+1.5", ".5", "-.0005", "123456.9995", "1."]
+        for precision in (0, 3, 4):
+            reformatter = Reformatter(precision, trailing_zeros=True, leading_zero=True, integer_point=False)
+            result = reformatter.process(" ".join(f"X{text}" for text in texts).encode("ascii")).decode("ascii")
+            quantum = Decimal(1).scaleb(-precision)
+            expected = [Decimal(text).quantize(quantum, ROUND_HALF_UP) for text in texts]
+            expected = [f"{value.copy_abs() if value == 0 else value:f}" for value in expected]
+            self.assertEqual(result.split(), [f"X{text}" for text in expected])
+            self.assertEqual(reformatter.replaced, len(texts))
+
+    def test_format(self):
+        values = np.array([150, -.771, 50.5306, 0, -0.0001])
+        self.assertEqual(list(Reformatter().format(values)), [b"150.", b"-.771", b"50.531", b"0.", b"0."])
+
+
+class TestDigestService(TempFolderMixin, unittest.TestCase):
+    def tearDown(self):
+        DigestService.clear_cache()
+        super().tearDown()
+
+    def test_digest(self):
+        path = self.write("1.nc", "G0 X0\n")
+        self.assertEqual(DigestService.digest(path), hashlib.blake2b(b"G0 X0\n", digest_size=64).hexdigest())
+        attrs = os.stat(path)
+        with open(path, "wt") as file:
+            file.write("G0 X1\n")
+        os.utime(path, ns=(attrs.st_atime_ns, attrs.st_mtime_ns + 10 ** 9))
+        self.assertEqual(DigestService.digest(path), hashlib.blake2b(b"G0 X1\n", digest_size=64).hexdigest())
+
+    def test_path_in_cache_key(self):
+        """ Одинаковые st_dev/st_ino/mtime/size у разных путей (файл заменён или другая ФС) не дают чужой результат """
+        first, second = self.write("1.nc", "G0 X1\n"), self.write("2.nc", "G0 X2\n")
+        attrs = os.stat(first)
+        self.assertNotEqual(DigestService.digest(first, attrs), DigestService.digest(second, attrs))
+
+    def test_digest_many(self):
+        paths = [self.write(f"{index}.nc", f"X{index}\n") for index in range(10)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            digests = DigestService(executor).digest_many(paths)
+        self.assertEqual(digests, {path: DigestService.hash_file(path) for path in paths})
+        self.assertEqual(len(set(digests.values())), 10)
+
+
+class TestManifest(TempFolderMixin, unittest.TestCase):
+    def tearDown(self):
+        DigestService.clear_cache()
+        super().tearDown()
+
+    def test_output_manifest(self):
+        """ Выходная программа записывается, её контрольная сумма в манифесте совпадает с содержимым файла """
+        self.write("100", "(PROGRAM 100)\nG0 X0\nG1 X10.\nM30\n")
+        output = os.path.join(self.folder, "out")
+        os.makedirs(output)
+        file = HellerCNCFile(path=f"{self.folder}{os.path.sep}", name="100", output_name=os.path.join(output, "100"))
+        saved = file.save(itertools.islice(file, file.parse_head()[1], None))
+        file.close()
+        with open(saved, "rt") as program:
+            text = program.read()
+        self.assertTrue(text.startswith("%mpf100\nG54\nG64\n"))
+        self.assertTrue(text.endswith("G0 X0\nG1 X10.\nM30\n"))
+        other = self.write(os.path.join("out", "200"), "G0 X1\n")
+        Machine.write_manifests([saved])
+        Machine.write_manifests([other])
+        manifest = DigestService.read_manifest(os.path.join(output, MANIFEST_NAME))
+        self.assertEqual(manifest, {saved: DigestService.hash_file(saved), other: DigestService.hash_file(other)})
+        with open(os.path.join(output, MANIFEST_NAME), "rt") as file:
+            self.assertIn(f"{DigestService.hash_file(saved)}  100\n", file.read())
+
+
+class TestCNCFileOrigin(TempFolderMixin, unittest.TestCase):
+    def tearDown(self):
+        DigestService.EXECUTOR = None
+        DigestService.clear_cache()
+        super().tearDown()
+
+    def open(self) -> HellerCNCFile:
+        return HellerCNCFile(path=f"{self.folder}{os.path.sep}", name="100",
+                             output_name=os.path.join(self.folder, "out"))
+
+    def test_digest_in_executor(self):
+        """ Сумма исходного файла при открытии считается в общем пуле, а не в вызывающем потоке """
+        path = self.write("100", "G0 X0\nM30\n")
+        threads = []
+        hash_file = DigestService.hash_file
+
+        def counted(path_):
+            threads.append(threading.get_ident())
+            return hash_file(path_)
+        with ThreadPoolExecutor(max_workers=1) as executor, \
+                unittest.mock.patch.object(DigestService, "hash_file", counted):
+            DigestService.EXECUTOR = executor
+            file = self.open()
+            self.assertEqual(file.digest, hash_file(path))
+            file.close()
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_changed_origin(self):
+        path = self.write("100", "G0 X0\nM30\n")
+        file = self.open()
+        self.assertEqual(len(file), 2)
+        attrs = os.stat(path)
+        with open(path, "wt") as program:
+            program.write("G0 X1\nM30\n")
+        os.utime(path, ns=(attrs.st_atime_ns, attrs.st_mtime_ns + 10 ** 9))
+        with self.assertRaises(FileNotFoundError):
+            list(file)
+        file.close()
+
+
+class TestProgramCache(TempFolderMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = ProgramCache(os.path.join(self.folder, "cache"), max_size=2 ** 30)
+        self.path = self.write("1.nc", PROGRAM.decode("ascii"))
+
+    def tearDown(self):
+        DigestService.clear_cache()
+        super().tearDown()
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get(self.path))
+        program = self.cache.load(self.path)
+        cached = self.cache.get(self.path)
+        self.assertIsInstance(cached["X"], np.memmap)
+        for word in ("X", "G", "N"):
+            np.testing.assert_array_equal(cached[word], program[word])
+        np.testing.assert_array_equal(cached.modal("Z"), parse(PROGRAM).modal("Z"))
+        with open(self.path, "ab") as file:
+            file.write(b"X1.\n")
+        self.assertIsNone(self.cache.get(self.path))
+        self.assertEqual(len(self.cache.load(self.path)), len(program) + 1)
+
+    def test_missing_columns_completed(self):
+        """ Запись, созданная для части слов, дополняется при загрузке остальных, а не разбирается каждый раз """
+        self.cache.load(self.path, words=("X",))
+        self.assertIsNotNone(self.cache.get(self.path, words=("X",)))
+        self.assertIsNone(self.cache.get(self.path))
+        self.cache.load(self.path)
+        self.assertIsNotNone(self.cache.get(self.path))
+        self.assertEqual(len(os.listdir(self.cache.directory)), 1)
+
+    def test_half_deleted_entry(self):
+        self.cache.load(self.path)
+        entry = self.cache.entry(self.path)
+        os.remove(os.path.join(entry, "Y.npy"))
+        os.remove(os.path.join(entry, "Z.modal.npy"))
+        self.assertIsNone(self.cache.get(self.path))
+        self.cache.load(self.path)
+        program = self.cache.get(self.path)
+        self.assertIsNotNone(program)
+        np.testing.assert_array_equal(program.modal("Z"), parse(PROGRAM).modal("Z"))
+        self.assertFalse([name for name in os.listdir(entry) if name.startswith(".")])
+
+    def test_eviction(self):
+        paths = [self.write(f"{index}.nc", f"G0 X{index}\n" * 100) for index in range(3)]
+        for age, path in enumerate(paths):
+            self.cache.load(path)
+            os.utime(self.cache.entry(path), ns=(10 ** 18 + age, 10 ** 18 + age))
+        self.cache.get(paths[0])  # Обращение обновляет время записи
+        self.cache.max_size = self.cache.size() - 1
+        self.cache.evict()
+        self.assertIsNotNone(self.cache.get(paths[0]))
+        self.assertIsNone(self.cache.get(paths[1]))
+        self.assertIsNotNone(self.cache.get(paths[2]))
+        self.cache.clear()
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_running_size(self):
+        """ Каталог кеша обходится при первой записи и при превышении max_size, а не при каждой записи """
+        paths = [self.write(f"{index}.nc", f"G0 X{index}\n" * 100) for index in range(4)]
+        scans = []
+        entries = ProgramCache._entries
+
+        def counted(cache):
+            scans.append(cache.directory)
+            return entries(cache)
+        with unittest.mock.patch.object(ProgramCache, "_entries", counted):
+            for path in paths[:3]:
+                self.cache.load(path)
+            self.assertEqual(len(scans), 1)
+            self.assertEqual(ProgramCache._sizes[self.cache.directory], self.cache.size())
+            self.cache.max_size = self.cache.size()
+            self.cache.load(paths[3])
+        self.assertEqual(len(scans), 4)  # Первая запись, два вызова size и вытеснение
+        self.assertLessEqual(self.cache.size(), self.cache.max_size)
+        self.assertEqual(ProgramCache._sizes[self.cache.directory], self.cache.size())
+
+
+class TestPreviewPyramid(TempFolderMixin, unittest.TestCase):
+    def tearDown(self):
+        DigestService.clear_cache()
+        super().tearDown()
+
+    def test_decimate(self):
+        points = np.zeros((1000, 3))
+        points[:, 0] = np.arange(1000)
+        points[500, 1] = 10  # Пик
+        rapid = np.zeros(1000, dtype=bool)
+        rapid[700:] = True
+        index = decimate(points, rapid, 50)
+        self.assertLessEqual(len(index), 60)
+        for required in (0, 500, 699, 700, 999):
+            self.assertIn(required, index)
+        np.testing.assert_array_equal(decimate(points[:10], rapid[:10], 50), np.arange(10))
+
+    def test_levels(self):
+        data = arc_program(steps=5000)
+        pyramid = PreviewPyramid.from_program(parse(data), levels=(100, 1000))
+        full = path_points(data)
+        for level, (points, rapid) in pyramid.levels.items():
+            self.assertLessEqual(len(points), level * 1.2)
+            np.testing.assert_allclose(points[[0, -1]], full[[0, -1]], atol=1e-4)
+            self.assertTrue(rapid[0])
+        points, _ = pyramid.level_for(xlim=(0, 50), ylim=(0, 50), max_points=400)
+        self.assertEqual(len(points), len(pyramid.levels[100][0]))
+        points, _ = pyramid.level_for(max_points=2000)
+        self.assertEqual(len(points), len(pyramid.levels[1000][0]))
+
+    def test_stored_in_cache_entry(self):
+        cache = ProgramCache(os.path.join(self.folder, "cache"))
+        path = self.write("1.nc", arc_program(steps=500).decode("ascii"))
+        first = PreviewPyramid.load(path, cache, levels=(100,))
+        self.assertIn("preview-v1-100.npz", os.listdir(cache.entry(path)))
+        second = PreviewPyramid.load(path, cache, levels=(100,))
+        np.testing.assert_array_equal(first.levels[100][0], second.levels[100][0])
+        np.testing.assert_array_equal(first.levels[100][1], second.levels[100][1])
+
+
+class TestSession(unittest.TestCase):
+    class File:
+        """ Тип файла задания: считает созданные и закрытые объекты """
+        created, closed = [], []
+
+        def __init__(self, name):
+            self.name = name
+            self.created.append(name)
+
+        def close(self):
+            self.closed.append(self.name)
+
+    def setUp(self):
+        self.File.created, self.File.closed = [], []
+        self.session = Session([{"name": "1"}, {"name": "2"}, {"name": "3"}], type_=self.File)
+
+    def test_lazy_files(self):
+        self.assertEqual(len(self.session), 3)
+        self.assertEqual(self.File.created, [])
+        self.assertEqual(self.session[-1].name, "3")
+        self.assertIs(self.session[2], self.session[-1])
+        self.assertEqual(self.File.created, ["3"])
+        self.assertEqual([file.name for file in self.session], ["1", "2", "3"])
+        self.assertEqual(self.File.created, ["3", "1", "2"])
+        with self.assertRaises(IndexError):
+            self.session[3]
+        with self.assertRaises(ValueError):
+            Session([])
+
+    def test_append_and_delete(self):
+        self.session[0]
+        self.session.append({"name": "4"})
+        del self.session[0]
+        del self.session[0]
+        self.assertEqual(self.File.closed, ["1"])
+        self.assertEqual([file.name for file in self.session], ["3", "4"])
+        self.session.close()
+        self.assertEqual(self.File.closed, ["1", "3", "4"])
+
+
+class TestIndexedDictionary(unittest.TestCase):
+    def test_interface(self):
+        data = IndexedDictionary(("q", 1), (123, 2), ("test", 3))
+        self.assertEqual(list(data.items()), [("q", 1), (123, 2), ("test", 3)])
+        self.assertEqual((data.get(123), data.get("123"), data.get("x", 0)), (2, None, 0))
+        data.update(("q", 4))
+        self.assertEqual(list(data.keys()), ["q", 123, "test"])
+        self.assertEqual(list(data.values()), [4, 2, 3])
+        self.assertEqual(data.pop("test"), 3)
+        self.assertEqual(data.pop("test", "-"), "-")
+        del data[123]
+        self.assertNotIn(123, data)
+        self.assertEqual(len(data), 1)
+        with self.assertRaises(KeyError):
+            data["missing"]
+        with self.assertRaises(TypeError):
+            data.update(["a", 1])
+        with self.assertRaises(ValueError):
+            data.update(("a",))
+
+    def test_key_function(self):
+        data = IndexedDictionary((123, "a"), key_function=str)
+        data["123"] = "b"
+        self.assertEqual(list(data.items()), [(123, "b")])
+        self.assertIn("123", data)
+
+    def test_equal(self):
+        self.assertEqual(IndexedDictionary(("a", 1), ("b", 2)), IndexedDictionary(("a", 1), ("b", 2)))
+        self.assertNotEqual(IndexedDictionary(("a", 1), ("b", 2)), IndexedDictionary(("b", 2), ("a", 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
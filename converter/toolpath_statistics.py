@@ -0,0 +1,97 @@
+"""
+Статистика траектории по разобранной программе (см. gcode_parser):
+длина холостых (G0) и рабочих (G1/G2/G3) перемещений, габарит, количество перемещений,
+расчётное время резания и его сравнение со значением 'Cutting Time' из шапки.
+Все величины считаются операциями NumPy (diff, norm, sum) над столбцами программы целиком.
+Дуги G2/G3 считаются по хорде.
+"""
+import re
+from typing import Optional, Union
+import numpy as np
+from gcode_parser import ParsedProgram, parse
+
+AXES = ("X", "Y", "Z")
+CUTTING_TIME = re.compile(rb"Cutting\s+Time\s*:\s*([0-9]*\.?[0-9]+)\s*min", re.IGNORECASE)
+HEAD_LIMIT = 16 * 1024  # Байт, область поиска 'Cutting Time'
+
+
+class ToolpathStatistics:
+    def __init__(self, rapid_length: float, cutting_length: float, rapid_moves: int, cutting_moves: int,
+                 bounds: dict[str, tuple[float, float]], cutting_time: float, header_time: Optional[float] = None):
+        self.rapid_length = rapid_length  # мм
+        self.cutting_length = cutting_length  # мм
+        self.rapid_moves = rapid_moves
+        self.cutting_moves = cutting_moves
+        self.bounds = bounds  # Ось: (min, max)
+        self.cutting_time = cutting_time  # Минуты, сумма длина / F по рабочим перемещениям
+        self.header_time = header_time  # Минуты, значение из шапки программы
+
+    @classmethod
+    def from_program(cls, program: ParsedProgram, header_time: Optional[float] = None) -> "ToolpathStatistics":
+        deltas = program.deltas(AXES)
+        length = np.linalg.norm(deltas, axis=0)
+        motion = program.modal("G")
+        moved = length > 0
+        rapid, cutting = moved & (motion == 0), moved & (motion > 0)
+        feed = program.modal("F")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            times = np.where(cutting & (feed > 0), length / feed, 0)
+        bounds = {}
+        for axis in AXES:
+            position = program.modal(axis)
+            if not np.isnan(position).all():
+                bounds[axis] = (float(np.nanmin(position)), float(np.nanmax(position)),)
+        return cls(rapid_length=float(length[rapid].sum()), cutting_length=float(length[cutting].sum()),
+                   rapid_moves=int(np.count_nonzero(rapid)), cutting_moves=int(np.count_nonzero(cutting)),
+                   bounds=bounds, cutting_time=float(np.nansum(times)), header_time=header_time)
+
+    @classmethod
+    def from_file(cls, path: Union[str, bytes]) -> "ToolpathStatistics":
+        """ Файл читается один раз: и для разбора, и для значения 'Cutting Time' из шапки """
+        with open(path, "rb") as file:
+            data = file.read()
+        return cls.from_program(parse(data), get_header_time(data))
+
+    @property
+    def moves(self) -> int:
+        return self.rapid_moves + self.cutting_moves
+
+    @property
+    def time_deviation(self) -> Optional[float]:
+        """ Относительное расхождение расчётного времени резания со значением из шапки """
+        if not self.header_time:
+            return
+        return (self.cutting_time - self.header_time) / self.header_time
+
+    def as_dict(self) -> dict:
+        return {"rapid_length": self.rapid_length, "cutting_length": self.cutting_length,
+                "rapid_moves": self.rapid_moves, "cutting_moves": self.cutting_moves, "bounds": self.bounds,
+                "cutting_time": self.cutting_time, "header_time": self.header_time}
+
+    def __str__(self):
+        bounds = " ".join(f"{axis}[{low:g}..{high:g}]" for axis, (low, high) in self.bounds.items())
+        header = f" (в шапке {self.header_time:g} мин)" if self.header_time is not None else ""
+        return f"Холостые: {self.rapid_moves} перемещений, {self.rapid_length:.1f} мм; " \
+               f"рабочие: {self.cutting_moves} перемещений, {self.cutting_length:.1f} мм; " \
+               f"время резания {self.cutting_time:.2f} мин{header}; габарит {bounds}"
+
+
+def get_header_time(data: bytes) -> Optional[float]:
+    """ Значение 'Cutting Time : 17.69min' из шапки, минуты """
+    match = CUTTING_TIME.search(data, 0, HEAD_LIMIT)
+    return float(match.group(1)) if match else None
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+    root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "exemple")
+    paths = [os.path.join(folder, name) for folder, _, names in os.walk(root) for name in names]
+    start, blocks = time.perf_counter(), 0
+    for path in paths:
+        stats = ToolpathStatistics.from_file(path)
+        blocks += stats.moves
+        deviation = stats.time_deviation
+        print(os.path.basename(path), stats, "" if deviation is None else f"{deviation:+.1%}")
+    print(f"{len(paths)} файлов, {blocks} перемещений, {time.perf_counter() - start:.2f} с")
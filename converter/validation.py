@@ -0,0 +1,109 @@
+"""
+Проверка программы на соответствие станку (модель Machine):
+    - ход по осям X/Y/Z (xover, yover, zover) - размах координат программы
+    - подача по каждой оси (xfspeed, yfspeed, zfspeed) - составляющая F вдоль оси на рабочих перемещениях
+    - обороты шпинделя (spindelespeed) - максимальное S
+Все проверки - редукции NumPy по столбцам разобранной программы (см. gcode_parser), без циклов по кадрам.
+"""
+from typing import Optional, Union
+import numpy as np
+from gcode_parser import ParsedProgram, parse_file
+
+AXES = ("X", "Y", "Z")
+
+
+class Violation:
+    """ Одно нарушение: что проверялось, фактическое значение, предел станка и номера кадров-нарушителей """
+    def __init__(self, check: str, axis: str, value: float, limit: float, blocks: np.ndarray):
+        self.check = check
+        self.axis = axis
+        self.value = value
+        self.limit = limit
+        self.blocks = blocks
+
+    def __str__(self):
+        blocks = ", ".join(map(lambda n: f"N{n}", self.blocks[:10]))
+        tail = f" и ещё {len(self.blocks) - 10}" if len(self.blocks) > 10 else ""
+        return f"{self.check} {self.axis}: {self.value:g} > {self.limit:g} ({blocks}{tail})"
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.check!r}, {self.axis!r}, {self.value}, {self.limit})"
+
+
+class ValidationReport:
+    def __init__(self, violations: list[Violation], ranges: dict[str, tuple[float, float]],
+                 feeds: dict[str, float], spindle_speed: float):
+        self.violations = violations
+        self.ranges = ranges  # Ось: (min, max)
+        self.feeds = feeds  # Ось: максимальная подача вдоль оси
+        self.spindle_speed = spindle_speed
+
+    def __bool__(self):
+        """ True - программа проходит по всем пределам станка """
+        return not self.violations
+
+    def __iter__(self):
+        return iter(self.violations)
+
+    def __str__(self):
+        return "\n".join(map(str, self.violations)) or "OK"
+
+
+class EnvelopeValidator:
+    """
+    Использование:
+        validator = EnvelopeValidator.from_row(machine_row)  # значения записи Machine
+        report = validator.check(parse_file(path))
+        if not report:
+            print(report)
+    Пределы со значением None не проверяются.
+    """
+    def __init__(self, travel: Optional[dict[str, Optional[float]]] = None,
+                 feed: Optional[dict[str, Optional[float]]] = None, spindle_speed: Optional[float] = None):
+        self.travel = {axis: value for axis, value in (travel or {}).items() if value is not None}
+        self.feed = {axis: value for axis, value in (feed or {}).items() if value is not None}
+        self.spindle_speed = spindle_speed
+
+    @classmethod
+    def from_row(cls, row: dict) -> "EnvelopeValidator":
+        return cls(travel={axis: row.get(f"{axis.lower()}over") for axis in AXES},
+                   feed={axis: row.get(f"{axis.lower()}fspeed") for axis in AXES},
+                   spindle_speed=row.get("spindelespeed"))
+
+    def check(self, program: Union[ParsedProgram, str]) -> ValidationReport:
+        if not isinstance(program, ParsedProgram):
+            program = parse_file(program)
+        blocks = program.block_numbers
+        violations, ranges, feeds = [], {}, {}
+        positions = {axis: program.modal(axis) for axis in AXES}
+        for axis, position in positions.items():
+            if np.isnan(position).all():
+                continue
+            low, high = np.nanmin(position), np.nanmax(position)
+            ranges[axis] = (float(low), float(high),)
+            limit = self.travel.get(axis)
+            if limit is not None and high - low > limit:
+                violations.append(Violation("Ход", axis, float(high - low), limit,
+                                            blocks[(position == low) | (position == high)]))
+        axis_feeds = self._axis_feeds(program)
+        for axis, axis_feed in axis_feeds.items():
+            feeds[axis] = float(np.nanmax(axis_feed, initial=0))
+            limit = self.feed.get(axis)
+            if limit is not None and feeds[axis] > limit:
+                violations.append(Violation("Подача", axis, feeds[axis], limit, blocks[axis_feed > limit]))
+        speed = program["S"]
+        max_speed = float(np.nanmax(speed, initial=0))
+        if self.spindle_speed is not None and max_speed > self.spindle_speed:
+            violations.append(Violation("Обороты", "S", max_speed, self.spindle_speed,
+                                        blocks[speed > self.spindle_speed]))
+        return ValidationReport(violations, ranges, feeds, max_speed)
+
+    @staticmethod
+    def _axis_feeds(program: ParsedProgram) -> dict[str, np.ndarray]:
+        """ Подача вдоль каждой оси в каждом кадре: F * |d_оси| / длина перемещения (только G1/G2/G3) """
+        deltas = program.deltas(AXES)
+        length = np.linalg.norm(deltas, axis=0)
+        working = (program.modal("G") > 0) & (length > 0)
+        feed = program.modal("F")
+        share = np.divide(np.abs(deltas), length, out=np.zeros_like(deltas), where=length > 0)
+        return {axis: np.where(working, feed * share[index], 0) for index, axis in enumerate(AXES)}
@@ -1,5 +1,6 @@
-from typing import Any, Optional, Iterable
-from converter.cnc_file import CNCFile
+from typing import TYPE_CHECKING, Any, Optional, Iterable, Callable, Hashable, Iterator
+if TYPE_CHECKING:
+    from converter.cnc_file import CNCFile
 
 
 class LinkedListItem:
@@ -8,7 +9,7 @@ class LinkedListItem:
         self.value = val
 
     @property
-    def next(self) -> Optional[CNCFile]:
+    def next(self) -> Optional["CNCFile"]:
         return self.__next
 
     @next.setter
@@ -68,7 +69,7 @@ class LinkedList:
             return
         left_item.next = right_item
 
-    def __items_gen(self) -> Optional[CNCFile]:
+    def __items_gen(self) -> Optional["CNCFile"]:
         next_element = self.head
         while next_element is not None:
             current_element = next_element.next
@@ -77,7 +78,7 @@ class LinkedList:
                 break
             next_element = current_element
 
-    def __iter__(self) -> CNCFile:
+    def __iter__(self) -> "CNCFile":
         return self.__items_gen()
 
     def __len__(self):
@@ -235,9 +236,115 @@ class LinkedListDictionary:
         return f"{self.__class__.__name__}({str(self)})"
 
 
+class IndexedDictionary:
+    """
+    Упорядоченный словарь с тем же интерфейсом, что у LinkedListDictionary (get, update, pop, items, keys, values),
+    но с поиском по хеш-индексу - O(1) в среднем вместо прохода по двум связным спискам.
+    Ключи сравниваются обычным образом (hash и ==). Если нужно сравнение как у LinkedListDictionary
+    (123 и "123" - один ключ), это задаётся явно: IndexedDictionary(..., key_function=str).
+    Повторное добавление ключа заменяет значение, порядок - порядок первого добавления.
+    """
+    __slots__ = ("_key_function", "_data",)
+
+    def __init__(self, *values: tuple, key_function: Optional[Callable[[Any], Hashable]] = None):
+        self._key_function = key_function
+        self._data: dict[Hashable, tuple[Any, Any]] = {}  # Приведённый ключ: (ключ, значение)
+        for item in values:
+            self.update(item)
+
+    def _key(self, key) -> Hashable:
+        return key if self._key_function is None else self._key_function(key)
+
+    @staticmethod
+    def is_valid(v):
+        if not isinstance(v, tuple):
+            raise TypeError
+        if not len(v) == 2:
+            raise ValueError
+
+    def get(self, item, alt_val=None):
+        pair = self._data.get(self._key(item))
+        return alt_val if pair is None else pair[1]
+
+    def update(self, item: tuple):
+        self.is_valid(item)
+        self[item[0]] = item[1]
+
+    def pop(self, item, alt_val=None):
+        pair = self._data.pop(self._key(item), None)
+        return alt_val if pair is None else pair[1]
+
+    def items(self) -> Iterator[tuple[Any, Any]]:
+        return iter(self._data.values())
+
+    def keys(self) -> Iterator:
+        return (key for key, _ in self._data.values())
+
+    def values(self) -> Iterator:
+        return (value for _, value in self._data.values())
+
+    def __iter__(self):
+        return self.keys()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, item):
+        return self._data[self._key(item)][1]
+
+    def __setitem__(self, key, value):
+        normalized = self._key(key)
+        if normalized in self._data:
+            key = self._data[normalized][0]
+        self._data[normalized] = (key, value,)
+
+    def __delitem__(self, key):
+        del self._data[self._key(key)]
+
+    def __contains__(self, item):
+        return self._key(item) in self._data
+
+    def __eq__(self, other):
+        if not isinstance(other, IndexedDictionary):
+            return NotImplemented
+        return list(self.items()) == list(other.items())
+
+    def __str__(self):
+        return "".join(str((str(k), str(v),)) for k, v in self.items())
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({str(self)})"
+
+
 if __name__ == "__main__":
     d = LinkedListDictionary(("q", "sdfsdfsdf"), (123, "sdfsdfsdf"), ("test", "strt"))
     print(d.items())
     d.update(("232", "sdfsdfsdf"))
     print(d.items())
     print("232" in d)
+
+    import timeit
+    count = 10_000
+    pairs = [(f"key{index}", index,) for index in range(count)]
+    lookups = pairs[::100]
+
+    def linked(values) -> LinkedList:
+        """ LinkedList.append хранит только последний элемент (__len__ всегда 0), поэтому цепочка собирается вручную """
+        result = LinkedList()
+        nodes = [LinkedListItem(value) for value in values]
+        for left, right in zip(nodes, nodes[1:]):
+            left.next = right
+        result.head, result.tail = nodes[0], nodes[-1]
+        return result
+
+    old = LinkedListDictionary()
+    old._LinkedListDictionary__keys = linked(key for key, _ in pairs)
+    old._LinkedListDictionary__values = linked(value for _, value in pairs)
+    new = IndexedDictionary(*pairs)
+    assert [str(old.get(key)) for key, _ in lookups] == [str(new.get(key)) for key, _ in lookups]
+    for name, filled in (("LinkedListDictionary", old,), ("IndexedDictionary", new,)):
+        print(f"{name}, {count} ключей: "
+              f"get x{len(lookups)} {timeit.timeit(lambda: [filled.get(k) for k, _ in lookups], number=1):.4f} с, "
+              f"[] x{len(lookups)} {timeit.timeit(lambda: [filled[k] for k, _ in lookups], number=1):.4f} с, "
+              f"in x{len(lookups)} {timeit.timeit(lambda: [k in filled for k, _ in lookups], number=1):.4f} с")
+    print(f"IndexedDictionary: {count} update {timeit.timeit(lambda: IndexedDictionary(*pairs), number=1):.4f} с")
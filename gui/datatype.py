@@ -1,59 +1,65 @@
-import weakref
+"""
+Двусвязный список с индексным доступом.
+Помимо ссылок next/prev список хранит массив нод в порядке следования и возрастающие ключи нод:
+    - длина, голова, хвост, добавление в конец - O(1)
+    - list_[i] - O(1), node.index - O(log n) (бинарный поиск ключа ноды)
+    - удаление головы (очередь) - O(1) амортизированно, из середины - сдвиг массива, без перенумерации нод
+"""
 import copy
+from bisect import bisect_left
+from types import MappingProxyType
+from collections.abc import Mapping, MutableMapping
 from weakref import ref
 from typing import Optional, Iterable, Union, Any, Iterator
 
+LINK_SLOTS = frozenset(("_key", "_owner", "_next", "_prev", "__weakref__",))  # Не сериализуются, см. LinkedList.__setstate__
+STATE_SLOTS: dict[type, tuple[str, ...]] = {}
+COMPACT_MIN_OFFSET = 32  # Удалённые с головы позиции массива освобождаются пачками
+
 
 class LinkedListItem:
+    __slots__ = ("_val", "_key", "_owner", "_next", "_prev", "__weakref__",)
 
     def __init__(self, val=None):
         self._val = val
-        self._index = 0
-        self.__next = None
-        self.__prev = None
+        self._key = 0  # Порядковый ключ в списке-владельце: ключи возрастают от головы к хвосту
+        self._owner: Optional["LinkedList"] = None
+        self._next: Optional["LinkedListItem"] = None
+        self._prev: Optional["LinkedListItem"] = None
 
     @property
     def next(self):
-        return self.__next
+        return self._next
 
     @next.setter
     def next(self, val: Optional["LinkedListItem"]):
         self._is_valid_item(val)
-        self.__next = val
-        if not val:
-            return
-        val.index = self._index + 1
+        self._next = val
 
     @property
-    def prev(self):
-        return self.__prev
-
-    @property
-    def index(self):
-        return self._index
-
-    @index.setter
-    def index(self, value):
-        if not isinstance(value, int):
-            raise TypeError
-        if value < 0:
-            raise ValueError
-        self._index = value
+    def prev(self) -> Optional[ref]:
+        """ Слабая ссылка на предыдущую ноду (создаётся при обращении, список хранит обычную) """
+        return ref(self._prev) if self._prev is not None else None
 
     @prev.setter
     def prev(self, item: Optional["LinkedListItem"]):
         self._is_valid_item(item)
-        if not item:
-            return
-        self.__prev = ref(item)
-        if not self._index:
-            item.index = 0
-            self._index = 1
-        else:
-            item.index = self._index - 1
+        self._prev = item
+
+    @property
+    def index(self) -> int:
+        """ Позиция в списке. Для ноды вне списка - 0 """
+        if self._owner is None:
+            return 0
+        return self._owner._position(self)
 
     @property
     def value(self):
+        """ Словарь значений - представлением только для чтения, без копирования. Изменять - через копию: dict(node.value) """
+        if type(self._val) is dict:
+            return MappingProxyType(self._val)
+        if isinstance(self._val, Mapping) and not isinstance(self._val, MutableMapping):
+            return self._val  # Уже неизменяемое
         return copy.copy(self._val)
 
     @classmethod
@@ -63,6 +69,33 @@ class LinkedListItem:
         if not type(item) is cls:
             raise TypeError
 
+    def __getstate__(self):
+        """ Без ссылок на соседей и на список: цепочка не сериализуется рекурсивно """
+        slots = {name: getattr(self, name) for name in self._state_slots() if hasattr(self, name)}
+        return getattr(self, "__dict__", None), slots
+
+    @classmethod
+    def _state_slots(cls) -> tuple[str, ...]:
+        """ Сериализуемые слоты класса: без связей, приватные - под искажённым именем """
+        if cls not in STATE_SLOTS:
+            names = []
+            for class_ in cls.__mro__:
+                for name in getattr(class_, "__slots__", ()):
+                    if name.startswith("__") and not name.endswith("__"):
+                        name = f"_{class_.__name__.lstrip('_')}{name}"
+                    if name not in LINK_SLOTS:
+                        names.append(name)
+            STATE_SLOTS[cls] = tuple(names)
+        return STATE_SLOTS[cls]
+
+    def __setstate__(self, state):
+        self._key, self._owner, self._next, self._prev = 0, None, None, None
+        attributes, slots = state
+        if attributes:
+            self.__dict__.update(attributes)
+        for name, value in slots.items():
+            setattr(self, name, value)
+
     def __eq__(self, other: "LinkedListItem"):
         self._is_valid_item(other)
         return self._val == other.value
@@ -78,65 +111,61 @@ class LinkedList:
     LinkedListItem = LinkedListItem
 
     def __init__(self, items: Optional[Iterable[Any]] = None):
-        self._head: Optional[LinkedListItem] = None
-        self._tail: Optional[LinkedListItem] = None
+        self._nodes: list[Optional[LinkedListItem]] = []  # Ноды в порядке следования, начиная с позиции _start
+        self._keys: list[int] = []  # Ключи нод, параллельно _nodes
+        self._start = 0  # Позиции до _start освобождены удалением с головы
         if items is not None:
             [self.append(val=item) for item in items]
 
     @property
     def head(self):
-        return self._head
+        return self._nodes[self._start] if len(self._nodes) > self._start else None
 
     @property
     def tail(self):
-        return self._tail
+        return self._nodes[-1] if len(self._nodes) > self._start else None
 
     def append(self, *args, **kwargs):
         """
         Добавить ноду в нонец
         """
         new_element = self.LinkedListItem(*args, **kwargs)
-        if self:
-            last_elem = self._tail
-            self.__set_next(last_elem, new_element)
-            self._tail = new_element
-        else:
-            self._head = self._tail = new_element
+        last_elem = self.tail
+        key = last_elem._key + 1 if last_elem is not None else 0
+        self._nodes.append(new_element)
+        self._keys.append(key)
+        self.__link(last_elem, new_element, None, key)
 
     def add_to_head(self, **kwargs):
         """
         Добавить ноду в начало
         """
         node = self.LinkedListItem(**kwargs)
-        if not self:
-            self._head = self._tail = node
-            return
-        first_elem = self._head
-        self._head = node
-        node.next = first_elem
+        first_elem = self.head
+        key = first_elem._key - 1 if first_elem is not None else 0
+        if self._start:
+            self._start -= 1
+            self._nodes[self._start], self._keys[self._start] = node, key
+        else:
+            self._nodes.insert(0, node)
+            self._keys.insert(0, key)
+        self.__link(None, node, first_elem, key)
 
     def replace(self, old_node: LinkedListItem, new_node: LinkedListItem):
         if not isinstance(old_node, self.LinkedListItem) or not isinstance(new_node, self.LinkedListItem):
             raise TypeError
         if not len(self):
             return
-        if len(self) == 1:
-            self._head = self._tail = new_node
-            return
-        next_node = old_node.next
-        previous_node = old_node.prev()
-        if old_node.index == len(self) - 1:
-            self._tail = new_node
-        if old_node.index == 0:
-            self._head = new_node
-        previous_node.next = new_node
-        next_node.prev = new_node
+        position = self._start + self._position(old_node)
+        previous_node, next_node = self.__unlink(old_node)
+        self._nodes[position] = new_node
+        self.__link(previous_node, new_node, next_node, self._keys[position])
         return new_node
 
     def __getitem__(self, index):
         index = self.__support_negative_index(index)
         self._is_valid_index(index)
-        return self.__forward_move(index)
+        return self._nodes[self._start + index]
 
     def __support_negative_index(self, index: int):
         if index < 0:
@@ -146,43 +175,28 @@ class LinkedList:
     def __setitem__(self, index, value):
         index = self.__support_negative_index(index)
         self._is_valid_index(index)
-        new_element = self.LinkedListItem(value)
-        if self:
-            last_element = self.__forward_move(index)
-            self.__set_next(last_element, new_element)
-        else:
-            self._head = self._tail = new_element
+        self.replace(self[index], self.LinkedListItem(value))
 
     def __delitem__(self, index):
-        def decr_index_for_nex_items(cur_item: LinkedListItem):  # O(n)
-            while cur_item:
-                cur_item.index -= 1
-                cur_item = cur_item.next
+        """
+        Удаление с головы и с хвоста - O(1), из середины - O(n): сдвиг хвоста массивов _nodes и _keys (memmove)
+        """
         index = self.__support_negative_index(index)
         self._is_valid_index(index)
+        position = self._start + index
+        item = self._nodes[position]
+        self.__unlink(item)
         if not index:
-            item = self.__forward_move(index)
-            next_item = item.next
-            item.next = None
-            if next_item is not None:
-                next_item.index = 0
-            self._head = next_item
-            return item
-        item_prev = self.__forward_move(index - 1)
-        if index == len(self) - 1:
-            item = item_prev.next
-            item_prev.next = None
-            self._tail = item_prev
-            return item
-        current_item = item_prev.next
-        next_item = current_item.next
-        item_prev.next = next_item
-        current_item.next = None
-        decr_index_for_nex_items(current_item)
-        return current_item
+            self._nodes[position] = None
+            self._start += 1
+            self.__compact()
+        else:
+            del self._nodes[position]
+            del self._keys[position]
+        return item
 
     def __iter__(self):
-        return self.__gen(self._head)
+        return self.__gen(self.head)
 
     def __repr__(self):
         return f"{self.__class__}({tuple(self)})"
@@ -190,25 +204,57 @@ class LinkedList:
     def __str__(self):
         return str([str(x) for x in self])
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_nodes"] = self._nodes[self._start:]
+        del state["_keys"], state["_start"]
+        return state
+
+    def __setstate__(self, state):
+        nodes = state.pop("_nodes")
+        self._nodes, self._keys, self._start = [], [], 0
+        self.__dict__.update(state)
+        self.__adopt(nodes)
+
     def _replace_inner(self, new_head: LinkedListItem, new_tail: LinkedListItem):
         """
-        Заменить значения инкапсулированных атрибутов head и tail на новые
+        Заменить содержимое списка цепочкой нод от new_head до new_tail (например, собранной в другом списке)
         """
         if type(new_head) is not self.LinkedListItem or type(new_tail) is not self.LinkedListItem:
             raise TypeError
-        self._head = new_head
-        self._tail = new_tail
+        if new_head is self.head and new_tail is self.tail:
+            return
+        nodes = []
+        for node in self.__gen(new_head):
+            nodes.append(node)
+            if node is new_tail:
+                break
+        self.__adopt(nodes)
+
+    def _restore(self, nodes: list[LinkedListItem], keys: list[int]):
+        """ Заменить содержимое списка нодами с заданными возрастающими ключами (например, сохранёнными вне списка) """
+        if len(nodes) != len(keys) or any(map(lambda pair: pair[0] >= pair[1], zip(keys, keys[1:]))):
+            raise ValueError
+        self.__adopt(nodes, keys)
+
+    def _on_insert(self, node: LinkedListItem):
+        """ Нода добавлена в список. Точка расширения для индексов в наследниках """
+
+    def _on_remove(self, node: LinkedListItem):
+        """ Нода исключена из списка. Точка расширения для индексов в наследниках """
+
+    def _position(self, node: LinkedListItem) -> int:
+        """ Позиция ноды этого списка по её ключу - O(log n) """
+        position = bisect_left(self._keys, node._key, self._start)
+        if position == len(self._keys) or self._nodes[position] is not node:
+            raise ValueError("Нода не принадлежит списку")
+        return position - self._start
 
     def __len__(self):
-        return sum(tuple(1 for _ in self))
+        return len(self._nodes) - self._start
 
     def __bool__(self):
-        try:
-            next(self.__iter__())
-        except StopIteration:
-            return False
-        else:
-            return True
+        return len(self._nodes) > self._start
 
     def __contains__(self, item):
         if type(item) is not self.LinkedListItem:
@@ -226,24 +272,49 @@ class LinkedList:
         if index >= len(self):
             raise IndexError
 
-    @staticmethod
-    def __set_next(left_item: Union[LinkedListItem, weakref.ref], right_item: Union[LinkedListItem, weakref.ref]):
-        left_item = left_item() if hasattr(left_item, "__call__") else left_item  # Check item is WeakRef
-        right_item = right_item() if hasattr(right_item, "__call__") else right_item  # Check item is WeakRef
-        right_item.index = left_item.index + 1
-        left_item.next = right_item
-
-    @staticmethod
-    def __set_prev(right_item: Union[LinkedListItem, weakref.ref], left_item: Union[LinkedListItem, weakref.ref]):
-        left_item = left_item() if hasattr(left_item, "__call__") else left_item  # Check item is WeakRef
-        right_item = right_item() if hasattr(right_item, "__call__") else right_item  # Check item is WeakRef
-        right_item.prev = left_item
-
-    def __forward_move(self, index=-1):
-        element = self._head
-        for _ in range(len(self) - 1 if index == -1 else index):
-            element = element.next
-        return element
+    def __link(self, left_item: Optional[LinkedListItem], item: LinkedListItem,
+               right_item: Optional[LinkedListItem], key: int):
+        """ Связать item с соседями. Позицию в _nodes и ключ в _keys занимает вызывающий код """
+        item._owner, item._key = self, key
+        item.next, item.prev = right_item, left_item
+        if left_item is not None:
+            left_item.next = item
+        if right_item is not None:
+            right_item.prev = item
+        self._on_insert(item)
+
+    def __unlink(self, item: LinkedListItem) -> tuple[Optional[LinkedListItem], Optional[LinkedListItem]]:
+        """ Исключить ноду из цепочки, соседи связываются между собой """
+        self._on_remove(item)
+        previous_node = item._prev
+        next_node = item.next
+        if previous_node is not None:
+            previous_node.next = next_node
+        if next_node is not None:
+            next_node.prev = previous_node
+        item.next = item.prev = None
+        item._owner = None
+        return previous_node, next_node
+
+    def __adopt(self, nodes: list[LinkedListItem], keys: Optional[list[int]] = None):
+        """ Сделать список владельцем цепочки nodes: ключи по порядку (или keys), связи заново """
+        for node in self._nodes[self._start:]:
+            self._on_remove(node)
+            node._owner = None
+        self._nodes, self._keys, self._start = list(nodes), list(range(len(nodes))) if keys is None else list(keys), 0
+        previous_node = None
+        for key, node in zip(self._keys, nodes):
+            node._owner, node._key = self, key
+            node.prev, node.next = previous_node, None
+            if previous_node is not None:
+                previous_node.next = node
+            previous_node = node
+            self._on_insert(node)
+
+    def __compact(self):
+        if self._start >= COMPACT_MIN_OFFSET and self._start * 2 >= len(self._nodes):
+            del self._nodes[:self._start], self._keys[:self._start]
+            self._start = 0
 
     @staticmethod
     def __gen(start_item: Optional[LinkedListItem] = None) -> Iterator:
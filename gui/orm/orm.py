@@ -16,10 +16,13 @@ import importlib
 import hashlib
 import operator
 import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
 from abc import ABC, abstractmethod, abstractproperty
 from weakref import ref, ReferenceType
 from typing import Union, Iterator, Iterable, Optional, Literal, Type, Any
 from collections import ChainMap
+from collections.abc import Mapping
 from pymemcache.client.base import Client
 from pymemcache.exceptions import MemcacheError
 from pymemcache_dill_serde import DillSerde
@@ -34,8 +37,12 @@ from gui.datatype import LinkedList, LinkedListItem
 from database.models import RESERVED_WORDS, CustomModel, ModelController, DATABASE_PATH
 from gui.orm.exceptions import *
 
+MISSING = object()  # Значение столбца, не заданного в ноде (см. NodeValues)
+
 
 class ORMAttributes:
+    __slots__ = ()
+
     @classmethod
     def is_valid_node(cls, node: Union["ORMItem", "SpecialOrmItem", "ResultORMItem"]):
         if not isinstance(node, (SpecialOrmItem, ORMItem, ResultORMItem,)):
@@ -46,6 +53,8 @@ class ORMAttributes:
     def is_valid_model_instance(item):
         if isinstance(item, (int, str, float, bytes, bytearray, set, dict, list, tuple, type(None))):
             raise InvalidModel
+        if isinstance(item, type) and item in ModelMetadata.cache:
+            return
         if hasattr(item, "__new__"):
             item = item()  # __new__
             if not hasattr(item, "column_names"):
@@ -58,6 +67,8 @@ class ORMAttributes:
 
 
 class NodeTools:
+    __slots__ = ()
+
     @staticmethod
     def is_valid_primary_key(d: dict):
         if not isinstance(d, dict):
@@ -68,46 +79,147 @@ class NodeTools:
             raise ValueError
 
 
+class ModelMetadata:
+    """ Сведения о модели, общие для всех её нод. Собираются один раз на класс модели """
+    __slots__ = ("model", "column_names", "columns", "positions", "primary_key", "foreign_keys", "unique_columns",
+                 "__references",)
+    cache: dict[type, "ModelMetadata"] = {}
+
+    def __init__(self, model: Type[CustomModel]):
+        instance = model()
+        self.model = model
+        self.column_names: dict[str, dict] = instance.column_names
+        self.columns: tuple[str, ...] = tuple(self.column_names)
+        self.positions: dict[str, int] = {name: position for position, name in enumerate(self.columns)}
+        self.primary_key: Optional[str] = next((name for name, data in self.column_names.items()
+                                                if data["primary_key"]), None)
+        self.foreign_keys: tuple = instance.foreign_keys
+        self.unique_columns = frozenset(name for name, data in self.column_names.items() if data["unique"])
+        self.__references = None
+
+    @classmethod
+    def of(cls, model: Type[CustomModel]) -> "ModelMetadata":
+        try:
+            return cls.cache[model]
+        except (KeyError, TypeError):
+            ORMAttributes.is_valid_model_instance(model)
+        metadata = cls.cache[model] = cls(model)
+        return metadata
+
+    def __reduce__(self):
+        """ В кеш и при копировании передаётся только ссылка на класс модели """
+        return _restore_model_metadata, (self.model,)
+
+    @property
+    def references(self) -> tuple[tuple[str, str, str], ...]:
+        """ (столбец этой таблицы, таблица и столбец, на которые он ссылается) для каждого внешнего ключа """
+        if self.__references is None:
+            self.__references = tuple((foreign_key.parent.name, *str(foreign_key.column).split("."),)
+                                      for foreign_key in self.foreign_keys)
+        return self.__references
+
+
+def _restore_model_metadata(model) -> ModelMetadata:
+    return ModelMetadata.of(model)
+
+
+class NodeValues(Mapping):
+    """
+    Значения полей ноды только для чтения: кортеж в порядке столбцов модели (общий ModelMetadata на модель).
+    Изменение - только через копию: values.replace(new_values).
+    """
+    __slots__ = ("_metadata", "_values", "_extra",)
+
+    def __init__(self, metadata: ModelMetadata, data: Mapping):
+        positions = metadata.positions
+        values = [MISSING] * len(positions)
+        extra = None
+        for name, value in data.items():
+            position = positions.get(name)
+            if position is None:
+                extra = extra or {}
+                extra[name] = value  # Имена не из модели, их отклоняет проверка ноды
+                continue
+            values[position] = value
+        self._metadata = metadata
+        self._values = tuple(values)
+        self._extra = extra
+
+    def replace(self, data: Mapping) -> "NodeValues":
+        return type(self)(self._metadata, {**self, **data})
+
+    def __getitem__(self, name):
+        position = self._metadata.positions.get(name)
+        if position is not None:
+            value = self._values[position]
+            if value is not MISSING:
+                return value
+        elif self._extra is not None and name in self._extra:
+            return self._extra[name]
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        position = self._metadata.positions.get(name)
+        if position is not None:
+            return self._values[position] is not MISSING
+        return self._extra is not None and name in self._extra
+
+    def __iter__(self):
+        for name, value in zip(self._metadata.columns, self._values):
+            if value is not MISSING:
+                yield name
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return len(self._values) - self._values.count(MISSING) + (len(self._extra) if self._extra else 0)
+
+    def __reduce__(self):
+        return _restore_node_values, (self._metadata.model, dict(self),)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def _restore_node_values(model, data: dict) -> NodeValues:
+    return NodeValues(ModelMetadata.of(model), data)
+
+
 class ModelTools(ORMAttributes):
+    __slots__ = ()
+
     def is_autoincrement_primary_key(self, model: Type[CustomModel]) -> bool:
-        self.is_valid_model_instance(model)
-        for column_name, data in model().column_names.items():
+        for column_name, data in ModelMetadata.of(model).column_names.items():
             if data["autoincrement"]:
                 return True
         return False
 
     def get_primary_key_python_type(self, model: Type[CustomModel]) -> Type:
-        self.is_valid_model_instance(model)
-        for column_name, data in model().column_names.items():
-            if data["primary_key"]:
-                return data["type"]
+        metadata = ModelMetadata.of(model)
+        return metadata.column_names[metadata.primary_key]["type"] if metadata.primary_key else None
 
     @staticmethod
     def get_unique_columns(node) -> Iterator[str]:
         """ Получить названия столбцов с UNIQUE=TRUE (их значения присутствуют в ноде) """
         ORMAttributes.is_valid_node(node)
-        model_data = node.model().column_names
+        unique_columns = ModelMetadata.of(node.model).unique_columns
         for column_name in node.value:
-            if model_data[column_name]["unique"]:
+            if column_name in unique_columns:
                 yield column_name
 
     def get_default_column_value_or_function(self, model: Type[CustomModel], column_name: str) -> Optional[Any]:
-        self.is_valid_model_instance(model)
+        metadata = ModelMetadata.of(model)
         if type(column_name) is not str:
             raise TypeError
-        return model().column_names[column_name]["default"]
+        return metadata.column_names[column_name]["default"]
 
     @classmethod
     def get_primary_key_column_name(cls, model: Type[CustomModel]):
-        cls.is_valid_model_instance(model)
-        for column_name, data in model().column_names.items():
-            if data["primary_key"]:
-                return column_name
+        return ModelMetadata.of(model).primary_key
 
     @classmethod
     def get_foreign_key_columns(cls, model: Type[CustomModel]) -> tuple[str]:
-        cls.is_valid_model_instance(model)
-        return model().foreign_keys
+        return ModelMetadata.of(model).foreign_keys
 
     @classmethod
     def _select_primary_key_value_from_scalars(cls, node: "ORMItem", field_name: str) -> Optional[Union[str, int]]:
@@ -139,6 +251,10 @@ class ModelTools(ORMAttributes):
             value = node.value[unique_field]
             if not node.container:
                 return True  # Ожидается, что ленивая ссылка умрёт, если в контейнере оставался 1 элемент
+            if isinstance(node.container, ORMItemQueue):
+                if node.container._nodes_by_value(node.model, unique_field, value):
+                    return False
+                continue
             for n in node.container:
                 if n.model.__name__ == node.model.__name__:
                     if unique_field in n.value:
@@ -149,7 +265,7 @@ class ModelTools(ORMAttributes):
     @staticmethod
     def _check_not_null_fields_in_node_value(node: "ORMItem") -> bool:
         """ Проверить все поля на предмет nullable """
-        model_attributes: dict[dict] = node.model().column_names
+        model_attributes: dict[dict] = ModelMetadata.of(node.model).column_names
         for k, attributes in model_attributes.items():
             if not attributes["nullable"]:
                 if k not in node.value:
@@ -162,7 +278,7 @@ class ModelTools(ORMAttributes):
     def _is_valid_column_type_in_sql_type(node: "ORMItem") -> bool:
         """ Проверить соответствие данных в ноде на предмет типизации.
          Если тип данных отличается от табличного в БД, то возбудить исключение"""
-        data = node.model().column_names
+        data = ModelMetadata.of(node.model).column_names
         for column_name in node.value:
             if column_name not in data:
                 return False
@@ -191,10 +307,14 @@ class ModelTools(ORMAttributes):
 
 class QueueSearchTools:
     """ Инструменты для поиска нод. Поиск идентичных [переданной] нод в указанном контейнере. """
+    __slots__ = ()
+
     @classmethod
     def get_node_by_unique_fields(cls, queue, right_node) -> Optional[Union["SpecialOrmItem", "ORMItem", "ResultORMItem"]]:
         """ Вернуть ноду, у которой максимальное кол-во совпадений по полям с unique=True """
         cls.__is_valid(queue, right_node)
+        if isinstance(queue, ORMItemQueue):
+            return queue._best_match(right_node, ModelMetadata.of(right_node.model).unique_columns, last=True)
         values = []
         nodes = []  # getitem у OrmItemQueue и SpecialORMItemQueue работают по-разному: в первом случае через индекс, а во втором - нет
         for left_node in queue:
@@ -243,6 +363,9 @@ class QueueSearchTools:
 
 class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
     """ Иммутабельный класс ноды для ORMItemQueue. """
+    __slots__ = ("_container", "_metadata", "__dml_type", "__is_ready", "__where", "_create_at",
+                 "__transaction_counter", "__pk_set_by_ui", "__primary_key",)
+
     def __init__(self, _primary_key=None, _container=None, _insert=False, _update=False, _delete=False,
                  _model=None, _where=None, _create_at=None,
                  **kw):
@@ -257,53 +380,41 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
             """
         self._is_valid_container(_container)
         self._container: ReferenceType[Union["ORMItemQueue", "SpecialOrmContainer"]] = ref(_container)
-        self.__model: Union[Type[CustomModel], Type[ModelController]] = _model
-        self.is_valid_model_instance(self.__model)
+        self._metadata = ModelMetadata.of(_model)  # Общие для всех нод модели: столбцы, первичный и внешние ключи
         if _primary_key:
             self.is_valid_primary_key(_primary_key)
-        self.__insert = _insert
-        self.__update = _update
-        self.__delete = _delete
-        self.__is_ready = kw.pop("_ready", True if self.__delete else False)
+        self.__is_ready = kw.pop("_ready", True if _delete else False)
         self.__where = _where
         self._create_at = _create_at
         self.__transaction_counter = kw.pop('_count_retries', 0)  # Инкрементируется при вызове self.make_query()
         # Подразумевая тем самым, что это попытка сделать транзакцию в базу
         if not kw:
             raise NodeEmptyData
-        super().__init__(val=kw)
-        self.__foreign_key_fields = self.get_foreign_key_columns(self.__model)
+        super().__init__(val=NodeValues(self._metadata, kw))
 
         def is_valid_dml_type():
             """ Только одино свойство, обозначающее тип sql-dml операции, может быть True """
-            if not isinstance(self.__insert, bool) or not isinstance(self.__update, bool) or \
-                    not isinstance(self.__delete, bool):
+            if not isinstance(_insert, bool) or not isinstance(_update, bool) or not isinstance(_delete, bool):
                 raise TypeError
-            if sum((self.__insert, self.__update, self.__delete,)) != 1:
+            if sum((_insert, _update, _delete,)) != 1:
                 raise NodeDMLTypeError
         is_valid_dml_type()
+        self.__dml_type = "_insert" if _insert else "_update" if _update else "_delete"
         self._field_names_validation()
-        self.__pk_set_by_ui = False
-        if _primary_key:
-            self.__pk_set_by_ui = True
-        self.__primary_key = self.__create_primary_key() if not _primary_key else _primary_key
-        self._val.update(self.__primary_key)
+        self.__pk_set_by_ui = bool(_primary_key)
+        primary_key = self.__create_primary_key() if not _primary_key else _primary_key
+        self.__primary_key: str = next(iter(primary_key))  # Имя столбца, значение хранится в self._val
+        self._val = self._val.replace(primary_key)
         _ = self.ready
-        self.__relative_primary_key = False
-
-        def check_current_primary_key_is_relative():
-            """ Является ли первичный ключ относительным.
-            Под этим понимается то, что при последующих репликациях во время
-            enqueue значение первичного ключа является автоинкрементом или неким вычисляемым значением по умолчанию,
-            предугадать которое не представляется возможным,- такой первичный ключ мы будем называть относительным."""
-            if not self.__pk_set_by_ui:
-                self.__relative_primary_key = True
-        check_current_primary_key_is_relative()
 
     @property
     def is_relative_primary_key(self):
-        """ Был ли первичный ключ задан явно или сгенерирован в орм """
-        return self.__relative_primary_key
+        """ Является ли первичный ключ относительным.
+        Под этим понимается то, что при последующих репликациях во время
+        enqueue значение первичного ключа является автоинкрементом или неким вычисляемым значением по умолчанию,
+        предугадать которое не представляется возможным,- такой первичный ключ мы будем называть относительным.
+        Относителен ключ, который не был задан явно, а сгенерирован в орм """
+        return not self.__pk_set_by_ui
 
     @property
     def container(self) -> "ORMItemQueue":
@@ -317,7 +428,7 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
 
     @property
     def model(self):
-        return self.__model
+        return self._metadata.model
 
     @property
     def retries(self):
@@ -326,12 +437,7 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
     @property
     def foreign_key_fields(self) -> Iterator[dict[str, str]]:
         """ Название таблицы и название поля PK у той таблицы, на которую ссылается ЭТА нода """
-        def parse_foreign_key_table_name_and_column_name():
-            for obj_ in self.__foreign_key_fields:
-                string: str = obj_.column.__str__()
-                table, column = string.split(".")
-                yield {"table_name": table, "column_name": column}
-        return parse_foreign_key_table_name_and_column_name()
+        return ({"table_name": table, "column_name": column} for _, table, column in self._metadata.references)
 
     def get(self, k, default_value=None):
         try:
@@ -346,11 +452,12 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
         :param only_key: только название столбца - PK
         :param only_value: только значение столбца первичного ключа
         """
+        name = self.__primary_key
         if only_key:
-            return tuple(self.__primary_key.keys())[0]
+            return name
         if only_value:
-            return tuple(self.__primary_key.values())[0]
-        return tuple(self.__primary_key.items())[0] if as_tuple else self.__primary_key
+            return self._val[name]
+        return (name, self._val[name],) if as_tuple else {name: self._val[name]}
 
     @property
     def created_at(self):
@@ -364,7 +471,7 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
     def ready(self) -> bool:
         self.__is_ready = self._is_valid_column_type_in_sql_type(self)
         self.__is_ready = self._check_unique_values(self) if self.__is_ready else False
-        if self.__insert:
+        if self.__dml_type == "_insert":
             self.__is_ready = self._check_not_null_fields_in_node_value(self) if self.__is_ready else False
         return self.__is_ready
 
@@ -376,7 +483,7 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
 
     @property
     def type(self) -> str:
-        return "_insert" if self.__insert else "_update" if self.__update else "_delete"
+        return self.__dml_type
 
     def get_attributes(self, with_update: Optional[dict] = None, new_container: Optional["ORMItemQueue"] = None) -> dict:
         if with_update is not None and type(with_update) is not dict:
@@ -387,10 +494,10 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
                     raise TypeError
         result = {"_create_at": self.created_at}
         result.update(self.value)
-        if self.__update or self.__delete:
+        if self.__dml_type != "_insert":
             if self.__where:
                 result.update({"_where": self.where})
-        result.update({"_model": self.__model, "_insert": False,
+        result.update({"_model": self.model, "_insert": False,
                        "_update": False, "_ready": self.__is_ready,
                        "_delete": False, "_count_retries": self.retries})
         result.update({"_container": self.container}) if self.container is not None else None
@@ -399,12 +506,12 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
         if new_container is not None:
             result.update({"_container": new_container})
         if self.__pk_set_by_ui:
-            result.update({"_primary_key": self.__primary_key})
+            result.update({"_primary_key": self.get_primary_key_and_value()})
         return result
 
     def make_query(self) -> Optional[Query]:
         query = None
-        value: dict = self.value
+        value: dict = dict(self.value)  # Изменяется ниже
         primary_key = self.get_primary_key_and_value(only_key=True)
         where = self.__where
         if self.is_relative_primary_key:
@@ -412,14 +519,14 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
             where = value if not where else where
         else:
             where = where if where else self.get_primary_key_and_value()
-        if self.__insert:
+        if self.__dml_type == "_insert":
             query = insert(self.model).values(**value)
-        if self.__update or self.__delete:
+        if self.__dml_type != "_insert":
             query = ORMHelper.database.query(self.model).filter_by(**where).first()
             if query is not None:
-                if self.__update:
+                if self.__dml_type == "_update":
                     [setattr(query, key, value) for key, value in value.items()]
-                if self.__delete:
+                if self.__dml_type == "_delete":
                     query = delete(self.model).where(text(
                         ", ".join(map(lambda x: f"{self.model.__tablename__}.{x[0]}='{x[1]}'", value.items()))
                     ))
@@ -440,9 +547,9 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
         if ":" not in item:
             raise KeyError("Требуется формат 'key:value'")
         key, value = item.split(":")
-        if key not in self.value:
+        if key not in self._val:
             return False
-        val = self.value[key]
+        val = self._val[key]
         return value == val
 
     def __bool__(self):
@@ -455,18 +562,17 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
         return str(self.value)
 
     def __hash__(self):
-        value = self.value
-        if self.is_relative_primary_key:
-            del value[self.get_primary_key_and_value(only_key=True)]
-        str_ = "".join(map(lambda x: str(x), itertools.chain(*value.items())))
+        excluded = self.get_primary_key_and_value(only_key=True) if self.is_relative_primary_key else None
+        str_ = "".join(map(lambda x: str(x), itertools.chain(*(item for item in self._val.items()
+                                                                 if item[0] != excluded))))
         return int.from_bytes(hashlib.md5(str_.encode("utf-8")).digest(), "big")
 
     def __getitem__(self, item: str):
         if type(item) is not str:
             raise TypeError
-        if item not in self.value:
+        if item not in self._val:
             raise KeyError
-        return self.value[item]
+        return self._val[item]
 
     def _field_names_validation(self, from_polymorphizm=False) -> Optional[set[str]]:
         """ соотнести все столбцы ноды в словаре value со столбцами из класса Model """
@@ -477,7 +583,7 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
         for name in clear_names():
             if not isinstance(self.value[name], (str, int, bool, float, bytes, bytearray, type(None),)):
                 raise NodeColumnValueError(self.value[name])
-        field_names = self.model().column_names
+        field_names = self._metadata.column_names
         any_ = set(clear_names()) - set(field_names)
         if any_:
             if from_polymorphizm:
@@ -495,7 +601,7 @@ class ORMItem(LinkedListItem, ModelTools, QueueSearchTools, NodeTools):
         value = self._select_primary_key_value_from_scalars(self, name)
         if value:
             return {name: value}
-        if not self.__insert:
+        if self.__dml_type != "_insert":
             node = self.get_node_by_unique_fields(self.container, self)
             if node is not None:
                 return node.get_primary_key_and_value()
@@ -527,6 +633,8 @@ class EmptyOrmItem(LinkedListItem):
     """
     Пустой класс для возврата пустой "ноды". Заглушка
     """
+    __slots__ = ()
+
     def __eq__(self, other):
         if type(other) is type(self):
             return True
@@ -549,11 +657,13 @@ class EmptyOrmItem(LinkedListItem):
 
 
 class ResultORMItem(LinkedListItem, ORMAttributes, NodeTools):
+    __slots__ = ("_primary_key", "_model", "_hidden",)
+
     def __init__(self, _model, _primary_key: Optional[dict], _ui_hidden=False, **k):
         self._primary_key = _primary_key
         self._model = _model
         self._hidden = _ui_hidden
-        super().__init__(val=self.__clean_kwargs(k))
+        super().__init__(val=NodeValues(ModelMetadata.of(_model), self.__clean_kwargs(k)))
         self.__is_valid()
 
     def get_primary_key_and_value(self):
@@ -579,8 +689,7 @@ class ResultORMItem(LinkedListItem, ORMAttributes, NodeTools):
         return self.value.__getitem__(key)
 
     def __hash__(self):
-        data = self.value
-        data.update(self.get_primary_key_and_value())
+        data = {**self.value, **self._primary_key}
         str_ = "".join(map(lambda x: str(x), itertools.chain(*data.items())))
         return int.from_bytes(hashlib.md5(str_.encode("utf-8")).digest(), "big")
 
@@ -591,7 +700,7 @@ class ResultORMItem(LinkedListItem, ORMAttributes, NodeTools):
     def __is_valid(self):
         if type(self._hidden) is not bool:
             raise TypeError
-        if type(self._val) is not dict:
+        if type(self._val) is not NodeValues:
             raise TypeError
         self.is_valid_model_instance(self._model)
         if not self.value:
@@ -599,6 +708,18 @@ class ResultORMItem(LinkedListItem, ORMAttributes, NodeTools):
         self.is_valid_primary_key(self._primary_key)
 
 
+class IndexedNodes(list):
+    """
+    Ноды одного ключа индекса ORMItemQueue в порядке очереди.
+    keys - параллельный список ключей нод: по нему работает bisect (как LinkedList._position), key= не нужен
+    """
+    __slots__ = ("keys",)
+
+    def __init__(self):
+        super().__init__()
+        self.keys: list[int] = []
+
+
 class ORMItemQueue(LinkedList, QueueSearchTools):
     """
     Очередь на основе связанного списка.
@@ -609,6 +730,12 @@ class ORMItemQueue(LinkedList, QueueSearchTools):
     LinkedListItem = ORMItem
 
     def __init__(self, items: Optional[Iterable[dict]] = None):
+        self._primary_keys: dict[tuple, IndexedNodes] = {}  # (таблица, столбец PK, значение): ноды в порядке очереди
+        self._values: dict[tuple, IndexedNodes] = {}  # (имя модели, столбец, значение): ноды в порядке очереди
+        self._references: dict[tuple, IndexedNodes] = {}  # (таблица, столбец, значение): ноды со ссылкой (FK) на них
+        self._changes: Optional[dict[int, Optional[ORMItem]]] = None  # Ключ ноды: нода или None, если удалена.
+        # Ведётся у очереди, загруженной из кеша, - в него записываются только изменённые ноды (см. ORMItemQueueCache)
+        self._cache_version: Optional[str] = None  # Версия очереди в кеше, из которой загружена эта (см. ORMItemQueueCache)
         super().__init__(items)
         if items is not None:
             for inner in items:
@@ -618,29 +745,28 @@ class ORMItemQueue(LinkedList, QueueSearchTools):
         """ Установка ноды в конец очереди с хитрой логикой проверки на совпадение. """
         exists_item, new_item = self._replication(**attrs)
 
-        def check_foreign_key_nodes() -> ORMItemQueue:  # O(n) * (O(k) + O(i) + O(i)) -> O(n) * O(j) -> O(n)
+        def check_foreign_key_nodes(node: ORMItem, moved: set):  # O(степень связности)
             """
             Найти ноды, которые зависят от ноды, которая в настоящий момент добавляется:
             Если такие ноды найдутся, то они будут удалены и добавлены в очередь снова
-            (перемена мест)
+            (перемена мест), следом - зависящие от них
             """
-            nodes_to_move_in_end_queue = self.__class__()
-            new_item_primary_key_name = new_item.get_primary_key_and_value(only_key=True)
-            for left_node in self:  # O(n)
-                if new_item_primary_key_name in left_node.foreign_key_fields:  # O(k)
-                    nodes_to_move_in_end_queue.enqueue(**left_node.get_attributes())  # O(i)
-            new_container = self
-            if nodes_to_move_in_end_queue:
-                new_container = self + nodes_to_move_in_end_queue  # O(i)
-            return new_container
+            for left_node in tuple(self._referencing_nodes(node)):
+                primary_key = (left_node.model.__tablename__, *left_node.get_primary_key_and_value(as_tuple=True),)
+                if primary_key in moved:
+                    continue
+                moved.add(primary_key)
+                self._remove_from_queue(left_node)
+                self.append(**left_node.get_attributes())
+                check_foreign_key_nodes(self.tail, moved)
         self._remove_from_queue(exists_item) if exists_item else None
         self.append(**new_item.get_attributes())
-        new_nodes = check_foreign_key_nodes()
-        self._replace_inner(new_nodes.head, new_nodes.tail)
+        check_foreign_key_nodes(self.tail, {(self.tail.model.__tablename__,
+                                             *self.tail.get_primary_key_and_value(as_tuple=True),)})
 
     def dequeue(self) -> Optional[ORMItem]:
         """ Извлечение ноды с начала очереди """
-        left_node = self._head
+        left_node = self.head
         if left_node is None:
             return
         self._remove_from_queue(left_node)
@@ -658,30 +784,24 @@ class ORMItemQueue(LinkedList, QueueSearchTools):
         super().order_by(model, by_column_name, by_primary_key, by_create_time, decr)
 
     def get_related_nodes(self, main_node: ORMItem, other_container=None) -> "ORMItemQueue":
-        """ Получить все связанные (внешним ключом) с передаваемой нодой ноды.
-        O(i) * O(1) + O(n) = O(n)"""
-        def get_column_name(data: dict, value) -> Optional[str]:
-            """ Обойти все поля, и, если значение поля совпадает с value, то вернём это название """
-            for name, val in data.items():
-                if val == value:
-                    return name
+        """ Получить все связанные (внешним ключом) с передаваемой нодой ноды - те, на которые она ссылается.
+        O(i), где i - количество внешних ключей модели """
         root = self
         if other_container is not None:
             if type(other_container) is not self.__class__:
                 raise TypeError
             root = other_container
         container = self.__class__()
-        for related_node in root:  # O(n) * O(j) * O(m) * O(n) * O(1) = O(n)
-            if not related_node == main_node:  # O(g) * O(j) = O (j)
-                for fk_field_data in main_node.foreign_key_fields:  # O(i)
-                    table_name, column_name = fk_field_data["table_name"], fk_field_data["column_name"]
-                    if table_name == related_node.model.__tablename__:
-                        pk_field, pk_value = related_node.get_primary_key_and_value(as_tuple=True)
-                        if pk_field == column_name:
-                            main_node_fk_column_name = get_column_name(main_node.value, pk_value)
-                            if main_node_fk_column_name is not None:
-                                if main_node.value[main_node_fk_column_name] == related_node.value[column_name]:
-                                    container.append(**related_node.get_attributes())  # O(1)
+        for column_name, table_name, referenced_column_name in main_node._metadata.references:  # O(i)
+            if column_name not in main_node.value:
+                continue
+            try:
+                nodes = root._primary_keys.get((table_name, referenced_column_name, main_node.value[column_name],), ())
+            except TypeError:
+                continue
+            for related_node in nodes:  # O(1)
+                if not related_node == main_node:
+                    container.append(**related_node.get_attributes())
         return container
 
     def search_nodes(self, model: Type[CustomModel], negative_selection=False,
@@ -733,15 +853,104 @@ class ORMItemQueue(LinkedList, QueueSearchTools):
         ORMItem.is_valid_model_instance(model)
         if len(primary_key_data) != 1:
             raise NodePrimaryKeyError
-        nodes = iter(self)
-        while nodes:
-            try:
-                left_node: Optional[ORMItem] = next(nodes)
-            except StopIteration:
-                break
-            if left_node.model.__name__ == model.__name__:  # O(k) * O(x)
-                if left_node.get_primary_key_and_value() == primary_key_data:  # O(k1) * O(x1) * # O(k2) * O(x2)
-                    return left_node
+        nodes = self._primary_keys.get((model.__tablename__, *next(iter(primary_key_data.items())),))  # O(1)
+        return nodes[0] if nodes else None
+
+    def _nodes_by_value(self, model: Type[CustomModel], column_name: str, value) -> list[ORMItem]:
+        """ Ноды модели со значением value в столбце column_name, в порядке очереди. Список не изменять! """
+        try:
+            return self._values.get((model.__name__, column_name, value,), [])  # O(1)
+        except TypeError:  # Нехешируемое значение в индекс не попадает
+            return [node for node in self
+                    if node.model.__name__ == model.__name__ and node.value.get(column_name, MISSING) == value]
+
+    def _referencing_nodes(self, node: ORMItem) -> list[ORMItem]:
+        """ Ноды, которые ссылаются внешним ключом на node, в порядке очереди. Список не изменять! """
+        return self._references.get((node.model.__tablename__, *node.get_primary_key_and_value(as_tuple=True),), [])
+
+    def _best_match(self, node: ORMItem, column_names: Iterable[str], last=False) -> Optional[ORMItem]:
+        """
+        Нода той же модели с наибольшим количеством совпадений значений по столбцам column_names.
+        Просматриваются только ноды с совпадениями (из индекса), а не вся очередь.
+        :param last: из нод с одинаковым количеством совпадений выбрать последнюю в очереди, иначе - первую
+        """
+        counter = {}
+        values = node.value
+        for column_name in column_names:
+            if column_name not in values:
+                continue
+            for left_node in self._nodes_by_value(node.model, column_name, values[column_name]):
+                counter.setdefault(id(left_node), [left_node, 0])[1] += 1
+        if not counter:
+            return
+        left_node, _ = max(counter.values(), key=lambda item: (item[1], item[0]._key if last else -item[0]._key,))
+        return left_node
+
+    def _on_insert(self, node: ORMItem):
+        if self._changes is not None:
+            self._changes[node._key] = node
+        values = node.value
+        self.__index(self._primary_keys,
+                     (node.model.__tablename__, *node.get_primary_key_and_value(as_tuple=True),), node)
+        for column_name, value in values.items():
+            self.__index(self._values, (node.model.__name__, column_name, value,), node)
+        for column_name, table_name, referenced_column_name in node._metadata.references:
+            if values.get(column_name) is not None:
+                self.__index(self._references, (table_name, referenced_column_name, values[column_name],), node)
+
+    def _on_remove(self, node: ORMItem):
+        if self._changes is not None:
+            self._changes[node._key] = None
+        values = node.value
+        self.__unindex(self._primary_keys,
+                       (node.model.__tablename__, *node.get_primary_key_and_value(as_tuple=True),), node)
+        for column_name, value in values.items():
+            self.__unindex(self._values, (node.model.__name__, column_name, value,), node)
+        for column_name, table_name, referenced_column_name in node._metadata.references:
+            if values.get(column_name) is not None:
+                self.__unindex(self._references, (table_name, referenced_column_name, values[column_name],), node)
+
+    @staticmethod
+    def __index(index: dict, index_key: tuple, node: ORMItem):
+        """ Добавить ноду в список index[index_key], упорядоченный по ключу ноды (порядку в очереди) """
+        try:
+            nodes = index.get(index_key)
+            if nodes is None:
+                nodes = index[index_key] = IndexedNodes()
+        except TypeError:
+            return
+        if not nodes or nodes.keys[-1] < node._key:
+            nodes.append(node)
+            nodes.keys.append(node._key)
+        else:
+            position = bisect_left(nodes.keys, node._key)
+            nodes.insert(position, node)
+            nodes.keys.insert(position, node._key)
+
+    @staticmethod
+    def __unindex(index: dict, index_key: tuple, node: ORMItem):
+        try:
+            nodes = index.get(index_key)
+        except TypeError:
+            return
+        if not nodes:
+            return
+        position = bisect_left(nodes.keys, node._key)
+        if position < len(nodes) and nodes[position] is node:
+            del nodes[position], nodes.keys[position]
+        if not nodes:
+            del index[index_key]
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state["_primary_keys"], state["_values"], state["_references"]  # Восстанавливаются при загрузке нод
+        state["_changes"], state["_cache_version"] = None, None
+        return state
+
+    def __setstate__(self, state):
+        self._primary_keys, self._values, self._references, self._changes = {}, {}, {}, None
+        self._cache_version = None
+        super().__setstate__(state)
 
     def __repr__(self):
         return f"{self.__class__.__name__}({tuple(repr(m) for m in self)})"
@@ -769,8 +978,6 @@ class ORMItemQueue(LinkedList, QueueSearchTools):
         if not isinstance(other, type(self)):
             raise TypeError
         result: ORMItemQueue = self + other
-        self._head = result.head
-        self._tail = result.tail
         return result
 
     def __sub__(self, other: "ORMItemQueue"):
@@ -825,9 +1032,8 @@ class ORMItemQueue(LinkedList, QueueSearchTools):
             old_where, new_where = old_node.where, new_node.where
             old_where.update(new_where)
             new_node_data.update({"_where": old_where})
-            old_value, new_value = old_node.value, new_node.value
-            old_value.update(new_value)
-            new_node_data.update(old_value)
+            new_node_data.update(old_node.value)
+            new_node_data.update(new_node.value)
             new_node_data.update({"_insert": False, "_update": False, "_delete": False})
             new_node_data.update({dml_type: True, "_ready": new_node.ready})
             new_node_data.update({"_container": self})
@@ -848,36 +1054,11 @@ class ORMItemQueue(LinkedList, QueueSearchTools):
                 return new_node
             return new_node.__class__(**{new_node.get_attributes()}, _primary_key=old_node.get_primary_key_and_value())
 
-        def collect_values(n: ORMItem, *fields):
-            """ Получить словарь вида {field: value} из ноды, по тем полям, что переданы в fields """
-            d = {}
-            for field in fields:
-                if field in n.value:
-                    d.update({field: n.value[field]})
-            return d
-
-        def counter_(nodes: ORMItemQueue, new_node: ORMItem, collected_values: dict) -> Iterator:
-            """ Посчитать макс количество совпадений данных ноды с переданным словарём collected_values """
-            for node in nodes:
-                if not node.model.__name__ == new_node.model.__name__:
-                    continue
-                i = 0
-                for key, value in collected_values.items():
-                    if key in node.value:
-                        if value == node.value[key]:
-                            i += 1
-                if i:
-                    yield node, i
-
         def find_node_to_replace_by_any_field():
             """ Последняя попытка отыскать ноду:
              из всех переданных в enqueue данных выделить максимальное количество совпадений
              с одной из нод в очереди"""
-            all_fields_in_new_node = potential_new_item.value.keys()
-            values = collect_values(potential_new_item, *all_fields_in_new_node)
-            ordered_items = sorted(counter_(self, potential_new_item, values), key=lambda i: i[1], reverse=True)
-            if ordered_items:
-                return ordered_items[0][0]
+            return self._best_match(potential_new_item, potential_new_item.value)
         exists_item = self.get_node(potential_new_item.model, **potential_new_item.get_primary_key_and_value())  # O(n)
         if exists_item is not None and exists_item.is_relative_primary_key:
             exists_item = None
@@ -1396,9 +1577,9 @@ class SQLAlchemyQueryManager:
         def make_sort_container(n: ORMItem, linked_nodes: ORMItemQueue, has_related_nodes):
             """
             Рекурсивно искать ноды с внешними ключами
-            O(m) * (O(n) + O(j)) = O(n) * O(m) = O(n)
+            O(m) * O(i), где m - длина цепочки связей, i - количество внешних ключей
             """
-            related_nodes = self._node_items.get_related_nodes(n)  # O(n)
+            related_nodes = self._node_items.get_related_nodes(n)  # O(i)
             linked_nodes.add_to_head(**n.get_attributes())
             if not related_nodes:
                 if has_related_nodes:
@@ -1430,6 +1611,8 @@ class SQLAlchemyQueryManager:
 
 
 class SpecialOrmItem(ORMItem):
+    __slots__ = ()
+
     def get(self, name, default_val=None):
         try:
             result = self.__getitem__(name)
@@ -1443,7 +1626,7 @@ class SpecialOrmItem(ORMItem):
         return int.from_bytes(hashlib.md5(str_.encode("utf-8")).digest(), "big")
 
     def _field_names_validation(self):
-        column_names = set(self.model().column_names)
+        column_names = set(self._metadata.column_names)
         loss_fields = super()._field_names_validation(from_polymorphizm=True)
         while loss_fields and column_names:
             field = loss_fields.pop()
@@ -1764,7 +1947,7 @@ class JoinSelectResult(OrderByJoinResultMixin, BaseResult, ModelTools):
         for group_result in items:
             result = []
             for node in group_result:
-                values = node.value
+                values = dict(node.value)  # Изменяется ниже
                 for n in merged_columns:
                     if n in values:
                         old_val = values[n]
@@ -1774,6 +1957,196 @@ class JoinSelectResult(OrderByJoinResultMixin, BaseResult, ModelTools):
             yield result
 
 
+class ORMItemQueueCache:
+    """
+    Хранение очереди ORMItemQueue в memcached по частям, чтобы изменение записывало только затронутые ноды:
+        'ORMItems' - заголовок: {"generation": поколение ключей, "version": версия очереди,
+                                 "segments": число сегментов журнала, "operations": операций в журнале, "size": нод}
+        'ORMItems:<поколение>:journal:<i>' - сегмент журнала: [(ключ ноды, есть ли нода), ...],
+                                             не больше JOURNAL_SEGMENT_SIZE
+        'ORMItems:<поколение>:<ключ ноды>' - нода (без ссылки на контейнер)
+        'ORMItems:state' - {"generation": поколение, "segments": число сегментов журнала}, для удаления истёкшей очереди
+    Порядок нод в очереди - порядок их ключей (см. LinkedList), поэтому журнал хранит только ключи.
+    Когда операций в журнале становится много больше, чем нод, очередь переписывается в новом поколении ключей.
+    Срок жизни (lifetime) задаётся только заголовку, ноды и журнал хранятся бессрочно:
+    запись изменений продлевает очередь одним заголовком. Ноды и журнал поколения, заголовок которого истёк,
+    удаляются при следующей загрузке.
+    Версия в заголовке меняется при каждой записи. Рабочая копия (edit) используется, пока версия очереди в кеше
+    совпадает с её версией, - изменение нод стоит нескольких обращений к кешу, независимо от длины очереди.
+    Если нод в кеше меньше, чем в заголовке (часть вытеснена), загруженная очередь записывается целиком.
+    Использование:
+        queue_cache = ORMItemQueueCache(client)
+        items = queue_cache.edit()
+        items.enqueue(...)
+        queue_cache.save(items)  # Записываются изменённые ноды, последний сегмент журнала и заголовок
+    """
+    KEY = "ORMItems"
+    JOURNAL_SEGMENT_SIZE = 256
+
+    def __init__(self, client: Union[Client, MockMemcacheClient], lifetime: int = 0):
+        self.client = client
+        self.lifetime = lifetime
+        self._queue: Optional[ORMItemQueue] = None  # Рабочая копия - очередь в том виде, в каком записана в кеш
+
+    def load(self) -> ORMItemQueue:
+        """ Прочитать очередь целиком """
+        queue = ORMItemQueue()
+        header = self.client.get(self.KEY)
+        if header is None:
+            self._collect()
+        else:
+            keys = self._replay(header)
+            stored = self.client.get_many([self._node_key(header, key) for key in keys])
+            nodes, node_keys = [], []
+            for key in keys:
+                data = stored.get(self._node_key(header, key))
+                if data is None:
+                    continue  # Вытеснена из кеша
+                nodes.append(self._load_node(queue, data))
+                node_keys.append(key)
+            queue._restore(nodes, node_keys)
+            if len(nodes) != header["size"]:
+                if self._is_actual(self._queue, header):
+                    warnings.warn(f"Кеш очереди повреждён: загружено нод - {len(nodes)} из {header['size']}. "
+                                  f"Очередь восстановлена из рабочей копии")
+                    self._rewrite(self._queue)
+                    return self.load()
+                warnings.warn(f"Кеш очереди повреждён: загружено нод - {len(nodes)} из {header['size']}. "
+                              f"При следующей записи очередь будет переписана из оставшихся нод")
+                return queue  # _changes = None - очередь записывается целиком
+            queue._cache_version = header["version"]
+        queue._changes = {}
+        return queue
+
+    def edit(self) -> ORMItemQueue:
+        """
+        Очередь для изменения и записи методом save.
+        Если очередь в кеше не менялась с последней записи, возвращается рабочая копия (1 обращение к кешу)
+        """
+        if self._queue is not None and self._is_actual(self._queue, self.client.get(self.KEY)):
+            return self._queue
+        self._queue = self.load()
+        return self._queue
+
+    def save(self, queue: Optional[ORMItemQueue]):
+        """ Записать изменения очереди, загруженной методами load или edit. Другая очередь записывается целиком """
+        if queue is None:
+            return self.clear()
+        if queue._changes is None:
+            return self._rewrite(queue)
+        if not queue._changes:
+            return
+        header = self.client.get(self.KEY)
+        if header is None or header["version"] != queue._cache_version:  # Очередь в кеше истекла или изменена
+            return self._rewrite(queue)
+        operations = [(key, node is not None,) for key, node in queue._changes.items()]
+        first_segment = max(header["segments"] - 1, 0)  # Последний сегмент дописывается
+        if header["segments"]:
+            operations = (self.client.get(self._journal_key(header, first_segment)) or []) + operations
+        segments = [operations[start:start + self.JOURNAL_SEGMENT_SIZE]
+                    for start in range(0, len(operations), self.JOURNAL_SEGMENT_SIZE)]
+        new_header = {**header, "version": self._new_version(), "segments": first_segment + len(segments),
+                      "operations": header["operations"] + len(queue._changes), "size": len(queue)}
+        if new_header["operations"] > 2 * new_header["size"] + self.JOURNAL_SEGMENT_SIZE:
+            return self._rewrite(queue)
+        data = {self._node_key(header, key): self._dump_node(node)
+                for key, node in queue._changes.items() if node is not None}
+        data.update({self._journal_key(header, first_segment + index): segment
+                     for index, segment in enumerate(segments)})
+        if new_header["segments"] != header["segments"]:
+            data[self._state_key()] = {"generation": header["generation"], "segments": new_header["segments"]}
+        self.client.set_many(data, 0)
+        self.client.set(self.KEY, new_header, self.lifetime)
+        removed = [self._node_key(header, key) for key, node in queue._changes.items() if node is None]
+        if removed:
+            self.client.delete_many(removed)
+        self._saved(queue, new_header)
+
+    def clear(self):
+        header = self.client.get(self.KEY)
+        self._queue = None
+        if header is None:
+            return self._collect()
+        self.client.delete_many([*self._generation_keys(header), self.KEY, self._state_key()])
+
+    def _rewrite(self, queue: ORMItemQueue):
+        """ Записать очередь целиком в новом поколении ключей (журнал - только из существующих нод), прежнее удалить """
+        previous = self.client.get(self.KEY) or self.client.get(self._state_key())
+        keys = [node._key for node in queue]
+        segments = [[(key, True,) for key in keys[start:start + self.JOURNAL_SEGMENT_SIZE]]
+                    for start in range(0, len(keys), self.JOURNAL_SEGMENT_SIZE)]
+        header = {"generation": self._new_version(), "version": self._new_version(),
+                  "segments": len(segments), "operations": len(keys), "size": len(keys)}
+        data = {self._node_key(header, node._key): self._dump_node(node) for node in queue}
+        data.update({self._journal_key(header, index): segment for index, segment in enumerate(segments)})
+        self.client.set_many(data, 0)
+        self.client.set(self.KEY, header, self.lifetime)
+        self.client.set(self._state_key(), {"generation": header["generation"], "segments": len(segments)}, 0)
+        if previous is not None:
+            self.client.delete_many(self._generation_keys(previous))
+        self._saved(queue, header)
+
+    def _saved(self, queue: ORMItemQueue, header: dict):
+        """ Очередь совпадает с записанной в кеш - она становится рабочей копией """
+        queue._changes, queue._cache_version = {}, header["version"]
+        self._queue = queue
+
+    def _collect(self):
+        """ Удалить ноды и журнал очереди, заголовок которой истёк """
+        state = self.client.get(self._state_key())
+        if state is None or self.client.get(self.KEY) is not None:  # Очередь только что записана заново
+            return
+        self.client.delete_many([*self._generation_keys(state), self._state_key()])
+
+    def _generation_keys(self, header: dict) -> list[str]:
+        """ Ключи нод и сегментов журнала поколения header["generation"] """
+        return [*(self._node_key(header, key) for key in self._replay(header)),
+                *(self._journal_key(header, index) for index in range(header["segments"]))]
+
+    def _replay(self, header: dict) -> list[int]:
+        """ Ключи существующих нод по журналу, в порядке очереди """
+        journal_keys = [self._journal_key(header, index) for index in range(header["segments"])]
+        segments = self.client.get_many(journal_keys)
+        keys = set()
+        for journal_key in journal_keys:
+            for key, exists in segments.get(journal_key, ()):
+                keys.add(key) if exists else keys.discard(key)
+        return sorted(keys)
+
+    @staticmethod
+    def _is_actual(queue: Optional[ORMItemQueue], header: Optional[dict]) -> bool:
+        """ Очередь без незаписанных изменений и совпадает с очередью в кеше """
+        return queue is not None and header is not None and queue._changes == {} and \
+            queue._cache_version == header["version"]
+
+    @staticmethod
+    def _new_version() -> str:
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def _dump_node(node: ORMItem) -> tuple:
+        attributes, slots = node.__getstate__()
+        slots.pop("_container", None)  # Восстанавливается при загрузке: контейнер - загружаемая очередь
+        return type(node), (attributes, slots,)
+
+    @staticmethod
+    def _load_node(queue: ORMItemQueue, data: tuple) -> ORMItem:
+        class_, state = data
+        node = class_.__new__(class_)
+        node.__setstate__(state)
+        node._container = ref(queue)
+        return node
+
+    def _node_key(self, header: dict, key: int) -> str:
+        return f"{self.KEY}:{header['generation']}:{key}"
+
+    def _journal_key(self, header: dict, index: int) -> str:
+        return f"{self.KEY}:{header['generation']}:journal:{index}"
+
+    def _state_key(self) -> str:
+        return f"{self.KEY}:state"
+
+
 class ORMHelper(ORMAttributes):
     """
     Адаптер для ORMItemQueue
@@ -1786,6 +2159,8 @@ class ORMHelper(ORMAttributes):
         LinkToObj.set_model(CustomModel)
     3) Использование
         LinkToObj.set_item(name, data, **kwargs) - Установка в очередь, обнуление таймера
+        LinkToObj.set_items(items) - Установка в очередь нескольких нод за одно обращение к кешу
+        with LinkToObj.batch(): ... - то же для произвольных вызовов set_item, remove_items и др. внутри блока
         LinkToObj.get_item(name, **kwargs) - получение данных из бд и из ноды
         LinkToObj.get_items(model=None) - получение данных из бд и из ноды
         LinkToObj.release() - высвобождение очереди с попыткой сохранить объекты в базе данных
@@ -1803,6 +2178,8 @@ class ORMHelper(ORMAttributes):
     _database_session = None
     _timer: Optional[threading.Timer] = None
     _model_obj: Optional[Type[CustomModel]] = None  # Текущий класс модели, присваиваемый автоматически всем экземплярам при добавлении в очередь
+    _batch: Optional[ORMItemQueue] = None  # Очередь в памяти на время блока batch, в кеш пишется при выходе из него
+    _items_cache: Optional[ORMItemQueueCache] = None  # Хранит рабочую копию очереди между изменениями
     _was_initialized = False
 
     @classmethod
@@ -1851,29 +2228,61 @@ class ORMHelper(ORMAttributes):
     @property
     def items(cls) -> ORMItemQueue:
         """ Вернуть локальные элементы """
-        return cls.cache.get("ORMItems") or ORMItemQueue()
+        if cls._batch is not None:
+            return cls._batch
+        return cls._get_items_cache().load()
 
     @classmethod
     def set_item(cls, _model=None, _insert=False, _update=False,
                  _delete=False, _ready=False, _where=None, **value):
         def detect_primary_key():
-            pk = None
-            for column_name, attrs_dict in model().column_names.items():
-                if attrs_dict["primary_key"]:
-                    pk = column_name
-                    break
+            pk = ModelMetadata.of(model).primary_key
             if pk in value:
                 return {pk: value[pk]}
         model = _model or cls._model_obj
         cls.is_valid_model_instance(model)
-        items = cls.items
+        items = cls._edit_items()
         items.enqueue(_model=model, _ready=_ready,
                       _insert=_insert, _update=_update,
                       _delete=_delete, _where=_where, _create_at=datetime.datetime.now(), _container=items,
                       _primary_key=detect_primary_key(), **value)
         cls.__set_cache(items)
-        cls._timer = None
-        cls._timer = cls._init_timer()
+        cls._reset_timer()
+
+    @classmethod
+    def set_items(cls, items: Iterable[dict], _model=None):
+        """
+        Установить в очередь несколько нод: очередь читается из кеша и записывается в него один раз,
+        таймер обнуляется один раз
+        :param items: словари с аргументами для set_item
+        :param _model: модель для словарей, в которых _model не указан
+        """
+        with cls.batch():
+            for item in items:
+                cls.set_item(**{"_model": _model, **item})
+
+    @classmethod
+    @contextmanager
+    def batch(cls):
+        """
+        Внутри блока все изменения очереди (set_item, remove_items, remove_field_from_node) выполняются
+        над одной очередью в памяти. При выходе из блока она записывается в кеш, таймер обнуляется.
+            with ORMHelper.batch():
+                for row in rows:
+                    ORMHelper.set_item(_insert=True, **row)
+        """
+        if cls._batch is not None:  # Вложенный блок
+            yield cls._batch
+            return
+        if cls._timer is not None:
+            cls._timer.cancel()  # Не высвобождать очередь, пока блок не завершён
+        cls._batch = cls._edit_items()
+        try:
+            yield cls._batch
+        finally:
+            items, cls._batch = cls._batch, None
+            cls.__set_cache(items)
+            cls._reset_timer()
 
     @classmethod
     def get_items(cls, _model: Optional[Type[CustomModel]] = None, _db_only=False, _queue_only=False, **attrs) -> Result:  # todo: придумать пагинатор
@@ -2146,14 +2555,14 @@ class ORMHelper(ORMAttributes):
         if not isinstance(node_or_nodes, (tuple, list, set, frozenset, str, int,)):
             raise TypeError
         primary_key_field_name = ModelTools.get_primary_key_column_name(model)
-        items = cls.items
+        items = cls._edit_items()
         if isinstance(node_or_nodes, (str, int,)):
-            items.remove(model, **{primary_key_field_name: node_or_nodes})
+            items.remove(model, primary_key_field_name, node_or_nodes)
         if isinstance(node_or_nodes, (tuple, list, set, frozenset)):
             for pk_field_value in node_or_nodes:
                 if not isinstance(pk_field_value, (int, str,)):
                     raise TypeError
-                items.remove(model, **{primary_key_field_name: pk_field_value})
+                items.remove(model, primary_key_field_name, pk_field_value)
         cls.__set_cache(items)
 
     @classmethod
@@ -2169,7 +2578,8 @@ class ORMHelper(ORMAttributes):
         if not isinstance(field_or_fields, (tuple, list, set, frozenset, str,)):
             raise TypeError
         primary_key_field_name = ModelTools.get_primary_key_column_name(model)
-        old_node = cls.items.get_node(model, **{primary_key_field_name: pk_field_value})
+        container = cls._edit_items()
+        old_node = container.get_node(model, **{primary_key_field_name: pk_field_value})
         if not old_node:
             return
         node_data = old_node.get_attributes()
@@ -2188,7 +2598,6 @@ class ORMHelper(ORMAttributes):
                 raise NodePrimaryKeyError("Нельзя удалить поле, которое является первичным ключом")
             if field_or_fields in node_data:
                 del node_data[field_or_fields]
-        container = cls.items
         container.enqueue(**node_data)
         cls.__set_cache(container)
 
@@ -2215,6 +2624,15 @@ class ORMHelper(ORMAttributes):
         cls.__set_cache(database_adapter.remaining_nodes or None)
         sys.exit()
 
+    @classmethod
+    def _reset_timer(cls):
+        """ Обнулить таймер высвобождения очереди. Внутри блока batch - при выходе из него """
+        if cls._batch is not None:
+            return
+        if cls._timer is not None:
+            cls._timer.cancel()
+        cls._timer = cls._init_timer()
+
     @classmethod
     def _init_timer(cls):
         if cls.TESTING:
@@ -2241,7 +2659,25 @@ class ORMHelper(ORMAttributes):
 
     @classmethod
     def __set_cache(cls, nodes):
-        cls.cache.set("ORMItems", nodes, cls.CACHE_LIFETIME_HOURS)
+        if cls._batch is not None:
+            cls._batch = nodes if nodes is not None else ORMItemQueue()
+            return
+        cls._get_items_cache().save(nodes)
+
+    @classmethod
+    def _get_items_cache(cls) -> ORMItemQueueCache:
+        items_cache = cls._items_cache
+        if items_cache is None or items_cache.client is not cls.cache or \
+                items_cache.lifetime != cls.CACHE_LIFETIME_HOURS:
+            items_cache = cls._items_cache = ORMItemQueueCache(cls.cache, cls.CACHE_LIFETIME_HOURS)
+        return items_cache
+
+    @classmethod
+    def _edit_items(cls) -> ORMItemQueue:
+        """ Очередь для изменения: в блоке batch - его очередь, иначе - рабочая копия (см. ORMItemQueueCache.edit) """
+        if cls._batch is not None:
+            return cls._batch
+        return cls._get_items_cache().edit()
 
 
 class Pointer:
@@ -2337,3 +2773,27 @@ class Pointer:
             raise WrapperError
         if not all(map(lambda x: isinstance(x, str), self.wrap_items)):
             raise WrapperError
+
+
+if __name__ == "__main__":
+    import time
+    from database.models import Numeration
+
+    for size in (10_000, 100_000,):
+        queue = ORMItemQueue()
+        for pk in range(size):
+            queue.append(_model=Numeration, _insert=True, _container=queue, numerationid=pk, endat=pk)
+        start = time.perf_counter()
+        for pk in range(0, size, size // 1000):
+            queue.get_node(Numeration, numerationid=pk)
+        lookup = (time.perf_counter() - start) / 1000
+        start = time.perf_counter()
+        for pk in range(0, size, size // 1000):
+            queue.enqueue(_model=Numeration, _update=True, _container=queue, numerationid=size + pk, endat=pk)
+        enqueue = (time.perf_counter() - start) / 1000
+        start = time.perf_counter()
+        for pk in range(size - 1, 0, -(size // 1000)):
+            queue.remove(Numeration, "numerationid", pk)
+        remove = (time.perf_counter() - start) / 1000
+        print(f"{size} нод: get_node {lookup * 1e6:.1f} мкс, enqueue {enqueue * 1e6:.1f} мкс, "
+              f"remove {remove * 1e6:.1f} мкс")
@@ -185,11 +185,11 @@ class TestORMHelper(unittest.TestCase, SetUp):
     @db_reinit
     def test_items_property(self):
         self.set_data_into_queue()
-        self.assertEqual(self.orm_manager.cache.get("ORMItems", ORMItemQueue()), self.orm_manager.items[0])
+        self.assertEqual(ORMItemQueueCache(self.orm_manager.cache).load(), self.orm_manager.items[0])
         self.orm_manager.set_item(_insert=True, _model=Cnc, name="Fid")
-        self.assertEqual(self.orm_manager.cache.get("ORMItems"), self.orm_manager.items[0])
+        self.assertEqual(ORMItemQueueCache(self.orm_manager.cache).load(), self.orm_manager.items[0])
         self.orm_manager.drop_cache()
-        self.assertEqual(self.orm_manager.cache.get("ORMItems", ORMItemQueue()), self.orm_manager.items[0])
+        self.assertEqual(ORMItemQueueCache(self.orm_manager.cache).load(), self.orm_manager.items[0])
 
     @drop_cache
     @db_reinit
@@ -197,13 +197,13 @@ class TestORMHelper(unittest.TestCase, SetUp):
         # GOOD
         self.orm_manager.set_item(_insert=True, _model=Cnc, name="Fid", commentsymbol="$")
         self.assertIsNotNone(self.orm_manager.cache.get("ORMItems"))
-        self.assertIsInstance(self.orm_manager.cache.get("ORMItems"), ORMItemQueue)
-        self.assertEqual(self.orm_manager.cache.get("ORMItems").__len__(), 1)
+        self.assertIsInstance(ORMItemQueueCache(self.orm_manager.cache).load(), ORMItemQueue)
+        self.assertEqual(ORMItemQueueCache(self.orm_manager.cache).load().__len__(), 1)
         self.assertTrue(self.orm_manager.items[0]["name"] == "Fid")
         self.orm_manager.set_item(_insert=True, _model=Machine, machinename="Helller",
                                   inputcatalog=r"C:\\wdfg", outputcatalog=r"D:\\hfghfgh")
         self.assertEqual(len(self.orm_manager.items), 2)
-        self.assertEqual(len(self.orm_manager.items), len(self.orm_manager.cache.get("ORMItems")))
+        self.assertEqual(len(self.orm_manager.items), len(ORMItemQueueCache(self.orm_manager.cache).load()))
         self.assertTrue(any(map(lambda x: x.value.get("machinename", None), self.orm_manager.items)))
         self.assertIs(self.orm_manager.items[1].model, Machine)
         self.assertIs(self.orm_manager.items[0].model, Cnc)
@@ -254,6 +254,126 @@ class TestORMHelper(unittest.TestCase, SetUp):
         self.assertRaises(NodeDMLTypeError, self.orm_manager.set_item, _model=Cnc, name="NC211")
         self.assertRaises(NodeDMLTypeError, self.orm_manager.set_item, _model=Cnc, name="NC214")
 
+    @drop_cache
+    @db_reinit
+    def test_set_items(self):
+        """ Пакетная установка даёт ту же очередь, что и последовательные вызовы set_item """
+        self.set_data_into_queue()
+        self.update_exists_items()
+        def queue_data(nodes):  # Без сгенерированных значений первичного ключа (uuid)
+            return [(node.model, node.type, {name: value for name, value in node.value.items()
+                                             if not node.is_relative_primary_key or
+                                             name != node.get_primary_key_and_value(only_key=True)})
+                    for node in nodes]
+        expected = queue_data(self.orm_manager.items)
+        self.orm_manager.drop_cache()
+        self.orm_manager.set_items([
+            dict(_model=Numeration, numerationid=2, endat=269, _insert=True),
+            dict(_insert=True, _model=OperationDelegation, numerationid=2, operationdescription="Нумерация кадров"),
+            dict(_model=Comment, findstr="test_string_set_from_queue", ifcontains=True, _insert=True, commentid=2),
+            dict(_model=OperationDelegation, commentid=2, _insert=True, operationdescription="Комментарий"),
+            dict(_model=Cnc, _insert=True, cncid=2, name="Ram", commentsymbol="#"),
+            dict(_model=Machine, machineid=2, cncid=2, machinename="Fidia", inputcatalog=r"D:\Heller",
+                 outputcatalog=r"C:\Test", _insert=True),
+            dict(_model=Machine, machinename="Tesm", _insert=True),
+            dict(_model=Machine, machinename="65A90", _insert=True),
+            dict(_model=Machine, machinename="Rambaudi", _insert=True),
+            dict(cncid=1, name="name", _model=Cnc, _update=True),
+            dict(_update=True, _model=Machine, machineid=2, inputcatalog=r"C:\F"),
+            dict(numerationid=2, endat=4, _model=Numeration, _update=True),
+            dict(_model=Comment, commentid=2, findstr="test_str_new", _update=True),
+            dict(_model=Machine, machinename="testname", machineid=1, _insert=True),
+        ])
+        self.assertEqual(queue_data(ORMItemQueueCache(self.orm_manager.cache).load()), expected)
+        # Внутри блока изменения не записываются в кеш до выхода из него
+        with self.orm_manager.batch():
+            self.orm_manager.set_item(_insert=True, _model=Cnc, name="Fid", commentsymbol="$")
+            self.orm_manager.remove_items(1, model=Machine)
+            self.assertEqual(len(self.orm_manager.items), len(expected))
+            self.assertEqual(len(ORMItemQueueCache(self.orm_manager.cache).load()), len(expected))
+            self.assertIsNotNone(self.orm_manager.get_node_dml_type(2, model=Machine))
+        self.assertEqual(len(ORMItemQueueCache(self.orm_manager.cache).load()), len(expected))
+        self.assertIsNone(self.orm_manager.get_node_dml_type(1, model=Machine))
+        # Ошибка внутри блока: уже сделанные изменения сохраняются, как и при последовательных вызовах set_item
+        with self.assertRaises(NodeColumnError):
+            self.orm_manager.set_items([dict(_insert=True, _model=Cnc, name="NC21", commentsymbol="*"),
+                                        dict(_insert=True, _model=Machine, input_path="path")])
+        self.assertEqual(len(self.orm_manager.items), len(expected) + 1)
+        self.assertIsNone(self.orm_manager._batch)
+
+    @drop_cache
+    @db_reinit
+    def test_items_cache(self):
+        """ Очередь хранится в кеше по нодам: изменение записывает только затронутые ноды и журнал """
+        self.set_data_into_queue()
+        written, removed = [], []
+        set_many, delete_many = self.orm_manager.cache.set_many, self.orm_manager.cache.delete_many
+        self.orm_manager.cache.set_many = lambda values, *args, **kwargs: \
+            written.extend(values) or set_many(values, *args, **kwargs)
+        self.orm_manager.cache.delete_many = lambda keys, *args, **kwargs: \
+            removed.extend(keys) or delete_many(keys, *args, **kwargs)
+        try:
+            self.orm_manager.set_item(_update=True, _model=Machine, machineid=2, inputcatalog=r"C:\F")
+        finally:
+            del self.orm_manager.cache.set_many, self.orm_manager.cache.delete_many
+        items = self.orm_manager.items
+        header = self.orm_manager.cache.get(ORMItemQueueCache.KEY)
+        node_keys = [key for key in written if ":journal:" not in key]
+        self.assertEqual(node_keys, [f"{ORMItemQueueCache.KEY}:{header['generation']}:{items[-1]._key}"])  # Нода перемещена в конец очереди
+        self.assertEqual(len(removed), 1)
+        self.assertEqual(items[-1].get_primary_key_and_value(), {"machineid": 2})
+        self.assertEqual(items[-1]["inputcatalog"], r"C:\F")
+        self.assertEqual(len(items), 9)
+        # Очередь, не загруженная из кеша, записывается целиком, прежние ноды удаляются
+        queue = ORMItemQueue()
+        queue.append(**items[0].get_attributes(new_container=queue))
+        ORMItemQueueCache(self.orm_manager.cache).save(queue)
+        self.assertEqual(len(self.orm_manager.items), 1)
+        ORMItemQueueCache(self.orm_manager.cache).save(None)
+        self.assertIsNone(self.orm_manager.cache.get(ORMItemQueueCache.KEY))
+        self.assertEqual(len(self.orm_manager.items), 0)
+
+    @drop_cache
+    @db_reinit
+    def test_items_cache_write_cost(self):
+        """ Изменение одной ноды стоит одних и тех же обращений к кешу при любой длине очереди """
+        def calls_for_change(size):
+            self.orm_manager.drop_cache()
+            self.orm_manager.set_items([dict(_model=Numeration, _insert=True, numerationid=index, endat=index)
+                                        for index in range(1, size + 1)])
+            calls, client = [], self.orm_manager.cache
+            for name in ("get", "get_many", "set", "set_many", "delete_many", "touch"):
+                setattr(client, name, lambda *args, name_=name, method=getattr(client, name), **kwargs:
+                        calls.append(name_) or method(*args, **kwargs))
+            try:
+                self.orm_manager.set_item(_model=Numeration, _update=True, numerationid=1, endat=size * 2)
+            finally:
+                for name in ("get", "get_many", "set", "set_many", "delete_many", "touch"):
+                    delattr(client, name)
+            self.assertEqual(len(self.orm_manager.items), size)
+            self.assertEqual(self.orm_manager.items[-1]["endat"], size * 2)
+            return calls
+        self.assertEqual(calls_for_change(10), calls_for_change(300))
+
+    @drop_cache
+    @db_reinit
+    def test_items_cache_evicted_node(self):
+        """ Очередь, часть нод которой вытеснена из кеша, при изменении записывается заново из оставшихся нод """
+        self.set_data_into_queue()
+        items = self.orm_manager.items
+        header = self.orm_manager.cache.get(ORMItemQueueCache.KEY)
+        self.orm_manager.cache.delete(f"{ORMItemQueueCache.KEY}:{header['generation']}:{items[1]._key}")
+        self.orm_manager._items_cache = None  # Другой процесс: рабочей копии очереди нет
+        with self.assertWarns(UserWarning):
+            self.orm_manager.set_item(_insert=True, _model=Cnc, name="Fid", commentsymbol="$")
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            stored = ORMItemQueueCache(self.orm_manager.cache).load()
+        self.assertEqual(self.orm_manager.cache.get(ORMItemQueueCache.KEY)["size"], len(items))
+        self.assertEqual([dict(node.value) for node in stored][:-1],
+                         [dict(node.value) for index, node in enumerate(items) if index != 1])
+        self.assertEqual(stored[-1]["name"], "Fid")
+
     @drop_cache
     @db_reinit
     def test_get_items(self):